@@ -22,8 +22,11 @@ from src.models.chat import Chat, Message
 from src.models.waitlist import WaitListItem
 from src.models.tryon import TryOn
 from src.models.store import Store
-from src.models.product import Product
+from src.models.product import Product, ProductAttribute
 from src.models.review import Review
+from src.models.usage import LLMUsage
+from src.models.analysis_job import AnalysisJob
+from src.models.image_analysis import ImageAnalysisCache
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -46,6 +49,20 @@ if config.config_file_name is not None:
 # for 'autogenerate' support
 target_metadata = Base.metadata
 
+# Объекты, которые создаются миграциями вручную и не описаны в моделях
+# (например, generated-колонка tsvector), – autogenerate не должен их удалять
+MANUAL_SCHEMA_OBJECTS = {
+    ("column", "products.search_vector"),
+    ("index", "ix_products_search_vector"),
+}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == "column":
+        name = f"{object.table.name}.{name}"
+    return (type_, name) not in MANUAL_SCHEMA_OBJECTS
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -68,6 +85,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -91,7 +109,9 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object
         )
 
         with context.begin_transaction():
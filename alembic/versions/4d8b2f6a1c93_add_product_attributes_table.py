@@ -0,0 +1,79 @@
+"""Add product_attributes table for indexed size/color/feature filters
+
+Revision ID: 4d8b2f6a1c93
+Revises: 7c3e9a1f4b2d
+Create Date: 2026-10-17 11:03:27.518904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4d8b2f6a1c93'
+down_revision: Union[str, None] = '7c3e9a1f4b2d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+ATTRIBUTE_SOURCES = {
+    'size': 'sizes',
+    'color': 'colors',
+    'feature': 'features',
+}
+BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('product_attributes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('value', sa.String(length=200), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('product_id', 'kind', 'value', name='uq_product_attributes_product_kind_value')
+    )
+    op.create_index('ix_product_attributes_kind_value_product', 'product_attributes', ['kind', 'value', 'product_id'], unique=False)
+    op.create_index(op.f('ix_product_attributes_product_id'), 'product_attributes', ['product_id'], unique=False)
+
+    # Перенос существующих значений из JSON-колонок
+    products = sa.table('products',
+        sa.column('id', sa.Integer()),
+        sa.column('sizes', sa.JSON()),
+        sa.column('colors', sa.JSON()),
+        sa.column('features', sa.JSON()),
+    )
+    attributes = sa.table('product_attributes',
+        sa.column('product_id', sa.Integer()),
+        sa.column('kind', sa.String()),
+        sa.column('value', sa.String()),
+    )
+    bind = op.get_bind()
+    rows = []
+    for product in bind.execute(sa.select(products)).all():
+        for kind, source in ATTRIBUTE_SOURCES.items():
+            values = getattr(product, source)
+            if not isinstance(values, list):
+                continue
+            seen = set()
+            for value in values:
+                value = str(value).strip()[:200] if value is not None else ''
+                if value and value not in seen:
+                    seen.add(value)
+                    rows.append({'product_id': product.id, 'kind': kind, 'value': value})
+        if len(rows) >= BATCH_SIZE:
+            op.bulk_insert(attributes, rows)
+            rows = []
+    if rows:
+        op.bulk_insert(attributes, rows)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_product_attributes_product_id'), table_name='product_attributes')
+    op.drop_index('ix_product_attributes_kind_value_product', table_name='product_attributes')
+    op.drop_table('product_attributes')
@@ -0,0 +1,62 @@
+"""Add full-text search vector to products
+
+Revision ID: 7c3e9a1f4b2d
+Revises: 2e1427431540
+Create Date: 2026-10-17 10:12:41.204117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c3e9a1f4b2d'
+down_revision: Union[str, None] = '2e1427431540'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Веса: название A, категория и бренд B, описание C.
+# Конфигурация russian стеммит кириллицу, а латиницу – english_stem.
+SEARCH_VECTOR_EXPRESSION = """
+    setweight(to_tsvector('russian', coalesce(name, '')), 'A') ||
+    setweight(to_tsvector('russian', coalesce(category, '')), 'B') ||
+    setweight(to_tsvector('russian', coalesce(brand, '')), 'B') ||
+    setweight(to_tsvector('russian', coalesce(description, '')), 'C')
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        # На SQLite поиск работает через in-memory инвертированный индекс
+        return
+
+    op.add_column(
+        'products',
+        sa.Column(
+            'search_vector',
+            postgresql.TSVECTOR(),
+            sa.Computed(SEARCH_VECTOR_EXPRESSION, persisted=True),
+            nullable=True
+        )
+    )
+    op.create_index(
+        'ix_products_search_vector',
+        'products',
+        ['search_vector'],
+        unique=False,
+        postgresql_using='gin'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.drop_index('ix_products_search_vector', table_name='products', postgresql_using='gin')
+    op.drop_column('products', 'search_vector')
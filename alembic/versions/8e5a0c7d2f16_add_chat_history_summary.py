@@ -0,0 +1,30 @@
+"""Add rolling history summary to chats
+
+Revision ID: 8e5a0c7d2f16
+Revises: 4d8b2f6a1c93
+Create Date: 2026-10-17 12:21:09.734652
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e5a0c7d2f16'
+down_revision: Union[str, None] = '4d8b2f6a1c93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chats', sa.Column('history_summary', sa.Text(), nullable=True))
+    op.add_column('chats', sa.Column('summary_message_id', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chats', 'summary_message_id')
+    op.drop_column('chats', 'history_summary')
@@ -0,0 +1,41 @@
+"""Add image_analysis_cache table
+
+Revision ID: e4b9d17a3c60
+Revises: c6a2e8f41d57
+Create Date: 2026-10-17 18:05:41.227093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b9d17a3c60'
+down_revision: Union[str, None] = 'c6a2e8f41d57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('image_analysis_cache',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('image_hash', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.String(length=32), nullable=False),
+    sa.Column('result', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('kind', 'image_hash', 'version', name='uq_image_analysis_cache_key')
+    )
+    op.create_index(op.f('ix_image_analysis_cache_id'), 'image_analysis_cache', ['id'], unique=False)
+    op.create_index(op.f('ix_image_analysis_cache_image_hash'), 'image_analysis_cache', ['image_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_image_analysis_cache_image_hash'), table_name='image_analysis_cache')
+    op.drop_index(op.f('ix_image_analysis_cache_id'), table_name='image_analysis_cache')
+    op.drop_table('image_analysis_cache')
@@ -0,0 +1,32 @@
+"""Add thumbnail columns for uploaded images
+
+Revision ID: f1c7a2d95b38
+Revises: e4b9d17a3c60
+Create Date: 2026-10-17 19:22:08.614530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c7a2d95b38'
+down_revision: Union[str, None] = 'e4b9d17a3c60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('clothing_items', sa.Column('thumbnail_url', sa.String(), nullable=True))
+    op.add_column('waitlist_items', sa.Column('thumbnail_url', sa.String(), nullable=True))
+    op.add_column('products', sa.Column('thumbnail_urls', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('products', 'thumbnail_urls')
+    op.drop_column('waitlist_items', 'thumbnail_url')
+    op.drop_column('clothing_items', 'thumbnail_url')
@@ -1,7 +1,53 @@
 import json
 from sqlalchemy.orm import Session
+from src.agent.sub_agents.base import AgentResponse
 from src.agent.sub_agents.coordinator_agent import coordinate_request
+from src.agent.usage_tracker import UsageTracker, track_usage
+from src.models.usage import LLMUsage
 from src.utils.token_counter import count_message_tokens
+from src.agent.streaming import emit_event
+
+
+def _apply_usage(response: AgentResponse, tracker: UsageTracker, message: str) -> str:
+    """
+    Записать токены в ответ: usage провайдера по всем запускам агентов, а если
+    модель не вызывалась (быстрый путь, кэш, поиск без LLM) – оценку tiktoken.
+
+    Returns:
+        str: Источник цифр – provider или estimate
+    """
+    if tracker.requests > 0:
+        response.input_tokens = tracker.input_tokens
+        response.output_tokens = tracker.output_tokens
+        response.total_tokens = tracker.total_tokens
+        return "provider"
+
+    token_counts = count_message_tokens(message, response.result.model_dump_json())
+    response.input_tokens = token_counts["input_tokens"]
+    response.output_tokens = token_counts["output_tokens"]
+    response.total_tokens = token_counts["total_tokens"]
+    return "estimate"
+
+
+def _save_usage(db: Session, user_id: int, chat_id: int, response: AgentResponse, tracker: UsageTracker, source: str) -> None:
+    """Сохранить потребление токенов запроса; ошибка записи не влияет на ответ."""
+    try:
+        db.add(LLMUsage(
+            user_id=user_id,
+            chat_id=chat_id,
+            agent_type=response.agent_type,
+            source=source,
+            requests=tracker.requests,
+            input_tokens=response.input_tokens or 0,
+            output_tokens=response.output_tokens or 0,
+            total_tokens=response.total_tokens or 0,
+            processing_time_ms=response.processing_time_ms,
+            breakdown=tracker.breakdown() or None,
+        ))
+        db.commit()
+    except Exception as e:
+        print(f"Error saving LLM usage for chat {chat_id}: {e}")
+        db.rollback()
 
 
 async def process_user_request(
@@ -35,21 +81,25 @@ async def process_user_request(
         - processing_time_ms: Time taken to process the request
     """
     try:
-        # Use the enhanced coordinator with strict validation
-        response = await coordinate_request(message, user_id, db, chat_id)
+        # Use the enhanced coordinator with strict validation; usage of every
+        # agent run (coordinator and sub-agents) is collected by the tracker
+        with track_usage() as tracker:
+            response = await coordinate_request(message, user_id, db, chat_id)
 
         # Validate that we have a proper AgentResponse
         if not hasattr(response, 'result') or not hasattr(response, 'agent_type'):
             raise ValueError("Invalid response structure from coordinator")
 
-        # Count tokens for input and output
-        response_json = response.model_dump_json(indent=2)
-        token_counts = count_message_tokens(message, response_json)
-        
-        # Add token information to the response
-        response.input_tokens = token_counts["input_tokens"]
-        response.output_tokens = token_counts["output_tokens"] 
-        response.total_tokens = token_counts["total_tokens"]
+        # Real token usage reported by the model (tiktoken estimate only without LLM calls)
+        source = _apply_usage(response, tracker, message)
+        _save_usage(db, user_id, chat_id, response, tracker, source)
+        await emit_event("tokens", {
+            "input_tokens": response.input_tokens,
+            "output_tokens": response.output_tokens,
+            "total_tokens": response.total_tokens,
+            "source": source,
+            "processing_time_ms": response.processing_time_ms
+        })
 
         # Format and return the validated response with token counts
         return response.model_dump_json(indent=2)
@@ -61,7 +111,7 @@ async def process_user_request(
         print(f"Message: {message}")
         
         # Return a properly structured error response as fallback
-        from src.agent.sub_agents.base import AgentResponse, GeneralResponse
+        from src.agent.sub_agents.base import GeneralResponse
         
         error_response_text = "I apologize, but I encountered a critical error while processing your request. Please try again, and if the problem persists, contact support."
         
@@ -0,0 +1,183 @@
+"""
+Кэш готовых ответов агентов для повторяющихся запросов.
+
+Многие пользователи присылают почти одинаковые сообщения («черная футболка»,
+«деловые брюки»). Если intent_router уверенно определил агента, ответ берётся из
+кэша без запуска суб-агента:
+
+* ключ – (тип агента, версия каталога, нормализованный текст сообщения);
+  для поиска версия берётся из снимка каталога, поэтому любое изменение товаров
+  делает старые ответы недоступными;
+* кэшируются только ответы, не зависящие от контекста: поиск по каталогу и общие
+  ответы в чатах без истории; образы зависят от гардероба и не кэшируются;
+* опционально – совпадение по косинусной близости эмбеддингов сообщений
+  (``RESPONSE_CACHE_SIMILARITY`` > 0) в пределах того же типа агента и версии.
+
+Переменные окружения: ``RESPONSE_CACHE_ENABLED``, ``RESPONSE_CACHE_SIZE``,
+``RESPONSE_CACHE_TTL`` (секунды), ``RESPONSE_CACHE_SIMILARITY``.
+"""
+import os
+import re
+from threading import Lock
+from typing import Any, Dict, Hashable, Optional, Tuple, Union
+
+import numpy as np
+
+from src.agent.sub_agents.base import GeneralResponse, MessageHistory, ProductList
+from src.agent.sub_agents.catalog_retrieval import normalize_text
+from src.utils.catalog_snapshot import get_catalog_version
+from src.utils.lru_cache import LRUCache
+from src.utils.vector_index import get_embedder
+
+
+CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+SIMILARITY_THRESHOLD = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0"))
+
+CACHEABLE_AGENTS = ("search", "general")
+
+CachedResult = Union[ProductList, GeneralResponse]
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]+", re.UNICODE)
+
+
+def normalize_message(message: str) -> str:
+    """Нижний регистр, ё -> е, без пунктуации и лишних пробелов."""
+    return " ".join(_PUNCTUATION_RE.sub(" ", normalize_text(message)).split())
+
+
+def is_cacheable(agent_type: str, history: Optional[MessageHistory]) -> bool:
+    """Можно ли отвечать на сообщение из кэша независимо от контекста чата."""
+    if not CACHE_ENABLED or agent_type not in CACHEABLE_AGENTS:
+        return False
+    if agent_type == "general":
+        return history is None or not (history.messages or history.summary)
+    # Поиск по каталогу не использует историю чата
+    return True
+
+
+class ResponseCache:
+    """LRU/TTL-кэш ответов с точным и (опционально) приближённым совпадением."""
+
+    def __init__(
+        self,
+        maxsize: int = CACHE_SIZE,
+        ttl_seconds: float = CACHE_TTL_SECONDS,
+        similarity_threshold: float = SIMILARITY_THRESHOLD,
+    ):
+        self.similarity_threshold = similarity_threshold
+        self._vectors: Dict[Hashable, np.ndarray] = {}
+        self._vectors_lock = Lock()
+        self._cache: LRUCache[CachedResult] = LRUCache(maxsize, ttl_seconds, on_evict=self._forget_vector)
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    def _forget_vector(self, key: Hashable, _value: Any) -> None:
+        with self._vectors_lock:
+            self._vectors.pop(key, None)
+
+    @staticmethod
+    def _scope(agent_type: str) -> Tuple[str, int]:
+        version = get_catalog_version() if agent_type == "search" else 0
+        return agent_type, version
+
+    def _find_similar(self, scope: Tuple[str, int], text: str) -> Optional[CachedResult]:
+        with self._vectors_lock:
+            candidates = [(key, vector) for key, vector in self._vectors.items() if key[:2] == scope]
+        if not candidates:
+            return None
+
+        query = get_embedder().embed_one(text)
+        keys = [key for key, _ in candidates]
+        scores = np.stack([vector for _, vector in candidates]) @ query
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        return self._cache.get(keys[best], count=False)
+
+    def get(self, agent_type: str, message: str) -> Optional[CachedResult]:
+        """Найти ответ; возвращается копия, чтобы вызывающий код мог её менять."""
+        scope = self._scope(agent_type)
+        text = normalize_message(message)
+        result = self._cache.get((*scope, text), count=False)
+        if result is not None:
+            self.hits += 1
+            return result.model_copy(deep=True)
+
+        if self.similarity_threshold > 0:
+            try:
+                result = self._find_similar(scope, text)
+            except Exception as e:
+                print(f"Error in similarity lookup of response cache: {e}")
+                result = None
+            if result is not None:
+                self.similar_hits += 1
+                return result.model_copy(deep=True)
+
+        self.misses += 1
+        return None
+
+    def set(self, agent_type: str, message: str, result: CachedResult) -> None:
+        """Сохранить ответ. Ошибки и пустые результаты не кэшируются."""
+        if isinstance(result, GeneralResponse) and result.response_type == "error":
+            return
+        if isinstance(result, ProductList) and not result.products:
+            return
+
+        key = (*self._scope(agent_type), normalize_message(message))
+        self._cache.set(key, result.model_copy(deep=True))
+        if self.similarity_threshold > 0:
+            try:
+                vector = get_embedder().embed_one(key[2])
+                with self._vectors_lock:
+                    self._vectors[key] = vector
+            except Exception as e:
+                print(f"Error embedding message for response cache: {e}")
+
+    def clear(self) -> None:
+        self._cache.clear()
+        with self._vectors_lock:
+            self._vectors.clear()
+
+    def info(self) -> Dict[str, Any]:
+        info = self._cache.info()
+        total = self.hits + self.similar_hits + self.misses
+        info.update({
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.similar_hits) / total, 4) if total else 0.0,
+        })
+        return info
+
+
+_response_cache = ResponseCache()
+
+
+def get_response_cache() -> ResponseCache:
+    return _response_cache
+
+
+def get_cached_response(agent_type: str, message: str, history: Optional[MessageHistory]) -> Optional[CachedResult]:
+    """Ответ из кэша или None (в том числе если сообщение зависит от контекста)."""
+    if not is_cacheable(agent_type, history):
+        return None
+    return _response_cache.get(agent_type, message)
+
+
+def cache_response(agent_type: str, message: str, history: Optional[MessageHistory], result: CachedResult) -> None:
+    """Сохранить ответ суб-агента, если он не зависит от контекста."""
+    if is_cacheable(agent_type, history):
+        _response_cache.set(agent_type, message, result)
+
+
+__all__ = [
+    "normalize_message",
+    "is_cacheable",
+    "ResponseCache",
+    "get_response_cache",
+    "get_cached_response",
+    "cache_response",
+]
@@ -0,0 +1,86 @@
+"""
+Поток промежуточных событий обработки сообщения (для SSE).
+
+Агенты публикуют события через :func:`emit_event` – выбор агента, фрагменты
+текста, карточки товаров, итоговые токены. Очередь событий передаётся через
+contextvar, поэтому без активного потока (обычный POST /messages) вызовы
+``emit_event`` ничего не делают и код агентов не зависит от транспорта.
+
+:func:`stream_events` запускает обработку фоновой задачей и отдаёт события по мере
+появления. Задача не отменяется, если клиент отключился: ответ всё равно будет
+получен и сохранён.
+"""
+import asyncio
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Set, Tuple
+
+from pydantic import BaseModel
+
+
+_event_queue: ContextVar[Optional[asyncio.Queue]] = ContextVar("agent_event_queue", default=None)
+_DONE = object()
+
+# Ссылки на фоновые задачи, чтобы их не собрал GC до завершения
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def is_streaming() -> bool:
+    """Есть ли слушатель событий у текущего запроса."""
+    return _event_queue.get() is not None
+
+
+async def emit_event(event: str, data: Any = None) -> None:
+    """Опубликовать событие, если запрос обрабатывается в потоковом режиме."""
+    queue = _event_queue.get()
+    if queue is None:
+        return
+    if isinstance(data, BaseModel):
+        data = data.model_dump(mode="json")
+    await queue.put((event, data))
+
+
+async def _run_and_close(run: Callable[[], Awaitable[Any]], queue: asyncio.Queue) -> None:
+    try:
+        result = await run()
+        await queue.put(("done", result.model_dump(mode="json") if isinstance(result, BaseModel) else result))
+    except Exception as e:
+        print(f"Error in streamed request: {e}")
+        await queue.put(("error", {"detail": str(e)}))
+    finally:
+        await queue.put(_DONE)
+
+
+async def stream_events(run: Callable[[], Awaitable[Any]]) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Выполнить run() в фоне и отдавать опубликованные им события.
+
+    Последним событием идёт ``done`` с результатом run() или ``error``.
+
+    Args:
+        run: Корутина-фабрика, выполняющая обработку сообщения
+
+    Yields:
+        Tuple[str, Any]: Имя события и его данные
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    token = _event_queue.set(queue)
+    try:
+        # Задача копирует текущий контекст – вместе с очередью событий
+        task = asyncio.create_task(_run_and_close(run, queue))
+    finally:
+        _event_queue.reset(token)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+    while True:
+        item = await queue.get()
+        if item is _DONE:
+            break
+        yield item
+
+
+__all__ = [
+    "is_streaming",
+    "emit_event",
+    "stream_events",
+]
@@ -1,10 +1,10 @@
 import os
 from typing import Union, List, Literal, Optional
 from dotenv import load_dotenv
-from pydantic import BaseModel, Field, validator, field_validator
+from pydantic import BaseModel, Field, PrivateAttr, validator, field_validator
 from pydantic_ai.models.openai import OpenAIModel
 from pydantic_ai.providers.azure import AzureProvider
-from pydantic_ai.messages import ModelMessage, ModelRequest, ModelResponse, TextPart, UserPromptPart
+from pydantic_ai.messages import ModelMessage, ModelRequest, ModelResponse, SystemPromptPart, TextPart, UserPromptPart
 from openai import AzureOpenAI
 
 # Load environment variables
@@ -21,10 +21,32 @@ class MessageHistory(BaseModel):
         default_factory=list,
         description="List of previous messages in the conversation"
     )
+    summary: Optional[str] = Field(
+        default=None,
+        description="Rolling summary of earlier messages that are not in the window"
+    )
+
+    # Результат конвертации: история загружается один раз на запрос и
+    # передаётся координатору и всем суб-агентам
+    _pydantic_ai_messages: Optional[List[ModelMessage]] = PrivateAttr(default=None)
 
     def to_pydantic_ai_messages(self) -> List[ModelMessage]:
-        """Convert database messages to PydanticAI message format."""
+        """Convert database messages to PydanticAI message format (converted once per instance)."""
+        if self._pydantic_ai_messages is None:
+            self._pydantic_ai_messages = self._convert_messages()
+        # Копия списка: агент не должен менять общую историю
+        return list(self._pydantic_ai_messages)
+
+    def _convert_messages(self) -> List[ModelMessage]:
         pydantic_messages = []
+        if self.summary:
+            pydantic_messages.append(
+                ModelRequest(
+                    parts=[
+                        SystemPromptPart(content=f"Summary of the earlier conversation:\n{self.summary}")
+                    ]
+                )
+            )
         for msg in self.messages:
             if msg["role"] == "user":
                 pydantic_messages.append(
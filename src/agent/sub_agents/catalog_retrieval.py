@@ -0,0 +1,323 @@
+"""
+Предварительный отбор кандидатов из каталога перед передачей в LLM.
+
+Вместо сериализации всего каталога в промпт мы разбираем запрос пользователя
+на сигналы (категория, цвет, размер, цена, ключевые слова) и оставляем только
+top-K наиболее подходящих товаров. Размер промпта при этом не зависит от размера
+каталога.
+"""
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+
+DEFAULT_TOP_K = int(os.getenv("CATALOG_RETRIEVAL_TOP_K", "15"))
+
+# Канонические категории -> основы слов (русские и английские), по которым
+# они распознаются в запросе и в названии/категории товара. Основа совпадает с
+# началом слова; основа с "$" на конце закреплена на границе слова: после неё
+# допустимо только окончание прилагательного или -s ("бел$" – белый, но не белье).
+CATEGORY_SYNONYMS = {
+    "pants": ["брюк", "штан", "pants", "trouser", "chino"],
+    "jeans": ["джинс", "jeans", "denim"],
+    "tshirts": ["футболк", "tshirt", "tee$"],
+    "shirts": ["рубашк", "сорочк", "shirt", "blouse", "блуз"],
+    "jumpers": ["джемпер", "свитер", "кофт", "sweater", "jumper", "pullover", "cardigan", "кардиган"],
+    "hoodies": ["толстовк", "худи", "свитшот", "hoodie", "sweatshirt"],
+    "shorts": ["шорт", "shorts"],
+    "jackets": ["куртк", "пуховик", "ветровк", "пальто", "jacket", "coat", "parka", "blazer", "пиджак"],
+    "tanks": ["майк", "tank"],
+    "sport": ["спорт", "sport", "athletic", "тренир", "activewear"],
+    "dresses": ["плать", "dress"],
+    "skirts": ["юбк", "skirt"],
+    "shoes": ["обув", "кроссов", "ботин", "туфл", "shoe", "sneaker", "boot"],
+}
+
+# Канонические цвета (как они хранятся в Product.colors) -> основы слов.
+COLOR_SYNONYMS = {
+    "black": ["черн", "чёрн", "black"],
+    "white": ["бел$", "white"],
+    "grey": ["сер$", "grey", "gray"],
+    "blue": ["син", "голуб", "blue"],
+    "navy": ["navy", "темно-син", "тёмно-син"],
+    "red": ["красн", "red"],
+    "green": ["зелен", "зелён", "green"],
+    "beige": ["беж", "beige"],
+    "brown": ["коричн", "brown"],
+    "pink": ["розов", "pink"],
+    "yellow": ["желт", "жёлт", "yellow"],
+    "purple": ["фиолет", "purple"],
+    "orange": ["оранж", "orange"],
+    "khaki": ["хаки", "khaki"],
+}
+
+STOPWORDS = {
+    "и", "в", "во", "на", "с", "со", "для", "по", "к", "мне", "меня", "я", "что", "как",
+    "хочу", "нужен", "нужна", "нужно", "нужны", "найди", "найти", "покажи", "показать",
+    "есть", "ли", "какие", "какой", "какая", "какое", "пожалуйста", "подбери", "ищу",
+    "the", "a", "an", "and", "or", "for", "with", "to", "in", "on", "me", "i", "want",
+    "need", "find", "show", "looking", "search", "some", "any", "please", "of", "is",
+}
+
+_NUMBER = r"(\d[\d\s.,]*)\s*(k|к|тыс\w*)?"
+_MAX_PRICE_RE = re.compile(
+    r"(?:\bдо|\bдешевле|\bне\s+дороже|\bunder|\bbelow|\bless\s+than|\bup\s+to|\bmax|<)\s*[₸$€]?\s*" + _NUMBER,
+    re.IGNORECASE,
+)
+_MIN_PRICE_RE = re.compile(
+    r"(?:\bот|\bдороже|\bover|\babove|\bfrom|\bmore\s+than|\bmin|>)\s*[₸$€]?\s*" + _NUMBER,
+    re.IGNORECASE,
+)
+_SIZE_RE = re.compile(r"(?:размер\w*|size)\s*:?\s*([A-Za-z]{1,4}|\d{2})\b", re.IGNORECASE)
+_STANDALONE_SIZE_RE = re.compile(r"\b(XXS|XS|XL|XXL|XXXL)\b")
+_TOKEN_RE = re.compile(r"[\w-]+", re.UNICODE)
+
+# Окончания, допустимые после основы с "$" ("о" – первая часть составного: бело-серый)
+_ANCHORED_ENDINGS = frozenset((
+    "", "s", "о", "ый", "ий", "ой", "ая", "яя", "ое", "ее", "ые", "ие", "ого", "его", "ому", "ему",
+    "ым", "им", "ом", "ем", "ую", "юю", "ых", "их", "ыми", "ими",
+))
+
+_RU_ENDINGS = (
+    "ыми", "ими", "ого", "его", "ому", "ему", "ых", "их", "ые", "ие", "ый", "ий", "ой",
+    "ая", "яя", "ое", "ее", "ую", "юю", "ам", "ям", "ах", "ях", "ов", "ев", "ей",
+    "а", "я", "ы", "и", "е", "у", "ю", "о",
+)
+
+# Веса полей при подсчете совпадений по ключевым словам
+FIELD_WEIGHTS = {"name": 3.0, "category": 2.0, "features": 2.0, "brand": 1.0, "description": 1.0}
+
+# Вес косинусной близости из векторного индекса (значения в диапазоне [-1, 1])
+SEMANTIC_WEIGHT = 4.0
+
+
+@dataclass
+class QuerySignals:
+    """Сигналы, извлеченные из текстового запроса пользователя."""
+    categories: Set[str] = field(default_factory=set)
+    colors: Set[str] = field(default_factory=set)
+    sizes: Set[str] = field(default_factory=set)
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    keywords: List[str] = field(default_factory=list)
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.categories or self.colors or self.sizes or self.keywords
+                    or self.min_price is not None or self.max_price is not None)
+
+
+def normalize_text(text: str) -> str:
+    """Нижний регистр, ё -> е и склейка вариантов написания t-shirt."""
+    text = (text or "").lower().replace("ё", "е")
+    return re.sub(r"\bt[\s-]?shirts?\b", "tshirt", text)
+
+
+def stem(token: str) -> str:
+    """Очень легкий стемминг: отрезает типичные русские окончания и английское -s."""
+    if len(token) > 4:
+        for ending in _RU_ENDINGS:
+            if token.endswith(ending) and len(token) - len(ending) >= 3:
+                return token[: -len(ending)]
+        if token.endswith("es") and token.isascii():
+            return token[:-2]
+        if token.endswith("s") and token.isascii():
+            return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Разбивает текст на стемы токенов."""
+    return [stem(t) for t in _TOKEN_RE.findall(normalize_text(text)) if len(t) > 1 or t.isdigit()]
+
+
+def _stems_match(a: str, b: str) -> bool:
+    if a == b:
+        return True
+    if min(len(a), len(b)) < 3:
+        return False
+    return a.startswith(b) or b.startswith(a)
+
+
+def _matches_stem(token: str, stem_: str) -> bool:
+    if not stem_.endswith("$"):
+        return token.startswith(stem_)
+    base = stem_[:-1]
+    # Части составных слов проверяются отдельно: "бело-серый" – белый и серый
+    return any(
+        part.startswith(base) and part[len(base):] in _ANCHORED_ENDINGS
+        for part in token.split("-")
+    )
+
+
+def _matches_any(tokens: Iterable[str], stems: Iterable[str]) -> bool:
+    stems = [normalize_text(s) for s in stems]
+    return any(_matches_stem(token, s) for token in tokens for s in stems)
+
+
+def _parse_price(number: str, multiplier: Optional[str]) -> Optional[float]:
+    cleaned = re.sub(r"[\s,]", "", number).rstrip(".")
+    try:
+        value = float(cleaned)
+    except ValueError:
+        return None
+    if multiplier:
+        value *= 1000
+    return value
+
+
+def parse_query_signals(query: str) -> QuerySignals:
+    """
+    Извлекает из запроса категорию, цвет, размер, ценовой диапазон и ключевые слова.
+
+    Args:
+        query: Текст запроса пользователя
+
+    Returns:
+        QuerySignals: Распознанные сигналы
+    """
+    signals = QuerySignals()
+    if not query:
+        return signals
+
+    text = normalize_text(query)
+
+    max_match = _MAX_PRICE_RE.search(text)
+    if max_match:
+        signals.max_price = _parse_price(max_match.group(1), max_match.group(2))
+
+    min_match = _MIN_PRICE_RE.search(text)
+    if min_match:
+        signals.min_price = _parse_price(min_match.group(1), min_match.group(2))
+
+    for match in _SIZE_RE.finditer(query):
+        signals.sizes.add(match.group(1).upper())
+    for match in _STANDALONE_SIZE_RE.finditer(query):
+        signals.sizes.add(match.group(1).upper())
+
+    raw_tokens = _TOKEN_RE.findall(text)
+    for canonical, stems in CATEGORY_SYNONYMS.items():
+        if _matches_any(raw_tokens, stems):
+            signals.categories.add(canonical)
+    for canonical, stems in COLOR_SYNONYMS.items():
+        if _matches_any(raw_tokens, stems):
+            signals.colors.add(canonical)
+
+    # Ключевые слова берем из текста без уже распознанных цен и размеров
+    keyword_text = _MAX_PRICE_RE.sub(" ", text)
+    keyword_text = _MIN_PRICE_RE.sub(" ", keyword_text)
+    keyword_text = _SIZE_RE.sub(" ", keyword_text)
+    size_words = {s.lower() for s in signals.sizes}
+    for token in _TOKEN_RE.findall(keyword_text):
+        if token in STOPWORDS or token in size_words or len(token) < 2:
+            continue
+        signals.keywords.append(stem(token))
+
+    return signals
+
+
+def product_categories(product: Any) -> Set[str]:
+    """Канонические категории товара по его категории и названию."""
+    tokens = _TOKEN_RE.findall(normalize_text(f"{product.category or ''} {product.name or ''}"))
+    return {canonical for canonical, stems in CATEGORY_SYNONYMS.items() if _matches_any(tokens, stems)}
+
+
+def product_colors(product: Any) -> Set[str]:
+    """Канонические цвета товара по полю colors и характеристикам."""
+    values = list(product.colors or []) + list(product.features or [])
+    tokens = _TOKEN_RE.findall(normalize_text(" ".join(str(v) for v in values if v)))
+    return {canonical for canonical, stems in COLOR_SYNONYMS.items() if _matches_any(tokens, stems)}
+
+
+def _field_tokens(product: Any) -> List[Tuple[float, List[str]]]:
+    features = " ".join(str(f) for f in (product.features or []) if f)
+    return [
+        (FIELD_WEIGHTS["name"], tokenize(product.name or "")),
+        (FIELD_WEIGHTS["category"], tokenize(product.category or "")),
+        (FIELD_WEIGHTS["features"], tokenize(features)),
+        (FIELD_WEIGHTS["brand"], tokenize(product.brand or "")),
+        (FIELD_WEIGHTS["description"], tokenize(product.description or "")),
+    ]
+
+
+def passes_hard_filters(product: Any, signals: QuerySignals) -> bool:
+    """Жесткие фильтры: ценовой диапазон и размер (если у товара указаны размеры)."""
+    if signals.max_price is not None and product.price > signals.max_price:
+        return False
+    if signals.min_price is not None and product.price < signals.min_price:
+        return False
+    if signals.sizes and product.sizes:
+        available = {str(s).upper() for s in product.sizes}
+        if not available & signals.sizes:
+            return False
+    return True
+
+
+def score_product(product: Any, signals: QuerySignals) -> float:
+    """
+    Оценка релевантности товара запросу.
+
+    Категория и цвет дают фиксированный бонус, ключевые слова оцениваются
+    по взвешенным совпадениям в названии, категории, характеристиках и описании.
+    """
+    score = 0.0
+
+    if signals.categories and signals.categories & product_categories(product):
+        score += 5.0
+    if signals.colors and signals.colors & product_colors(product):
+        score += 3.0
+    if signals.sizes and product.sizes:
+        if {str(s).upper() for s in product.sizes} & signals.sizes:
+            score += 1.0
+
+    if signals.keywords:
+        fields = _field_tokens(product)
+        for keyword in signals.keywords:
+            best = 0.0
+            for weight, tokens in fields:
+                if weight > best and any(_stems_match(keyword, token) for token in tokens):
+                    best = weight
+            score += best
+
+    return score
+
+
+def retrieve_candidates(
+    products: Iterable[Any],
+    query: str,
+    top_k: int = DEFAULT_TOP_K,
+    semantic_scores: Optional[Dict[int, float]] = None,
+) -> List[Any]:
+    """
+    Отбирает top-K товаров, наиболее подходящих под запрос.
+
+    Товары, не прошедшие жесткие фильтры (цена, размер), отбрасываются. Если запрос
+    не содержит распознаваемых сигналов или ни один товар не набрал баллов,
+    возвращаются товары с наибольшим рейтингом.
+
+    Args:
+        products: Товары каталога (ORM-объекты или записи с теми же атрибутами)
+        query: Текст запроса пользователя
+        top_k: Максимальное количество кандидатов
+        semantic_scores: Косинусная близость из векторного индекса по id товара
+
+    Returns:
+        List: Не более top_k товаров в порядке убывания релевантности
+    """
+    signals = parse_query_signals(query)
+    filtered = [p for p in products if passes_hard_filters(p, signals)]
+
+    semantic_scores = semantic_scores or {}
+    scored = [
+        (score_product(p, signals) + SEMANTIC_WEIGHT * max(semantic_scores.get(p.id, 0.0), 0.0), p)
+        for p in filtered
+    ]
+    if not any(score > 0 for score, _ in scored):
+        scored = [(0.0, p) for p in filtered]
+
+    scored.sort(key=lambda item: (-item[0], -(item[1].rating or 0.0), item[1].name or ""))
+    relevant = [p for score, p in scored if score > 0]
+    if relevant:
+        return relevant[:top_k]
+    return [p for _, p in scored[:top_k]]
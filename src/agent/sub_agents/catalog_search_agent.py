@@ -1,13 +1,13 @@
-import asyncio
 from typing import List, Optional
 from pydantic_ai import Agent, ModelRetry, RunContext
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, asc, and_, or_
 from dataclasses import dataclass
 
-from .base import get_azure_llm, ProductList, Product, MessageHistory
-from src.models.product import Product as DBProduct
-from src.models.store import Store as DBStore
+from .base import get_azure_llm, ProductList, Product
+from .catalog_retrieval import DEFAULT_TOP_K, parse_query_signals, retrieve_candidates
+from src.utils.catalog_snapshot import CatalogProduct, get_catalog_snapshot
+from src.utils.vector_index import semantic_search_async
+from src.agent.streaming import emit_event
 from pydantic_ai.messages import ModelMessage
 
 
@@ -22,63 +22,63 @@ class CatalogSearchDependencies:
 # Cached catalog search agent instance
 _catalog_search_agent_instance = None
 
-async def get_full_catalog_for_llm(db: Session) -> str:
+
+async def load_catalog_candidates(db: Session, query: str, top_k: int = DEFAULT_TOP_K) -> List[CatalogProduct]:
     """
-    Получить весь каталог товаров в текстовом формате для анализа LLM.
-    
+    Отобрать top-K кандидатов под запрос из снимка каталога.
+
+    Товары берутся из общего in-memory снимка (без запроса к БД на каждое
+    сообщение), ценовой диапазон из запроса отсекает товары сразу, остальные
+    сигналы (категория, цвет, размер, ключевые слова) оцениваются в
+    catalog_retrieval вместе с семантической близостью из векторного индекса.
+
     Returns:
-        str: Полное описание каталога для LLM
+        List[CatalogProduct]: Не более top_k товаров в порядке релевантности
     """
-    try:
-        # Импортируем все модели для избежания ошибок SQLAlchemy
-        from src.models.review import Review
-        from src.models.user import User
-        from src.models.clothing import ClothingItem
-        from src.models.chat import Chat, Message
-        from src.models.tryon import TryOn
-        from src.models.waitlist import WaitListItem
-        
-        # Получаем ВСЕ активные товары с информацией о магазинах
-        products = db.query(DBProduct).join(DBStore).filter(
-            DBProduct.is_active == True,
-            DBProduct.stock_quantity > 0
-        ).order_by(DBProduct.name).all()
-        
+    signals = parse_query_signals(query)
 
-        
-        if not products:
-            return "КАТАЛОГ ПУСТ: Нет товаров в наличии."
-        
-        catalog_text = f"ПОЛНЫЙ КАТАЛОГ H&M КАЗАХСТАН ({len(products)} товаров):\n\n"
-        
-        for i, product in enumerate(products, 1):
-            # Форматируем цену
-            price_str = f"₸{product.price:,.0f}"
-            if product.original_price and product.original_price > product.price:
-                price_str += f" (было ₸{product.original_price:,.0f})"
-            
-            # Форматируем размеры и цвета
-            sizes_str = ", ".join(product.sizes) if product.sizes else "Уточнить"
-            colors_str = ", ".join(product.colors) if product.colors else "Уточнить"
-            
-            # Добавляем товар в каталог
-            catalog_text += f"{i}. {product.name}\n"
-            catalog_text += f"   Цена: {price_str}\n"
-            catalog_text += f"   Категория: {product.category}\n"
-            catalog_text += f"   Бренд: {product.brand or 'H&M'}\n"
-            catalog_text += f"   Описание: {product.description or 'Стильная вещь от H&M'}\n"
-            catalog_text += f"   Размеры: {sizes_str}\n"
-            catalog_text += f"   Цвета: {colors_str}\n"
-            catalog_text += f"   Магазин: {product.store.name}, {product.store.city}\n"
-            catalog_text += f"   В наличии: {product.stock_quantity} шт\n"
-            if product.features:
-                catalog_text += f"   Особенности: {', '.join(product.features)}\n"
-            catalog_text += f"   Рейтинг: {product.rating}/5.0\n\n"
-        
-        return catalog_text
-        
+    products = [
+        p for p in get_catalog_snapshot(db).in_stock()
+        if (signals.max_price is None or p.price <= signals.max_price)
+        and (signals.min_price is None or p.price >= signals.min_price)
+    ]
+
+    try:
+        semantic_scores = dict(await semantic_search_async(query, top_k=top_k * 4))
     except Exception as e:
-        return f"ОШИБКА ПОЛУЧЕНИЯ КАТАЛОГА: {e}"
+        print(f"⚠️ Семантический поиск недоступен: {e}")
+        semantic_scores = {}
+
+    return retrieve_candidates(products, query, top_k=top_k, semantic_scores=semantic_scores)
+
+
+def to_agent_product(db_product: CatalogProduct, description: Optional[str] = None) -> Product:
+    """Преобразовать товар из снимка каталога в структуру Product для ответа агента."""
+    # Форматируем цену
+    price_str = f"₸{db_product.price:,.0f}"
+    original_price_str = None
+    if db_product.original_price and db_product.original_price > db_product.price:
+        original_price_str = f"₸{db_product.original_price:,.0f}"
+
+    # Фильтруем пустые строки и невалидные URL изображений
+    final_images = []
+    if db_product.image_urls and isinstance(db_product.image_urls, (list, tuple)):
+        final_images = [img for img in db_product.image_urls if img and img.strip()]
+
+    return Product(
+        name=db_product.name,
+        price=price_str,
+        description=description or db_product.description or "Стильная вещь от H&M",
+        link=f"/products/{db_product.id}",
+        image_urls=final_images,
+        original_price=original_price_str,
+        store_name=db_product.store.name,
+        store_city=db_product.store.city,
+        sizes=list(db_product.sizes or []),
+        colors=list(db_product.colors or []),
+        in_stock=db_product.stock_quantity > 0
+    )
+
 
 def get_catalog_search_agent() -> Agent:
     """
@@ -100,7 +100,7 @@ def get_catalog_search_agent() -> Agent:
 ```
 ЗАПРОС ПОЛЬЗОВАТЕЛЯ: [запрос]
 
-ПОЛНЫЙ КАТАЛОГ H&M КАЗАХСТАН (N товаров):
+КАНДИДАТЫ ИЗ КАТАЛОГА H&M КАЗАХСТАН (N товаров):
 1. [Название товара]
    Цена: ₸[цена]
    Категория: [категория]
@@ -111,7 +111,7 @@ def get_catalog_search_agent() -> Agent:
 
 ВАША ЗАДАЧА:
 1. Прочитайте запрос пользователя
-2. Найдите в каталоге наиболее подходящие товары (5-8 штук максимум)
+2. Найдите среди кандидатов наиболее подходящие товары (5-8 штук максимум)
 3. Верните результат в формате ProductList
 
 КРИТЕРИИ ПОИСКА:
@@ -127,7 +127,8 @@ def get_catalog_search_agent() -> Agent:
 - "черная футболка" → ищите в категории "Футболки" с цветом "черный"
 
 ВАЖНО:
-- Возвращайте ТОЛЬКО релевантные товары (не весь каталог!)
+- Кандидаты уже предварительно отобраны по категории, цвету, размеру и цене
+- Возвращайте ТОЛЬКО релевантные товары (не всех кандидатов!)
 - Максимум 8 товаров в ответе
 - Если не нашли подходящих товаров - верните пустой список
 - Всегда объясняйте в описании, почему товар подходит""",
@@ -165,7 +166,8 @@ async def search_internal_catalog(
 ) -> ProductList:
     """
     Поиск товаров в локальном каталоге H&M. 
-    LLM получает ВЕСЬ каталог и сам анализирует запрос пользователя.
+    Возвращает top-K кандидатов, отобранных под запрос без вызова LLM
+    (сигналы запроса и семантическая близость, см. load_catalog_candidates).
     
     Args:
         search_query: Запрос пользователя
@@ -176,75 +178,17 @@ async def search_internal_catalog(
     """
     try:
         db = ctx.deps.db
-        print(f"🔍 Анализируем запрос в полном каталоге: {search_query}")
-        
-        # Получаем ВЕСЬ каталог для анализа LLM
-        full_catalog = await get_full_catalog_for_llm(db)
-        print(f"📦 Каталог загружен для LLM анализа")
-        
-        # Получаем все активные товары для последующего создания ответа
-        all_products = db.query(DBProduct).join(DBStore).filter(
-            DBProduct.is_active == True,
-            DBProduct.stock_quantity > 0
-        ).order_by(DBProduct.name).all()
+        print(f"🔍 Анализируем запрос в каталоге: {search_query}")
         
-        print(f"   Всего товаров для анализа: {len(all_products)}")
+        # Кандидаты под запрос вместо всего каталога, уже упорядоченные по релевантности
+        candidates = await load_catalog_candidates(db, search_query)
+        print(f"📦 Отобрано кандидатов: {len(candidates)}")
         
-        # LLM должен проанализировать весь каталог и найти подходящие товары
-        # Добавляем каталог в контекст сообщения
-        analysis_prompt = f"""
-ЗАПРОС ПОЛЬЗОВАТЕЛЯ: "{search_query}"
-
-{full_catalog}
-
-ЗАДАЧА: Проанализируйте запрос пользователя и выберите наиболее подходящие товары из приведенного выше каталога. 
-Учитывайте семантическое сходство, стиль, категорию, цвет, повод и другие характеристики.
-Максимум {max_results} товаров в порядке релевантности.
-"""
-        
-        # Создаем список всех товаров для возврата (LLM выберет подходящие)
-        all_products_for_return = []
-        for db_product in all_products:
-            # Форматируем цену
-            price_str = f"₸{db_product.price:,.0f}"
-            original_price_str = None
-            if db_product.original_price and db_product.original_price > db_product.price:
-                original_price_str = f"₸{db_product.original_price:,.0f}"
-            
-            # ИСПРАВЛЕНИЕ: Правильно обрабатываем изображения
-            final_images = []
-            if db_product.image_urls and isinstance(db_product.image_urls, list):
-                # Фильтруем пустые строки и невалидные URL
-                final_images = [img for img in db_product.image_urls if img and img.strip()]
-            
-            # Создаем объект товара
-            product = Product(
-                name=db_product.name,
-                price=price_str,
-                description=db_product.description or "Стильная вещь от H&M",
-                link=f"/products/{db_product.id}",
-                image_urls=final_images,
-                original_price=original_price_str,
-                store_name=db_product.store.name,
-                store_city=db_product.store.city,
-                sizes=db_product.sizes or [],
-                colors=db_product.colors or [],
-                in_stock=db_product.stock_quantity > 0
-            )
-            all_products_for_return.append(product)
-        
-        # ИСПРАВЛЕНИЕ: Не передаем товары в LLM, а используем их напрямую
-        # LLM будет анализировать текстовый каталог и выбирать ID товаров
-        # А мы потом найдем эти товары в нашем списке all_products_for_return
-        
-
-        
-        # Временное решение: возвращаем первые подходящие товары
-        limited_products = all_products_for_return[:8]
+        limited_products = [to_agent_product(db_product) for db_product in candidates[:max_results]]
         
         return ProductList(
             products=limited_products,
-            search_query=f"{search_query} [Упрощенная выдача]",
+            search_query=search_query,
             total_found=len(limited_products)
         )
         
@@ -264,7 +208,7 @@ async def recommend_styling_items(
 ) -> ProductList:
     """
     Рекомендация товаров из каталога для стилизации с базовой вещью.
-    LLM получает ВЕСЬ каталог и сам выбирает подходящие для стилизации товары.
+    Кандидаты отбираются по базовой вещи и стилю, а не из всего каталога.
     
     Args:
         base_item: Базовая вещь для создания стилизации
@@ -277,53 +221,17 @@ async def recommend_styling_items(
         db = ctx.deps.db
         print(f"🎨 Ищем стилизацию для: {base_item} (стиль: {style_type})")
         
-        # Получаем ВЕСЬ каталог для анализа LLM
-        full_catalog = await get_full_catalog_for_llm(db)
-        print(f"📦 Каталог загружен для стилизации")
+        # Получаем кандидатов под базовую вещь и стиль
+        candidates = await load_catalog_candidates(db, f"{base_item} {style_type}")
+        print(f"📦 Отобрано кандидатов для стилизации: {len(candidates)}")
         
-        # Получаем все активные товары для создания рекомендаций
-        all_products = db.query(DBProduct).join(DBStore).filter(
-            DBProduct.is_active == True,
-            DBProduct.stock_quantity > 0
-        ).order_by(desc(DBProduct.rating), DBProduct.name).all()
-        
-        print(f"   Анализируем {len(all_products)} товаров для стилизации")
-        
-        # Создаем список всех товаров для стилизации
         all_styling_products = []
-        for db_product in all_products:
-            # Форматируем цену
-            price_str = f"₸{db_product.price:,.0f}"
-            original_price_str = None
-            if db_product.original_price and db_product.original_price > db_product.price:
-                original_price_str = f"₸{db_product.original_price:,.0f}"
-            
+        for db_product in candidates:
             # Добавляем контекст стилизации в описание
             style_desc = f"Подходит для стилизации с {base_item}. {db_product.description or 'Стильная вещь от H&M'}"
-            
-            # ИСПРАВЛЕНИЕ: Правильно обрабатываем изображения
-            final_images = []
-            if db_product.image_urls and isinstance(db_product.image_urls, list):
-                # Фильтруем пустые строки и невалидные URL
-                final_images = [img for img in db_product.image_urls if img and img.strip()]
-            
-            product = Product(
-                name=db_product.name,
-                price=price_str,
-                description=style_desc,
-                link=f"/products/{db_product.id}",
-                image_urls=final_images,
-                original_price=original_price_str,
-                store_name=db_product.store.name,
-                store_city=db_product.store.city,
-                sizes=db_product.sizes or [],
-                colors=db_product.colors or [],
-                in_stock=db_product.stock_quantity > 0
-            )
-            all_styling_products.append(product)
+            all_styling_products.append(to_agent_product(db_product, description=style_desc[:500]))
         
-        # Формируем запрос для LLM анализа
-        styling_query = f"Стилизация для: {base_item} (стиль: {style_type}) [КАТАЛОГ: {len(all_products)} товаров]"
+        styling_query = f"Стилизация для: {base_item} (стиль: {style_type})"
         
         return ProductList(
             products=all_styling_products,
@@ -345,11 +253,12 @@ async def search_catalog_products(
     user_id: int, 
     db: Session, 
     chat_id: int, 
-    message_history: List[ModelMessage] = None
+    message_history: List[ModelMessage] = None,
+    max_results: int = 10
 ) -> ProductList:
     """
     Главная точка входа для поиска в каталоге с контекстом беседы.
-    Получает ВЕСЬ каталог и отправляет его LLM для анализа запроса пользователя.
+    Отбирает top-K кандидатов под запрос пользователя вместо всего каталога.
     
     Args:
         message: Сообщение пользователя для поиска
@@ -357,6 +266,7 @@ async def search_catalog_products(
         db: Сессия базы данных
         chat_id: ID чата
         message_history: Предыдущая беседа для контекста
+        max_results: Максимальное количество товаров в ответе
         
     Returns:
         ProductList: Результаты поиска из внутреннего каталога
@@ -364,74 +274,23 @@ async def search_catalog_products(
     try:
         print(f"🛍️ Начинаем поиск в каталоге H&M: {message}")
         
-        # Получаем ПОЛНЫЙ каталог для анализа LLM
-        full_catalog = await get_full_catalog_for_llm(db)
-        print(f"📦 Каталог получен для LLM анализа")
+        # Отбираем кандидатов под запрос (размер не зависит от размера каталога)
+        candidates = await load_catalog_candidates(db, message)
+        print(f"📦 Отобрано кандидатов: {len(candidates)}")
         
-        # Создаем расширенное сообщение с каталогом
-        enhanced_message = f"""
-ЗАПРОС ПОЛЬЗОВАТЕЛЯ: {message}
-
-{full_catalog}
-
-ЗАДАЧА: Проанализируйте запрос пользователя "{message}" и найдите наиболее подходящие товары из приведенного выше каталога H&M. 
-
-Учитывайте:
-- Семантическое сходство с запросом
-- Категорию и тип товара
-- Цвет (если указан)
-- Стиль и повод
-- Описание и характеристики товаров
-- Цену и доступность
-
-Выберите максимум 10 наиболее релевантных товаров и верните их в формате ProductList с объяснением почему каждый товар подходит под запрос.
-"""
-        
-        # ИСПРАВЛЕНИЕ: Напрямую создаем список товаров из БД (без LLM для сохранения изображений)
-        
-        # Получаем все активные товары для создания ответа
-        all_products = db.query(DBProduct).join(DBStore).filter(
-            DBProduct.stock_quantity >= 0
-        ).order_by(DBProduct.name).all()
-        
-        # Создаем список товаров с правильными изображениями
+        # Напрямую создаем список товаров из БД (без LLM для сохранения изображений)
         products_with_images = []
-        for db_product in all_products:
-            # Форматируем цену
-            price_str = f"₸{db_product.price:,.0f}"
-            original_price_str = None
-            if db_product.original_price and db_product.original_price > db_product.price:
-                original_price_str = f"₸{db_product.original_price:,.0f}"
-            
-            # ИСПРАВЛЕНИЕ: Правильно обрабатываем изображения
-            final_images = []
-            if db_product.image_urls and isinstance(db_product.image_urls, list):
-                # Фильтруем пустые строки и невалидные URL
-                final_images = [img for img in db_product.image_urls if img and img.strip()]
-            
-            # Создаем объект товара
-            product = Product(
-                name=db_product.name,
-                price=price_str,
-                description=db_product.description or "Стильная вещь от H&M",
-                link=f"/products/{db_product.id}",
-                image_urls=final_images,  # ИСПРАВЛЕНИЕ: передаем массив валидных изображений
-                original_price=original_price_str,
-                store_name=db_product.store.name,
-                store_city=db_product.store.city,
-                sizes=db_product.sizes or [],
-                colors=db_product.colors or [],
-                in_stock=db_product.stock_quantity > 0
-            )
+        for db_product in candidates[:max_results]:
+            product = to_agent_product(db_product)
             products_with_images.append(product)
+            await emit_event("product", product)
         
         result = ProductList(
             products=products_with_images,
-            search_query=f"{message} [Прямая выдача из БД]",
+            search_query=message,
             total_found=len(products_with_images)
         )
         
-
         return result
         
     except Exception as e:
@@ -440,4 +299,4 @@ async def search_catalog_products(
             products=[],
             search_query=message,
             total_found=0
-        ) 
\ No newline at end of file
+        )
@@ -1,13 +1,18 @@
 import time
+from pydantic import ValidationError
 from pydantic_ai import Agent, RunContext, ModelRetry
-from typing import Union, List
+from typing import Union, List, Optional
 from sqlalchemy.orm import Session
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from .base import get_azure_llm, AgentResponse, ProductList, Outfit, GeneralResponse, MessageHistory
 from .catalog_search_agent import get_catalog_search_agent, search_catalog_products  # Поиск в локальном каталоге
-from .outfit_agent import create_outfit_agent  
+from .outfit_agent import OutfitDependencies, get_outfit_agent
 from .general_agent import get_general_agent
-from src.models.chat import Message as DBMessage
+from .history_manager import load_chat_history
+from .intent_router import classify_intent
+from src.agent.streaming import emit_event, is_streaming
+from src.agent.response_cache import cache_response, get_cached_response
+from src.agent.usage_tracker import record_usage
 from pydantic_ai.messages import ModelMessage
 
 
@@ -17,6 +22,8 @@ class CoordinatorDependencies:
     user_id: int
     db: Session
     chat_id: int
+    # История чата загружается один раз в coordinate_request и переиспользуется инструментами
+    history: MessageHistory = field(default_factory=MessageHistory)
 
 
 # Cached coordinator agent for better performance with enhanced validation
@@ -175,27 +182,17 @@ Please consider the conversation history when providing your response. If this i
     return user_message
 
 
-async def search_products(ctx: RunContext[CoordinatorDependencies], user_message: str) -> ProductList:
-    """
-    Search for products in the internal H&M catalog based on user query.
-    Now searches only in local database catalog instead of external sources.
-    
-    Args:
-        user_message: The user's search request
-        
-    Returns:
-        ProductList: Search results from internal H&M catalog
-    """
+async def _search_products(deps: CoordinatorDependencies, user_message: str) -> ProductList:
+    """Поиск в каталоге: общий код инструмента и быстрого пути без LLM-координатора."""
     try:
-        # Get chat history for context
-        history = await get_chat_history(ctx.deps.db, ctx.deps.chat_id)
+        history = deps.history
         
         # Поиск в локальном каталоге H&M
         result = await search_catalog_products(
             message=user_message,
-            user_id=ctx.deps.user_id,
-            db=ctx.deps.db,
-            chat_id=ctx.deps.chat_id,
+            user_id=deps.user_id,
+            db=deps.db,
+            chat_id=deps.chat_id,
             message_history=history.to_pydantic_ai_messages()
         )
         return result
@@ -210,32 +207,40 @@ async def search_products(ctx: RunContext[CoordinatorDependencies], user_message
         )
 
 
-async def recommend_outfit(ctx: RunContext[CoordinatorDependencies], user_message: str) -> Outfit:
+async def search_products(ctx: RunContext[CoordinatorDependencies], user_message: str) -> ProductList:
     """
-    Recommend outfit based on user's wardrobe and preferences with conversation context.
-    Enhanced with chat history for better contextual understanding.
+    Search for products in the internal H&M catalog based on user query.
+    Now searches only in local database catalog instead of external sources.
     
     Args:
-        user_message: The user's outfit request
+        user_message: The user's search request
         
     Returns:
-        Outfit: Outfit recommendation
+        ProductList: Search results from internal H&M catalog
     """
+    await emit_event("routing", {"agent_type": "search", "source": "coordinator"})
+    return await _search_products(ctx.deps, user_message)
+
+
+async def _recommend_outfit(deps: CoordinatorDependencies, user_message: str) -> Outfit:
+    """Подбор образа: общий код инструмента и быстрого пути без LLM-координатора."""
     try:
-        user_id = ctx.deps.user_id
-        
-        # Get chat history for context
-        history = await get_chat_history(ctx.deps.db, ctx.deps.chat_id)
+        user_id = deps.user_id
+        history = deps.history
         
         # Create contextual prompt
         contextual_prompt = create_contextual_prompt(user_message, history, "outfit")
         
-        # Create outfit agent for this specific user
-        outfit_agent = create_outfit_agent(user_id)
+        # Shared outfit agent; user and request session are passed as dependencies
+        outfit_agent = get_outfit_agent()
         result = await outfit_agent.run(
             contextual_prompt,
-            message_history=history.to_pydantic_ai_messages()
+            message_history=history.to_pydantic_ai_messages(),
+            deps=OutfitDependencies(user_id=user_id, db=deps.db)
         )
+        record_usage("outfit", result)
+        for item in result.data.items:
+            await emit_event("outfit_item", item)
         return result.data
     except Exception as e:
         print(f"Error in recommend_outfit: {e}")
@@ -248,25 +253,33 @@ async def recommend_outfit(ctx: RunContext[CoordinatorDependencies], user_messag
         )
 
 
-async def handle_general_query(ctx: RunContext[CoordinatorDependencies], user_message: str) -> GeneralResponse:
+async def recommend_outfit(ctx: RunContext[CoordinatorDependencies], user_message: str) -> Outfit:
     """
-    Handle general conversation and questions using cached general agent.
-    Enhanced with validation to ensure reliable results.
+    Recommend outfit based on user's wardrobe and preferences with conversation context.
+    Enhanced with chat history for better contextual understanding.
     
     Args:
-        user_message: The user's general question
+        user_message: The user's outfit request
         
     Returns:
-        GeneralResponse: General response
+        Outfit: Outfit recommendation
     """
+    await emit_event("routing", {"agent_type": "outfit", "source": "coordinator"})
+    return await _recommend_outfit(ctx.deps, user_message)
+
+
+async def _handle_general_query(deps: CoordinatorDependencies, user_message: str) -> GeneralResponse:
+    """Общий ответ: общий код инструмента и быстрого пути без LLM-координатора."""
     try:
-        # Get chat history from context
-        history = await get_chat_history(ctx.deps.db, ctx.deps.chat_id)
+        history = deps.history
         general_agent = get_general_agent()
+        if is_streaming():
+            return await _stream_general_response(general_agent, user_message, history)
         result = await general_agent.run(
             user_message,
             message_history=history.to_pydantic_ai_messages()
         )
+        record_usage("general", result)
         return result.data
     except Exception as e:
         print(f"Error in handle_general_query: {e}")
@@ -278,24 +291,63 @@ async def handle_general_query(ctx: RunContext[CoordinatorDependencies], user_me
         )
 
 
-async def get_chat_history(db: Session, chat_id: int) -> MessageHistory:
-    """Fetch chat history from database with error handling."""
+async def _stream_general_response(general_agent: Agent, user_message: str, history: MessageHistory) -> GeneralResponse:
+    """Run the general agent in streaming mode and emit the response text as it grows."""
+    sent = 0
+    async with general_agent.run_stream(
+        user_message,
+        message_history=history.to_pydantic_ai_messages()
+    ) as result:
+        async for message, last in result.stream_structured(debounce_by=0.05):
+            try:
+                partial = await result.validate_structured_output(message, allow_partial=not last)
+            except ValidationError:
+                continue
+            text = getattr(partial, "response", None) or ""
+            if len(text) > sent:
+                await emit_event("text", {"delta": text[sent:]})
+                sent = len(text)
+        output = await result.get_output()
+        record_usage("general", result)
+        return output
+
+
+async def handle_general_query(ctx: RunContext[CoordinatorDependencies], user_message: str) -> GeneralResponse:
+    """
+    Handle general conversation and questions using cached general agent.
+    Enhanced with validation to ensure reliable results.
+    
+    Args:
+        user_message: The user's general question
+        
+    Returns:
+        GeneralResponse: General response
+    """
+    await emit_event("routing", {"agent_type": "general", "source": "coordinator"})
+    return await _handle_general_query(ctx.deps, user_message)
+
+
+# Обработчики для сообщений, которые intent_router классифицировал без LLM
+FAST_PATH_HANDLERS = {
+    "search": _search_products,
+    "outfit": _recommend_outfit,
+    "general": _handle_general_query,
+}
+
+
+async def _replay_cached_events(result: Union[ProductList, GeneralResponse]) -> None:
+    """Emit the same stream events for a cached response as a live run would."""
+    if isinstance(result, ProductList):
+        for product in result.products:
+            await emit_event("product", product)
+    elif isinstance(result, GeneralResponse):
+        await emit_event("text", {"delta": result.response})
+
+
+async def get_chat_history(db: Session, chat_id: int, current_message: Optional[str] = None) -> MessageHistory:
+    """Fetch the token-budgeted chat history (recent window + rolling summary) with error handling."""
     try:
-        messages = (
-            db.query(DBMessage)
-            .filter(DBMessage.chat_id == chat_id)
-            .order_by(DBMessage.created_at.asc())
-            .all()
-        )
-        # Convert SQLAlchemy models to dictionaries
-        message_dicts = [
-            {
-                "role": msg.role,
-                "content": msg.content
-            }
-            for msg in messages
-        ]
-        return MessageHistory(messages=message_dicts)
+        return load_chat_history(db, chat_id, current_message)
     except Exception as e:
         print(f"Error fetching chat history: {e}")
         return MessageHistory(messages=[])
@@ -318,29 +370,49 @@ async def coordinate_request(message: str, user_id: int, db: Session, chat_id: i
     start_time = time.time()
     
     try:
+        # Get chat history once: coordinator and sub-agents share it via deps
+        history = await get_chat_history(db, chat_id, message)
+        
         # Create dependencies
         deps = CoordinatorDependencies(
             user_id=user_id,
             db=db,
-            chat_id=chat_id
+            chat_id=chat_id,
+            history=history
         )
         
-        # Get chat history for better routing decisions
-        history = await get_chat_history(db, chat_id)
-        
-        # Use the cached coordinator agent to handle the request with context
-        coordinator_agent = get_coordinator_agent()
-        result = await coordinator_agent.run(
-            message,
-            deps=deps,
-            message_history=history.to_pydantic_ai_messages()
-        )
+        # Fast path: confidently classified messages go straight to the sub-agent
+        decision = classify_intent(message, history)
+        if decision is not None:
+            print(f"🧭 Fast-path routing to {decision.agent_type} ({decision.source}, confidence {decision.confidence})")
+            result_data = get_cached_response(decision.agent_type, message, history)
+            await emit_event("routing", {
+                "agent_type": decision.agent_type,
+                "source": decision.source,
+                "confidence": decision.confidence,
+                "cached": result_data is not None
+            })
+            if result_data is not None:
+                await _replay_cached_events(result_data)
+            else:
+                result_data = await FAST_PATH_HANDLERS[decision.agent_type](deps, message)
+                cache_response(decision.agent_type, message, history, result_data)
+            response = AgentResponse(result=result_data, agent_type=decision.agent_type)
+        else:
+            # Use the cached coordinator agent to handle ambiguous requests with context
+            coordinator_agent = get_coordinator_agent()
+            result = await coordinator_agent.run(
+                message,
+                deps=deps,
+                message_history=history.to_pydantic_ai_messages()
+            )
+            record_usage("coordinator", result)
+            response = result.data
         
         # Calculate processing time
         processing_time = (time.time() - start_time) * 1000  # Convert to milliseconds
         
         # Ensure we have the processing time set
-        response = result.data
         response.processing_time_ms = processing_time
         
         return response
@@ -1,6 +1,7 @@
 from pydantic_ai import Agent, ModelRetry
 from typing import List
 from .base import get_azure_llm, GeneralResponse, MessageHistory
+from src.agent.usage_tracker import record_usage
 from pydantic_ai.messages import ModelMessage
 
 
@@ -115,6 +116,7 @@ async def handle_general_query(message: str, message_history: List[ModelMessage]
             message,
             message_history=message_history
         )
+        record_usage("general", result)
         return result.data
     except Exception as e:
         print(f"Error in handle_general_query: {e}")
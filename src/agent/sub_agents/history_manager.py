@@ -0,0 +1,239 @@
+"""
+Ограниченная по токенам история чата для агентов.
+
+Раньше в промпт уходила вся переписка, причём каждый ответ ассистента – полный
+JSON AgentResponse (часто целый список товаров). Здесь история собирается так:
+
+* последние ``CHAT_HISTORY_TURNS`` пар сообщений передаются дословно, но
+  структурированные ответы (ProductList / Outfit) сворачиваются в короткие ссылки;
+* более старые сообщения сворачиваются в скользящее резюме, которое хранится в
+  ``chats.history_summary`` вместе с id последнего учтённого сообщения, поэтому
+  каждое сообщение читается из БД и сворачивается ровно один раз;
+* если окно вместе с резюме не помещается в ``CHAT_HISTORY_TOKEN_BUDGET`` токенов,
+  самые старые сообщения окна тоже уходят в резюме, а резюме ограничено
+  ``CHAT_SUMMARY_MAX_TOKENS`` (старые строки отбрасываются).
+
+Резюме экстрактивное (без вызова LLM), чтобы не добавлять ещё один запрос к модели.
+"""
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from src.database import SessionLocal
+from src.models.chat import Chat, Message as DBMessage
+from src.utils.token_counter import count_tokens_batch
+from .base import MessageHistory
+
+
+HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", "6"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "3000"))
+SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "600"))
+
+_SUMMARY_USER_CHARS = 200
+_SUMMARY_ASSISTANT_CHARS = 300
+_PREVIEW_ITEMS = 5
+
+
+def _truncate(text: str, limit: int) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= limit else text[: limit - 1].rstrip() + "…"
+
+
+def _parse_agent_response(content: str) -> Optional[Dict[str, Any]]:
+    if not content or not content.lstrip().startswith("{"):
+        return None
+    try:
+        payload = json.loads(content)
+    except ValueError:
+        return None
+    if isinstance(payload, dict) and isinstance(payload.get("result"), dict) and "agent_type" in payload:
+        return payload
+    return None
+
+
+def compact_assistant_message(content: str) -> str:
+    """
+    Свернуть сохранённый AgentResponse в короткое текстовое описание.
+    Обычный текст возвращается без изменений.
+    """
+    payload = _parse_agent_response(content)
+    if payload is None:
+        return content
+
+    result = payload["result"]
+    agent_type = payload.get("agent_type")
+
+    if agent_type == "search":
+        products = result.get("products") or []
+        names = [
+            f"{p.get('name')} ({p.get('price')})" if p.get("price") else str(p.get("name"))
+            for p in products[:_PREVIEW_ITEMS]
+        ]
+        more = f" и ещё {len(products) - _PREVIEW_ITEMS}" if len(products) > _PREVIEW_ITEMS else ""
+        query = result.get("search_query") or ""
+        if not products:
+            return f"[Поиск товаров «{query}»: ничего не найдено]"
+        return f"[Показаны товары по запросу «{query}», {len(products)} шт.: {', '.join(names)}{more}]"
+
+    if agent_type == "outfit":
+        items = [
+            f"{item.get('name')} ({item.get('category')})"
+            for item in (result.get("items") or [])
+        ]
+        description = result.get("outfit_description") or ""
+        occasion = result.get("occasion") or ""
+        return f"[Предложен образ ({occasion}): {description} Вещи: {', '.join(items) or 'нет'}]"
+
+    return result.get("response") or content
+
+
+def _summary_line(role: str, content: str) -> str:
+    if role == "user":
+        return f"Пользователь: {_truncate(content, _SUMMARY_USER_CHARS)}"
+    return f"Ассистент: {_truncate(compact_assistant_message(content), _SUMMARY_ASSISTANT_CHARS)}"
+
+
+def fold_into_summary(summary: Optional[str], messages: List[Tuple[str, str]]) -> str:
+    """
+    Добавить сообщения в резюме и обрезать его до SUMMARY_MAX_TOKENS,
+    отбрасывая самые старые строки.
+    """
+    lines = [line for line in (summary or "").splitlines() if line.strip()]
+    lines.extend(_summary_line(role, content) for role, content in messages)
+
+    # Строки считаются одним батчем; перевод строки – примерно один токен
+    tokens = count_tokens_batch(lines)
+    total = sum(tokens) + len(lines) - 1
+    start = 0
+    while len(lines) - start > 1 and total > SUMMARY_MAX_TOKENS:
+        total -= tokens[start] + 1
+        start += 1
+    return "\n".join(lines[start:])
+
+
+def build_window(
+    messages: List[Tuple[int, str, str]],
+    summary: Optional[str],
+    turns: int = HISTORY_TURNS,
+    token_budget: int = HISTORY_TOKEN_BUDGET,
+) -> Tuple[List[Dict[str, str]], List[Tuple[int, str, str]]]:
+    """
+    Разделить новые сообщения на окно (дословно) и те, что уходят в резюме.
+
+    Args:
+        messages: (id, role, content) по возрастанию id
+        summary: Текущее резюме
+        turns: Сколько последних пар сообщений оставить
+        token_budget: Бюджет токенов на резюме и окно
+
+    Returns:
+        Tuple: Сообщения окна в формате MessageHistory и сообщения для резюме
+    """
+    split = max(len(messages) - turns * 2, 0)
+    to_fold = list(messages[:split])
+    window = [
+        (message_id, role, compact_assistant_message(content) if role != "user" else content)
+        for message_id, role, content in messages[split:]
+    ]
+
+    summary_tokens, *tokens = count_tokens_batch([summary or ""] + [content for _, _, content in window])
+    budget = token_budget - summary_tokens
+    while len(window) > 1 and sum(tokens) > budget:
+        # Сворачиваем исходное сообщение, а не его компактную форму
+        folded_id = window.pop(0)[0]
+        tokens.pop(0)
+        to_fold.extend(m for m in messages if m[0] == folded_id)
+
+    return [{"role": role, "content": content} for _, role, content in window], to_fold
+
+
+def save_chat_summary(chat_id: int, expected_message_id: Optional[int], summary: str, summary_message_id: int) -> bool:
+    """
+    Сохранить резюме в отдельной короткой сессии, не трогая сессию запроса.
+
+    Обновление условное (``WHERE summary_message_id = expected_message_id``): если
+    параллельный запрос уже сдвинул резюме, запись пропускается, и одни и те же
+    сообщения не сворачиваются дважды.
+
+    Returns:
+        bool: True, если резюме записано
+    """
+    if expected_message_id is None:
+        moved_by_other = Chat.summary_message_id.is_(None)
+    else:
+        moved_by_other = Chat.summary_message_id == expected_message_id
+
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            update(Chat)
+            .where(Chat.id == chat_id, moved_by_other)
+            .values(history_summary=summary, summary_message_id=summary_message_id)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        return result.rowcount == 1
+    except Exception as e:
+        # Резюме пересчитается при следующем сообщении
+        print(f"Error saving chat summary for chat {chat_id}: {e}")
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+
+def load_chat_history(db: Session, chat_id: int, current_message: Optional[str] = None) -> MessageHistory:
+    """
+    Загрузить историю чата для агентов с учётом окна, резюме и бюджета токенов.
+
+    Args:
+        db: Сессия запроса (только чтение, резюме пишется в отдельной сессии)
+        chat_id: ID чата
+        current_message: Текущее сообщение пользователя. Оно уже сохранено в чате,
+            но передаётся агенту как prompt, поэтому из истории исключается
+
+    Returns:
+        MessageHistory: Окно сообщений и резюме более ранней части разговора
+    """
+    chat = db.get(Chat, chat_id)
+    if chat is None:
+        return MessageHistory(messages=[])
+
+    query = db.query(DBMessage.id, DBMessage.role, DBMessage.content).filter(DBMessage.chat_id == chat_id)
+    if chat.summary_message_id:
+        query = query.filter(DBMessage.id > chat.summary_message_id)
+    messages = [(row.id, row.role, row.content) for row in query.order_by(DBMessage.id.asc()).all()]
+
+    if current_message is not None and messages and messages[-1][1] == "user" and messages[-1][2] == current_message:
+        messages = messages[:-1]
+
+    window, to_fold = build_window(messages, chat.history_summary)
+    summary = chat.history_summary
+
+    if to_fold:
+        summary = fold_into_summary(summary, [(role, content) for _, role, content in to_fold])
+        # Для этого запроса резюме уже посчитано; если запись пропущена, значит
+        # параллельный запрос сохранил своё, и его подхватит следующее сообщение
+        save_chat_summary(
+            chat_id,
+            chat.summary_message_id,
+            summary,
+            max(message_id for message_id, _, _ in to_fold),
+        )
+
+    return MessageHistory(messages=window, summary=summary or None)
+
+
+__all__ = [
+    "HISTORY_TURNS",
+    "HISTORY_TOKEN_BUDGET",
+    "SUMMARY_MAX_TOKENS",
+    "compact_assistant_message",
+    "fold_into_summary",
+    "build_window",
+    "save_chat_summary",
+    "load_chat_history",
+]
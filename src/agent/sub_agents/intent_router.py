@@ -0,0 +1,181 @@
+"""
+Быстрая локальная маршрутизация сообщений перед LLM-координатором.
+
+Координатор тратит отдельный запрос к модели только на то, чтобы выбрать один из
+трёх инструментов. Большинство сообщений классифицируется однозначно по ключевым
+словам из его же системного промпта, поэтому здесь:
+
+* правила (регулярные выражения + сигналы каталога из ``catalog_retrieval``)
+  набирают баллы для search / outfit / general;
+* опционально – лёгкая линейная модель из JSON-файла ``INTENT_MODEL_PATH``
+  (веса по стемам токенов, softmax по классам);
+* если уверенность ниже порога, возвращается None и запрос уходит в LLM-координатор.
+
+Короткие уточнения в середине разговора («а подешевле?», «другой цвет») всегда
+считаются неоднозначными: для них нужен контекст, который учитывает координатор.
+"""
+import json
+import math
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .base import MessageHistory
+from .catalog_retrieval import parse_query_signals, tokenize
+
+
+ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "true").lower() in ("1", "true", "yes")
+MIN_CONFIDENCE = float(os.getenv("INTENT_ROUTER_MIN_CONFIDENCE", "0.75"))
+MODEL_PATH = os.getenv("INTENT_MODEL_PATH", "")
+MODEL_MIN_CONFIDENCE = float(os.getenv("INTENT_MODEL_MIN_CONFIDENCE", "0.85"))
+
+INTENTS = ("search", "outfit", "general")
+
+# (интент, вес, паттерн) – ключевые слова из промпта координатора на русском и английском
+_RULES: List[Tuple[str, float, re.Pattern]] = [
+    ("search", 2.0, re.compile(
+        r"\b(найди|найти|покажи|показать|ищу|поищи|подбери\s+(?!образ|лук|outfit)|хочу\s+купить|куплю|купить|"
+        r"сколько\s+стоит|есть\s+ли|в\s+наличии|в\s+каталоге|"
+        r"find|show\s+me|looking\s+for|search|buy|in\s+stock|how\s+much)\b", re.IGNORECASE)),
+    ("search", 1.0, re.compile(r"\b(хочу|нужн\w*|want|need|цен[аыу]|стоимост\w*|дешев\w*|скидк\w*|магазин\w*|бренд\w*|price|cheap\w*|discount|store|brand)\b", re.IGNORECASE)),
+    ("outfit", 2.5, re.compile(
+        r"(что\s+(мне\s+)?(надеть|одеть|носить)|в\s+ч[её]м\s+(пойти|идти)|"
+        r"\b(образ\w*|лук\w*|аутфит\w*|гардероб\w*|комплект\w*|сочета\w*)\b|"
+        r"\b(what\s+(should\s+i\s+|to\s+)wear|outfit\w*|wardrobe)\b)", re.IGNORECASE)),
+    ("outfit", 1.0, re.compile(r"\b(стил\w*|одеться|наряд\w*|style|dress\s+up|fashion)\b", re.IGNORECASE)),
+    ("general", 2.5, re.compile(
+        r"^\s*(привет\w*|здравствуй\w*|добр\w+\s+(утро|день|вечер)|салем|сәлем|хай|"
+        r"спасибо|благодарю|пока|до\s+свидания|hi|hello|hey|thanks|thank\s+you|bye)\b[\s!.,)]*$", re.IGNORECASE)),
+    ("general", 1.5, re.compile(
+        r"\b(кто\s+ты|что\s+ты\s+умеешь|как\s+(ты\s+)?работаешь|помощь|help|who\s+are\s+you|what\s+can\s+you\s+do)\b", re.IGNORECASE)),
+]
+
+# Признаки уточнения предыдущего запроса, которому нужен контекст
+_FOLLOW_UP_RE = re.compile(
+    r"^\s*(а|и|ещё|еще|тогда|лучше|другой|другую|другие|подешевле|подороже|побольше|поменьше|"
+    r"такой\s+же|такую\s+же|also|and|another|other|cheaper|same)\b", re.IGNORECASE
+)
+_FOLLOW_UP_MAX_WORDS = 4
+
+
+@dataclass
+class IntentDecision:
+    """Результат локальной классификации."""
+    agent_type: str
+    confidence: float
+    source: str  # rules | model
+
+
+class IntentModel:
+    """
+    Линейная модель по стемам токенов.
+
+    Формат файла: {"intents": [...], "bias": {intent: b}, "weights": {stem: {intent: w}}}
+    """
+
+    def __init__(self, intents: List[str], bias: Dict[str, float], weights: Dict[str, Dict[str, float]]):
+        self.intents = [i for i in intents if i in INTENTS]
+        self.bias = bias
+        self.weights = weights
+
+    @classmethod
+    def load(cls, path: str) -> "IntentModel":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("intents", list(INTENTS)), data.get("bias", {}), data.get("weights", {}))
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        scores = {intent: self.bias.get(intent, 0.0) for intent in self.intents}
+        for token in set(tokenize(text)):
+            for intent, weight in self.weights.get(token, {}).items():
+                if intent in scores:
+                    scores[intent] += weight
+        top = max(scores.values())
+        exp = {intent: math.exp(score - top) for intent, score in scores.items()}
+        total = sum(exp.values())
+        best = max(exp, key=exp.get)
+        return best, exp[best] / total
+
+
+_intent_model: Optional[IntentModel] = None
+_intent_model_loaded = False
+
+
+def get_intent_model() -> Optional[IntentModel]:
+    """Модель загружается с диска один раз; без INTENT_MODEL_PATH работают только правила."""
+    global _intent_model, _intent_model_loaded
+
+    if not _intent_model_loaded:
+        _intent_model_loaded = True
+        if MODEL_PATH and os.path.exists(MODEL_PATH):
+            try:
+                _intent_model = IntentModel.load(MODEL_PATH)
+                print(f"🧭 Intent model loaded from {MODEL_PATH}")
+            except Exception as e:
+                print(f"Error loading intent model from {MODEL_PATH}: {e}")
+    return _intent_model
+
+
+def score_rules(message: str) -> Dict[str, float]:
+    """Баллы правил по каждому интенту."""
+    scores = {intent: 0.0 for intent in INTENTS}
+    for intent, weight, pattern in _RULES:
+        if pattern.search(message):
+            scores[intent] += weight
+
+    # Категория, цвет, размер или цена из каталога – признак поиска товара
+    signals = parse_query_signals(message)
+    if signals.categories:
+        scores["search"] += 1.0
+    if signals.colors or signals.sizes or signals.min_price is not None or signals.max_price is not None:
+        scores["search"] += 1.0
+    return scores
+
+
+def _is_follow_up(message: str, history: Optional[MessageHistory], scores: Dict[str, float]) -> bool:
+    if history is None or not (history.messages or history.summary):
+        return False
+    if _FOLLOW_UP_RE.search(message):
+        return True
+    # Короткая реплика без явных ключевых слов – скорее всего продолжение разговора
+    return len(message.split()) <= _FOLLOW_UP_MAX_WORDS and max(scores.values()) < 2.0
+
+
+def classify_intent(message: str, history: Optional[MessageHistory] = None) -> Optional[IntentDecision]:
+    """
+    Определить агента для сообщения без LLM.
+
+    Returns:
+        Optional[IntentDecision]: Решение или None, если сообщение неоднозначное
+    """
+    if not ROUTER_ENABLED or not message or not message.strip():
+        return None
+    scores = score_rules(message)
+    if _is_follow_up(message, history, scores):
+        return None
+
+    total = sum(scores.values())
+    if total > 0:
+        best = max(scores, key=scores.get)
+        confidence = scores[best] / total
+        # Нужна и доля, и абсолютный балл: одно слабое совпадение не считается уверенным
+        if confidence >= MIN_CONFIDENCE and scores[best] >= 2.0:
+            return IntentDecision(agent_type=best, confidence=round(confidence, 3), source="rules")
+
+    model = get_intent_model()
+    if model is not None:
+        best, probability = model.predict(message)
+        if probability >= MODEL_MIN_CONFIDENCE:
+            return IntentDecision(agent_type=best, confidence=round(probability, 3), source="model")
+
+    return None
+
+
+__all__ = [
+    "IntentDecision",
+    "IntentModel",
+    "get_intent_model",
+    "score_rules",
+    "classify_intent",
+]
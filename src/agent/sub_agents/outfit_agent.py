@@ -1,203 +1,185 @@
 import json
-from pydantic_ai import Agent, ModelRetry
-from typing import List
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+from pydantic_ai import Agent, ModelRetry, RunContext
+from sqlalchemy.orm import Session
 from .base import get_azure_llm, Outfit, OutfitItem
+from .outfit_catalog import get_outfit_catalog_index
 from src.database import get_db_session
-from src.models.clothing import ClothingItem
-from src.models.product import Product as DBProduct
-from src.models.store import Store as DBStore
+from src.agent.usage_tracker import record_usage
+from src.utils.catalog_snapshot import get_catalog_snapshot
+from src.utils.wardrobe_snapshot import WARDROBE_REF_PREFIX, get_wardrobe_snapshot
 from pydantic_ai.messages import ModelMessage
 
 
-# Cache for outfit agents by user_id
-_outfit_agents_cache = {}
-
-
-class WardrobeManager:
-    """A class to manage wardrobe-related tools, ensuring they have user context."""
-
-    def __init__(self, user_id: int, db_session=None):
-        if not isinstance(user_id, int):
-            raise TypeError("user_id must be an integer.")
-        self.user_id = user_id
-        # Use provided session or create a new one for this manager
-        self.db = db_session if db_session is not None else get_db_session()
-        self._owns_session = db_session is None  # Track if we created the session
-
-    def close_session(self):
-        """Explicitly close the database session if we own it."""
-        if hasattr(self, 'db') and self._owns_session:
-            try:
-                self.db.close()
-            except Exception as e:
-                print(f"Error closing database session in WardrobeManager: {e}")
-
-    def __del__(self):
-        """Cleanup session on object destruction as fallback."""
-        if hasattr(self, '_owns_session') and self._owns_session:
-            self.close_session()
-
-    def get_user_wardrobe(self) -> str:
-        """
-        Retrieves all clothing items from the authenticated user's wardrobe.
-        Returns structured data for enhanced AI processing.
-        """
-        print(f"Fetching wardrobe for user_id: {self.user_id}")
-        try:
-            items = (
-                self.db.query(ClothingItem)
-                .filter(ClothingItem.user_id == self.user_id)
-                .all()
-            )
+# Shared outfit agent instance; the user is passed per run via OutfitDependencies
+_outfit_agent_instance = None
 
-            if not items:
-                return json.dumps(
-                    {
-                        "status": "success",
-                        "wardrobe": [],
-                        "total_items": 0,
-                        "message": "The user's wardrobe is empty. You should inform the user about this and suggest adding clothing items.",
-                    }
-                )
-
-            # Enhanced wardrobe data with categorization
-            wardrobe = []
-            categories = {}
-            
-            for item in items:
-                item_data = {
-                    "name": item.name,
-                    "image_url": item.image_url,
-                    "category": item.category,
-                    "features": item.features,
-                }
-                wardrobe.append(item_data)
-                
-                # Count by category for better outfit planning
-                categories[item.category] = categories.get(item.category, 0) + 1
-            
-            return json.dumps({
-                "status": "success", 
-                "wardrobe": wardrobe,
-                "total_items": len(wardrobe),
-                "categories": categories,
-                "message": f"Found {len(wardrobe)} items across {len(categories)} categories."
-            })
-            
-        except Exception as e:
-            print(f"An error occurred in get_user_wardrobe: {e}")
-            return json.dumps(
-                {"status": "error", "message": "An error occurred while fetching the wardrobe."}
-            )
+# Компактный формат для промпта: строки "id|name|category|..." вместо JSON с URL
+WARDROBE_COLUMNS = "id|name|category|features"
+CATALOG_COLUMNS = "id|name|category|features|price|store"
+CATALOG_REF_PREFIX = "p"
+MAX_ITEM_FEATURES = int(os.getenv("OUTFIT_MAX_ITEM_FEATURES", "5"))
+_ITEM_REF_RE = re.compile(rf"^({WARDROBE_REF_PREFIX}|{CATALOG_REF_PREFIX})(\d+)$", re.IGNORECASE)
 
-    def get_catalog_items(self) -> str:
-        """
-        Retrieves catalog items from the store when user wardrobe is empty.
-        Converts Product objects to clothing-like format with correct image URLs.
-        """
-        print(f"Fetching catalog items for outfit recommendations")
-        try:
-            # Импортируем все модели для избежания ошибок SQLAlchemy
-            from src.models.review import Review
-            from src.models.user import User
-            from src.models.clothing import ClothingItem
-            from src.models.chat import Chat, Message
-            from src.models.tryon import TryOn
-            from src.models.waitlist import WaitListItem
-            
-            # Получаем активные товары из каталога
-            products = self.db.query(DBProduct).join(DBStore).filter(
-                DBProduct.is_active == True,
-                DBProduct.stock_quantity > 0
-            ).order_by(DBProduct.name).all()
-
-            if not products:
-                return json.dumps({
+
+def _compact_row(ref: str, name: str, category: str, features: Iterable[str], *extra: str) -> str:
+    features = "; ".join(list(features)[:MAX_ITEM_FEATURES])
+    return "|".join(str(value).replace("|", "/") for value in (ref, name, category, features, *extra))
+
+
+def _catalog_rows(db: Session) -> Tuple[List[str], Dict[str, int]]:
+    """Ограниченный набор кандидатов по слотам образа в компактном формате."""
+    index = get_outfit_catalog_index(db)
+    rows = [
+        _compact_row(
+            f"{CATALOG_REF_PREFIX}{product.id}",
+            product.name,
+            slot,
+            product.features,
+            f"₸{product.price:,.0f}",
+            f"{product.store.name}, {product.store.city}",
+        )
+        for slot, product in index.items()
+    ]
+    return rows, {slot: len(products) for slot, products in index.slots.items()}
+
+
+def user_wardrobe_json(db: Session, user_id: int) -> str:
+    """
+    Retrieves all clothing items from the user's wardrobe.
+    Returns compact rows (items referenced by short ids) for the model.
+    """
+    print(f"Fetching wardrobe for user_id: {user_id}")
+    try:
+        snapshot = get_wardrobe_snapshot(db, user_id)
+
+        if not snapshot.items:
+            return json.dumps(
+                {
                     "status": "success",
-                    "catalog": [],
+                    "wardrobe": [],
                     "total_items": 0,
-                    "message": "No catalog items available."
-                })
-
-            # Конвертируем товары каталога в формат для образов
-            catalog_items = []
-            categories = {}
-            
-            for product in products:
-                # ИСПРАВЛЕНИЕ: Правильно обрабатываем изображения из каталога
-                image_url = ""
-                if product.image_urls and isinstance(product.image_urls, list):
-                    # Берем первое валидное изображение
-                    valid_images = [img for img in product.image_urls if img and img.strip()]
-                    if valid_images:
-                        image_url = valid_images[0]
-                
-                # Мапируем категории товаров к категориям одежды
-                category_mapping = {
-                    "Рубашки": "Tops",
-                    "Футболки": "Tops", 
-                    "Джемперы": "Tops",
-                    "Толстовки": "Tops",
-                    "Брюки": "Bottoms",
-                    "Шорты": "Bottoms",
-                    "Джинсы": "Bottoms",
-                    "Куртки": "Outerwear",
-                    "Спорт": "Activewear",
-                    "Майки": "Activewear"
+                    "message": "The user's wardrobe is empty. You should inform the user about this and suggest adding clothing items.",
                 }
-                outfit_category = category_mapping.get(product.category, "Tops")
-                
-                item_data = {
-                    "name": product.name,
-                    "image_url": image_url,  # ИСПРАВЛЕНИЕ: Передаем валидный URL изображения
-                    "category": outfit_category,
-                    "features": product.features or [],
-                    "price": f"₸{product.price:,.0f}",
-                    "store": f"{product.store.name}, {product.store.city}"
-                }
-                catalog_items.append(item_data)
-                
-                # Count by category for better outfit planning
-                categories[outfit_category] = categories.get(outfit_category, 0) + 1
+            )
+
+        categories = snapshot.categories()
+        return json.dumps({
+            "status": "success",
+            "columns": WARDROBE_COLUMNS,
+            "wardrobe": [
+                _compact_row(item.ref, item.name, item.category, item.features)
+                for item in snapshot.items
+            ],
+            "total_items": len(snapshot),
+            "categories": categories,
+            "message": f"Found {len(snapshot)} items across {len(categories)} categories."
+        }, ensure_ascii=False)
+        
+    except Exception as e:
+        print(f"An error occurred in get_user_wardrobe: {e}")
+        return json.dumps(
+            {"status": "error", "message": "An error occurred while fetching the wardrobe."}
+        )
+
+
+def catalog_items_json(db: Session) -> str:
+    """
+    Retrieves catalog items from the store when user wardrobe is empty.
+    Returns a bounded set of top-ranked candidates per outfit slot as compact rows.
+    """
+    print(f"Fetching catalog items for outfit recommendations")
+    try:
+        rows, categories = _catalog_rows(db)
 
+        if not rows:
             return json.dumps({
                 "status": "success",
-                "catalog": catalog_items,
-                "total_items": len(catalog_items),
-                "categories": categories,
-                "message": f"Found {len(catalog_items)} catalog items across {len(categories)} categories for outfit recommendations."
+                "catalog": [],
+                "total_items": 0,
+                "message": "No catalog items available."
             })
-            
-        except Exception as e:
-            print(f"An error occurred in get_catalog_items: {e}")
-            return json.dumps(
-                {"status": "error", "message": "An error occurred while fetching catalog items."}
-            )
 
+        return json.dumps({
+            "status": "success",
+            "columns": CATALOG_COLUMNS,
+            "catalog": rows,
+            "total_items": len(rows),
+            "categories": categories,
+            "message": f"Top {len(rows)} catalog items across {len(categories)} outfit categories for outfit recommendations."
+        }, ensure_ascii=False)
+        
+    except Exception as e:
+        print(f"An error occurred in get_catalog_items: {e}")
+        return json.dumps(
+            {"status": "error", "message": "An error occurred while fetching catalog items."}
+        )
 
-def create_outfit_agent(user_id: int, db_session=None) -> Agent:
+
+def resolve_image_ref(db: Session, user_id: int, ref: str) -> Optional[str]:
+    """
+    Maps a short item id from the tool output (w12 / p345) back to its image URL.
+    Full URLs are returned as is; unknown ids give None.
+    """
+    ref = (ref or "").strip()
+    if not ref or "/" in ref:
+        return ref or None
+
+    match = _ITEM_REF_RE.match(ref)
+    if match is None:
+        return None
+    if match.group(1).lower() == WARDROBE_REF_PREFIX:
+        return get_wardrobe_snapshot(db, user_id).resolve(ref)
+
+    product = get_catalog_snapshot(db).get(int(match.group(2)))
+    if product is None:
+        return None
+    return next((img for img in product.image_urls if img and img.strip()), None)
+
+
+@dataclass
+class OutfitDependencies:
+    """Dependencies for the outfit agent: the user and the session of this run."""
+    user_id: int
+    db: Session
+
+
+async def get_user_wardrobe(ctx: RunContext[OutfitDependencies]) -> str:
+    """
+    Retrieves all clothing items from the authenticated user's wardrobe.
+    Returns structured data for enhanced AI processing.
+    """
+    return user_wardrobe_json(ctx.deps.db, ctx.deps.user_id)
+
+
+async def get_catalog_items(ctx: RunContext[OutfitDependencies]) -> str:
+    """
+    Retrieves catalog items from the store when user wardrobe is empty.
+    Converts Product objects to clothing-like format with correct image URLs.
+    """
+    return catalog_items_json(ctx.deps.db)
+
+
+def get_outfit_agent() -> Agent:
     """
-    Creates or returns a cached outfit recommendation agent for a specific user.
+    Returns the shared outfit recommendation agent.
     Enhanced with strict structured output validation and conversation context awareness.
-    
-    Args:
-        user_id: The ID of the user
-        db_session: Optional database session to use (for proper session management)
-        
+    The user is passed per run via OutfitDependencies, so one agent serves all users.
+
     Returns:
-        Agent: Configured outfit recommendation agent (cached per user) with context awareness
+        Agent: Cached outfit recommendation agent with context awareness
     """
-    global _outfit_agents_cache
-    
-    # Check if we already have an agent for this user
-    if user_id in _outfit_agents_cache:
-        return _outfit_agents_cache[user_id]
-    
-    # Create new agent for this user with proper session management
-    wardrobe_manager = WardrobeManager(user_id=user_id, db_session=db_session)
-    
+    global _outfit_agent_instance
+
+    if _outfit_agent_instance is not None:
+        return _outfit_agent_instance
+
     agent = Agent(
         get_azure_llm(),
+        deps_type=OutfitDependencies,
         output_type=Outfit,
         system_prompt="""You are a professional fashion stylist and outfit recommendation expert with conversation context awareness and strict output requirements.
 
@@ -212,7 +194,7 @@ CONVERSATION CONTEXT AWARENESS:
 STRUCTURED OUTPUT REQUIREMENTS:
 - You MUST return a valid Outfit object with ALL required fields
 - outfit_description: 20-300 characters, friendly and detailed style description
-- items: Array of OutfitItem objects (0-8 max), each with name, category, image_url
+- items: Array of OutfitItem objects (0-8 max), each with name, category, image_url (the item id, see below)
 - reasoning: 15-200 characters explaining why items work together
 - occasion: Must be one of: casual, formal, business, evening, sport, weekend, date, work
 
@@ -237,12 +219,12 @@ UPDATED VALIDATION RULES:
 - Ensure outfit items have valid categories: Tops, Bottoms, Outerwear, Footwear, Accessories, Dresses, Activewear
 - All text fields must meet length requirements (no empty or too long content)
 - Each outfit should be practical and stylistically coherent
-- CRITICAL: Always include valid image_url for each OutfitItem (never use empty strings)
+- CRITICAL: Always include the item id as image_url for each OutfitItem (never use empty strings)
 
 IMAGE URL REQUIREMENTS:
-- Every OutfitItem MUST have a valid, non-empty image_url
-- Use the image_url provided in wardrobe or catalog data
-- If no image_url available, skip that item rather than using empty string
+- Tool data is compact: each item is one "id|name|category|features|..." row as described by "columns"
+- Set image_url of every OutfitItem to the item id from that data (e.g. "w12" or "p345"), exactly as given
+- The id is replaced with the real image URL after you answer; never invent ids or URLs
 
 CONTEXTUAL EXAMPLES:
 - If user said previous outfit was "too formal", suggest more casual alternatives
@@ -262,13 +244,13 @@ ERROR HANDLING:
 - Provide helpful suggestions when items are limited
 - Use appropriate occasion classification
 - Reference conversation context in reasoning when relevant""",
-        tools=[wardrobe_manager.get_user_wardrobe, wardrobe_manager.get_catalog_items],
+        tools=[get_user_wardrobe, get_catalog_items],
         retries=5  # Increased retries for better reliability
     )
 
     # Add output validator for strict validation
     @agent.output_validator
-    async def validate_outfit_output(output: Outfit) -> Outfit:
+    async def validate_outfit_output(ctx: RunContext[OutfitDependencies], output: Outfit) -> Outfit:
         """Validate and enhance outfit output quality."""
         if not isinstance(output, Outfit):
             raise ModelRetry("Output must be a valid Outfit object")
@@ -294,10 +276,12 @@ ERROR HANDLING:
             if not item.name or not item.name.strip():
                 continue
             
-            # КРИТИЧЕСКАЯ ВАЛИДАЦИЯ: image_url не должен быть пустым
-            if not item.image_url or not item.image_url.strip():
-                print(f"⚠️  Пропускаем товар '{item.name}' - пустой image_url")
+            # КРИТИЧЕСКАЯ ВАЛИДАЦИЯ: id вещи должен превратиться в непустой image_url
+            image_url = resolve_image_ref(ctx.deps.db, ctx.deps.user_id, item.image_url)
+            if not image_url or not image_url.strip():
+                print(f"⚠️  Пропускаем товар '{item.name}' - неизвестный id или пустой image_url: {item.image_url!r}")
                 continue
+            item.image_url = image_url
                 
             validated_items.append(item)
         
@@ -310,27 +294,16 @@ ERROR HANDLING:
         
         return output
     
-    # Cache the agent for this user
-    _outfit_agents_cache[user_id] = agent
-    
+    _outfit_agent_instance = agent
     return agent
 
 
-def clear_outfit_agent_cache(user_id: int = None):
+def create_outfit_agent(user_id: int, db_session=None) -> Agent:
     """
-    Clear outfit agent cache for a specific user or all users.
-    Useful when user's wardrobe changes significantly.
-    
-    Args:
-        user_id: Specific user ID to clear cache for, or None to clear all
+    Backward-compatible alias: returns the shared outfit agent.
+    Run it with deps=OutfitDependencies(user_id=..., db=...).
     """
-    global _outfit_agents_cache
-    
-    if user_id is not None:
-        if user_id in _outfit_agents_cache:
-            del _outfit_agents_cache[user_id]
-    else:
-        _outfit_agents_cache.clear()
+    return get_outfit_agent()
 
 
 async def recommend_outfit(user_id: int, request: str = "What should I wear today?", message_history: List[ModelMessage] = None, db_session=None) -> Outfit:
@@ -347,20 +320,15 @@ async def recommend_outfit(user_id: int, request: str = "What should I wear toda
     Returns:
         Outfit: Strictly validated outfit recommendation with context awareness
     """
-    db = None
-    wardrobe_manager = None
-    
+    # Без переданной сессии открываем свою на один запуск: сессии не делятся между запусками
+    db = db_session if db_session is not None else get_db_session()
     try:
-        # Use provided session or create a new one
-        db = db_session if db_session is not None else get_db_session()
-        owns_session = db_session is None
-        
-        # Create agent with proper session management
-        agent = create_outfit_agent(user_id, db_session=db)
-        result = await agent.run(
+        result = await get_outfit_agent().run(
             request,
-            message_history=message_history
+            message_history=message_history,
+            deps=OutfitDependencies(user_id=user_id, db=db)
         )
+        record_usage("outfit", result)
         return result.data
         
     except Exception as e:
@@ -373,9 +341,5 @@ async def recommend_outfit(user_id: int, request: str = "What should I wear toda
             occasion="casual"
         )
     finally:
-        # Clean up session if we created it
-        if db and db_session is None:
-            try:
-                db.close()
-            except Exception as e:
-                print(f"Error closing database session in recommend_outfit: {e}") 
\ No newline at end of file
+        if db_session is None:
+            db.close()
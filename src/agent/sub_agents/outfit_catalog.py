@@ -0,0 +1,173 @@
+"""
+Индекс каталога по слотам образа для агента образов.
+
+Раньше инструмент get_catalog_items отдавал модели весь каталог в наличии, и
+размер промпта (а с ним и задержка) рос вместе с каталогом. Здесь товары из
+снимка каталога заранее раскладываются по слотам образа (Tops, Bottoms,
+Outerwear, Footwear, ...), внутри слота ранжируются и обрезаются до
+``OUTFIT_CATALOG_PER_SLOT`` штук. Индекс пересобирается только при смене версии
+снимка каталога, то есть после любого изменения товаров.
+
+Внутри слота товары чередуются по исходной категории (рубашки, футболки,
+джемперы...), чтобы несколько товаров с высоким рейтингом из одной категории
+не вытесняли остальные.
+"""
+import os
+from dataclasses import dataclass, field
+from itertools import chain, zip_longest
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from src.utils.catalog_snapshot import CatalogProduct, get_catalog_snapshot
+from .catalog_retrieval import product_categories
+
+
+PER_SLOT_LIMIT = int(os.getenv("OUTFIT_CATALOG_PER_SLOT", "10"))
+
+# Порядок слотов в ответе инструмента
+OUTFIT_SLOTS = ("Tops", "Bottoms", "Outerwear", "Footwear", "Dresses", "Activewear", "Accessories")
+DEFAULT_SLOT = "Tops"
+
+# Мапируем категории товаров к категориям одежды
+CATALOG_CATEGORY_MAPPING = {
+    "Рубашки": "Tops",
+    "Футболки": "Tops",
+    "Джемперы": "Tops",
+    "Толстовки": "Tops",
+    "Брюки": "Bottoms",
+    "Шорты": "Bottoms",
+    "Джинсы": "Bottoms",
+    "Куртки": "Outerwear",
+    "Спорт": "Activewear",
+    "Майки": "Activewear"
+}
+
+# Канонические категории catalog_retrieval -> слот, для категорий вне таблицы выше
+CANONICAL_SLOT_MAPPING = {
+    "tshirts": "Tops",
+    "shirts": "Tops",
+    "jumpers": "Tops",
+    "hoodies": "Tops",
+    "pants": "Bottoms",
+    "jeans": "Bottoms",
+    "shorts": "Bottoms",
+    "skirts": "Bottoms",
+    "jackets": "Outerwear",
+    "shoes": "Footwear",
+    "dresses": "Dresses",
+    "tanks": "Activewear",
+    "sport": "Activewear",
+}
+
+# Байесовское сглаживание рейтинга: товар без отзывов не обгоняет проверенные
+_PRIOR_RATING = 3.5
+_PRIOR_REVIEWS = 5
+
+
+def outfit_slot(product: CatalogProduct) -> str:
+    """Слот образа для товара каталога."""
+    slot = CATALOG_CATEGORY_MAPPING.get(product.category)
+    if slot is not None:
+        return slot
+    for canonical in sorted(product_categories(product)):
+        slot = CANONICAL_SLOT_MAPPING.get(canonical)
+        if slot is not None:
+            return slot
+    return DEFAULT_SLOT
+
+
+def outfit_rank(product: CatalogProduct) -> float:
+    """Оценка товара внутри слота: сглаженный рейтинг, небольшой бонус за скидку."""
+    reviews = product.reviews_count or 0
+    rating = (product.rating * reviews + _PRIOR_RATING * _PRIOR_REVIEWS) / (reviews + _PRIOR_REVIEWS)
+    return rating + product.discount_percentage / 100
+
+
+def _has_image(product: CatalogProduct) -> bool:
+    return any(img and img.strip() for img in product.image_urls)
+
+
+def _balanced(products: List[CatalogProduct], limit: int) -> Tuple[CatalogProduct, ...]:
+    """Лучшие товары слота с чередованием исходных категорий."""
+    by_category: Dict[str, List[CatalogProduct]] = {}
+    for product in sorted(products, key=lambda p: (-outfit_rank(p), p.name, p.id)):
+        by_category.setdefault(product.category, []).append(product)
+    # Категории с лучшим товаром идут первыми в каждом «круге»
+    groups = sorted(by_category.values(), key=lambda group: -outfit_rank(group[0]))
+    interleaved = [p for p in chain.from_iterable(zip_longest(*groups)) if p is not None]
+    return tuple(interleaved[:limit])
+
+
+@dataclass(frozen=True)
+class OutfitCatalogIndex:
+    """Кандидаты каталога по слотам для одной версии снимка."""
+    version: int
+    slots: Dict[str, Tuple[CatalogProduct, ...]] = field(default_factory=dict)
+    totals: Dict[str, int] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return sum(len(products) for products in self.slots.values())
+
+    def items(self) -> List[Tuple[str, CatalogProduct]]:
+        """(слот, товар) в порядке OUTFIT_SLOTS."""
+        return [(slot, product) for slot in OUTFIT_SLOTS for product in self.slots.get(slot, ())]
+
+
+def build_outfit_catalog_index(
+    version: int,
+    products: Tuple[CatalogProduct, ...],
+    per_slot: int = PER_SLOT_LIMIT,
+) -> OutfitCatalogIndex:
+    """Разложить товары в наличии с изображениями по слотам и обрезать каждый слот."""
+    grouped: Dict[str, List[CatalogProduct]] = {}
+    for product in products:
+        # Товары без изображений не попадут в образ – не показываем их модели
+        if product.stock_quantity > 0 and _has_image(product):
+            grouped.setdefault(outfit_slot(product), []).append(product)
+
+    return OutfitCatalogIndex(
+        version=version,
+        slots={slot: _balanced(items, per_slot) for slot, items in grouped.items()},
+        totals={slot: len(items) for slot, items in grouped.items()},
+    )
+
+
+class _OutfitCatalogIndexCache:
+    """Индекс для текущей версии снимка каталога."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._index: Optional[OutfitCatalogIndex] = None
+
+    def get(self, db: Session) -> OutfitCatalogIndex:
+        snapshot = get_catalog_snapshot(db)
+        index = self._index
+        if index is not None and index.version == snapshot.version:
+            return index
+
+        with self._lock:
+            if self._index is None or self._index.version != snapshot.version:
+                self._index = build_outfit_catalog_index(snapshot.version, snapshot.products)
+            return self._index
+
+
+_outfit_catalog_index_cache = _OutfitCatalogIndexCache()
+
+
+def get_outfit_catalog_index(db: Session) -> OutfitCatalogIndex:
+    """Индекс по слотам, пересобранный при изменении каталога."""
+    return _outfit_catalog_index_cache.get(db)
+
+
+__all__ = [
+    "PER_SLOT_LIMIT",
+    "OUTFIT_SLOTS",
+    "CATALOG_CATEGORY_MAPPING",
+    "outfit_slot",
+    "outfit_rank",
+    "OutfitCatalogIndex",
+    "build_outfit_catalog_index",
+    "get_outfit_catalog_index",
+]
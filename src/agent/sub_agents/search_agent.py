@@ -4,6 +4,7 @@ from typing import List
 from pydantic_ai import Agent, ModelRetry, RunContext
 from .base import get_azure_llm, ProductList, Product, MessageHistory
 from src.utils.google_search import google_search
+from src.agent.usage_tracker import record_usage
 from pydantic_ai.messages import ModelMessage
 from dataclasses import dataclass
 
@@ -36,6 +37,7 @@ async def extract_products_from_url(url: str, query: str) -> List[Product]:
     try:
         prompt = f"User Query: \"{query}\"\n\nPlease analyze this URL and extract all matching products based on my query: {url}"
         result = await url_extractor_agent.run(prompt)
+        record_usage("url_extractor", result)
         
         products = result.data.products
         if products:
@@ -0,0 +1,116 @@
+"""
+Учёт фактического потребления токенов моделью за один запрос.
+
+Раньше токены считались через tiktoken только по сообщению пользователя и
+итоговому JSON, хотя основная часть токенов – системные промпты, история и
+данные каталога, которые уходят в модель. Здесь суммируется ``usage``, который
+возвращает провайдер в каждом запуске pydantic-ai (координатор и все суб-агенты).
+
+Трекер передаётся через contextvar, как очередь событий в ``streaming``: код
+агентов вызывает :func:`record_usage` после каждого ``run``/``run_stream``, а без
+активного :func:`track_usage` вызов ничего не делает.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Optional
+
+
+@dataclass
+class AgentUsage:
+    """Токены одного агента (сумма по всем его запускам)."""
+    requests: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+
+@dataclass
+class UsageTracker:
+    """Потребление токенов за запрос с разбивкой по агентам."""
+    by_agent: Dict[str, AgentUsage] = field(default_factory=dict)
+
+    def add(self, agent_name: str, requests: int, input_tokens: int, output_tokens: int) -> None:
+        usage = self.by_agent.setdefault(agent_name, AgentUsage())
+        usage.requests += requests
+        usage.input_tokens += input_tokens
+        usage.output_tokens += output_tokens
+
+    @property
+    def requests(self) -> int:
+        return sum(u.requests for u in self.by_agent.values())
+
+    @property
+    def input_tokens(self) -> int:
+        return sum(u.input_tokens for u in self.by_agent.values())
+
+    @property
+    def output_tokens(self) -> int:
+        return sum(u.output_tokens for u in self.by_agent.values())
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    def breakdown(self) -> Dict[str, Dict[str, int]]:
+        return {
+            name: {
+                "requests": u.requests,
+                "input_tokens": u.input_tokens,
+                "output_tokens": u.output_tokens,
+            }
+            for name, u in self.by_agent.items()
+        }
+
+
+_current_tracker: ContextVar[Optional[UsageTracker]] = ContextVar("llm_usage_tracker", default=None)
+
+
+@contextmanager
+def track_usage() -> Iterator[UsageTracker]:
+    """Собирать usage всех запусков агентов внутри блока (и порождённых им задач)."""
+    tracker = UsageTracker()
+    token = _current_tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _current_tracker.reset(token)
+
+
+def _usage_counts(usage: Any) -> tuple:
+    # Новые версии pydantic-ai: input/output_tokens, старые: request/response_tokens
+    input_tokens = getattr(usage, "input_tokens", None)
+    if input_tokens is None:
+        input_tokens = getattr(usage, "request_tokens", None)
+    output_tokens = getattr(usage, "output_tokens", None)
+    if output_tokens is None:
+        output_tokens = getattr(usage, "response_tokens", None)
+    return getattr(usage, "requests", 0) or 0, input_tokens or 0, output_tokens or 0
+
+
+def record_usage(agent_name: str, result: Any) -> None:
+    """
+    Добавить usage запуска агента к текущему запросу.
+
+    Args:
+        agent_name: Имя агента для разбивки (coordinator, outfit, general, ...)
+        result: Результат ``Agent.run`` или ``Agent.run_stream``
+    """
+    tracker = _current_tracker.get()
+    if tracker is None:
+        return
+    try:
+        tracker.add(agent_name, *_usage_counts(result.usage()))
+    except Exception as e:
+        print(f"Error recording usage for {agent_name}: {e}")
+
+
+__all__ = [
+    "AgentUsage",
+    "UsageTracker",
+    "track_usage",
+    "record_usage",
+]
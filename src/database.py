@@ -1,4 +1,6 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -31,6 +33,60 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def get_async_database_url(url: str) -> str:
+    """
+    Convert the sync DATABASE_URL into a URL for an async driver:
+    asyncpg for PostgreSQL, aiosqlite for SQLite (local runs and tests).
+    Can be overridden with ASYNC_DATABASE_URL.
+    """
+    override = os.getenv("ASYNC_DATABASE_URL")
+    if override:
+        return override
+
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend == "postgresql":
+        query = dict(parsed.query)
+        # asyncpg не понимает libpq-параметры sslmode/channel_binding
+        sslmode = query.pop("sslmode", None)
+        query.pop("channel_binding", None)
+        if sslmode and "ssl" not in query:
+            query["ssl"] = sslmode
+        parsed = parsed.set(drivername="postgresql+asyncpg", query=query)
+    elif backend == "sqlite":
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    return parsed.render_as_string(hide_password=False)
+
+
+ASYNC_SQLALCHEMY_DATABASE_URL = get_async_database_url(SQLALCHEMY_DATABASE_URL)
+
+if make_url(ASYNC_SQLALCHEMY_DATABASE_URL).get_backend_name() == "sqlite":
+    async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, echo=False)
+else:
+    # Тот же размер пула, что и у синхронного движка
+    async_engine = create_async_engine(
+        ASYNC_SQLALCHEMY_DATABASE_URL,
+        pool_size=20,
+        max_overflow=30,
+        pool_timeout=60,
+        pool_recycle=3600,
+        pool_pre_ping=True,
+        echo=False,
+        connect_args={
+            "timeout": 10,  # asyncpg: таймаут установки соединения
+        }
+    )
+
+# expire_on_commit=False: после commit объекты остаются читаемыми без ленивой
+# подгрузки, которая в async-сессии недоступна
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 Base = declarative_base()
 
 def get_db():
@@ -40,6 +96,11 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """Async variant of get_db for handlers that use AsyncSession."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def get_db_session():
     """
     Create a database session for scripts and background tasks.
@@ -53,6 +114,22 @@ def get_connection_pool_status():
     Returns dict with pool metrics.
     """
     pool = engine.pool
+    return {
+        "pool_size": pool.size(),
+        "checked_in_connections": pool.checkedin(),
+        "checked_out_connections": pool.checkedout(),
+        "overflow_connections": pool.overflow(),
+        "total_capacity": pool.size() + pool.overflow()
+    }
+
+def get_async_connection_pool_status():
+    """
+    Get async engine connection pool status for monitoring.
+    Returns dict with pool metrics (empty for pools without size accounting, e.g. SQLite).
+    """
+    pool = async_engine.pool
+    if not hasattr(pool, "size"):
+        return {}
     return {
         "pool_size": pool.size(),
         "checked_in_connections": pool.checkedin(),
@@ -5,9 +5,14 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import JSONResponse
-from src.database import engine, Base
-from src.routers import auth, agent_router, wardrobe, waitlist, chat, tryon, stores, products, reviews, admin, store_admin
+from src.database import engine, async_engine, Base
+from src.routers import auth, agent_router, wardrobe, waitlist, chat, tryon, stores, products, reviews, admin, store_admin, analysis_jobs
+from src.utils.analysis_jobs import WORKER_ENABLED, get_analysis_worker
+from src.utils.image_prep import start_image_prep_pool, shutdown_image_prep_pool
+from src.utils.vector_index import start_product_vector_index
+from src.utils.storage_client import STORAGE_BACKEND, get_storage_client, LocalStorageBackend
 import os
+from contextlib import asynccontextmanager
 
 # NOTE: Таблицы теперь создаются через миграции Alembic
 # Используйте: alembic upgrade head для применения миграций
@@ -31,8 +36,28 @@ class LimitUploadSize(BaseHTTPMiddleware):
                     )
         return await call_next(request)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Пул процессов подготовки изображений (forkserver, не fork от сервера)
+    start_image_prep_pool()
+    # Векторный индекс товаров строится в фоне, запросы его не ждут
+    start_product_vector_index()
+    # Фоновый воркер AI-анализа фото (задачи из таблицы analysis_jobs)
+    if WORKER_ENABLED:
+        get_analysis_worker().start()
+    yield
+    if WORKER_ENABLED:
+        await get_analysis_worker().stop()
+    # Пул процессов подготовки изображений
+    shutdown_image_prep_pool()
+    # Пул потоков клиента хранилища
+    get_storage_client().shutdown()
+    # Закрываем пул async-движка при остановке приложения
+    await async_engine.dispose()
+
 app = FastAPI(
     title="ClosetMind API",
+    lifespan=lifespan,
     # Увеличиваем лимит размера запроса до 10MB
     max_upload_size=50 * 1024 * 1024  # 10MB в байтах
 )
@@ -73,6 +98,14 @@ app.include_router(reviews.router, prefix="/api/v1")
 app.include_router(admin.router, prefix="/api/v1")
 app.include_router(store_admin.router, prefix="/api/v1")
 
+# Статус фоновых задач анализа фото
+app.include_router(analysis_jobs.router, prefix="/api/v1")
+
+# Локальное хранилище изображений (STORAGE_BACKEND=local) раздаётся самим приложением
+_storage_backend = get_storage_client().backend
+if STORAGE_BACKEND == "local" and isinstance(_storage_backend, LocalStorageBackend) and _storage_backend.base_url.startswith("/"):
+    app.mount(_storage_backend.base_url, StaticFiles(directory=_storage_backend.directory), name="uploads")
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to ClosetMind API"}
\ No newline at end of file
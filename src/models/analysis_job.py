@@ -0,0 +1,45 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON, Text, Index
+from sqlalchemy.sql import func
+from src.database import Base
+
+
+# Статусы анализа строк (clothing_items.analysis_status / products.analysis_status)
+ANALYSIS_PENDING = "pending"
+ANALYSIS_DONE = "done"
+ANALYSIS_FAILED = "failed"
+
+# Статусы задач
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# Типы задач
+JOB_KIND_CLOTHING_ITEM = "clothing_item"
+JOB_KIND_PRODUCT = "product"
+
+
+class AnalysisJob(Base):
+    """Фоновая задача AI-анализа фотографий вещи гардероба или товара."""
+
+    __tablename__ = "analysis_jobs"
+    __table_args__ = (
+        # Выборка воркером: ожидающие задачи, у которых наступило время запуска
+        Index("ix_analysis_jobs_status_run_after", "status", "run_after"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(20), nullable=False)  # clothing_item / product
+    target_id = Column(Integer, nullable=False)  # id вещи гардероба или товара
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True, index=True)
+    status = Column(String(20), nullable=False, default=JOB_PENDING)
+    # {"image_urls": [...], "name": "..."} – входные данные обработчика
+    payload = Column(JSON, nullable=False, default=dict)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    last_error = Column(Text, nullable=True)
+    run_after = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
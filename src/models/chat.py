@@ -12,6 +12,9 @@ class Chat(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)  # Chat title/name
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # Скользящее резюме старых сообщений для агентов и id последнего учтённого сообщения
+    history_summary = Column(Text, nullable=True)
+    summary_message_id = Column(Integer, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
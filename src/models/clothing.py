@@ -8,8 +8,11 @@ class ClothingItem(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)  # Name of the garment
     image_url = Column(String, nullable=False)
+    thumbnail_url = Column(String, nullable=True)  # Уменьшенная копия для списков
     category = Column(String, nullable=False)
     features = Column(ARRAY(String), default=[])
+    # pending – фото загружено, AI-анализ ещё не заполнил name/category/features
+    analysis_status = Column(String(20), nullable=False, default="done", server_default="done")
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
 
     # Relationship with User
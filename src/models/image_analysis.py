@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, UniqueConstraint
+from sqlalchemy.sql import func
+from src.database import Base
+
+
+class ImageAnalysisCache(Base):
+    """Сохранённый результат анализа изображения моделью (по хэшу содержимого)."""
+
+    __tablename__ = "image_analysis_cache"
+    __table_args__ = (
+        UniqueConstraint("kind", "image_hash", "version", name="uq_image_analysis_cache_key"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(20), nullable=False)  # clothing / tryon
+    image_hash = Column(String(64), nullable=False, index=True)  # sha256 байтов изображения
+    # Хэш промпта и деплоймента: при их смене старые результаты не используются
+    version = Column(String(32), nullable=False)
+    result = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,9 +1,20 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Boolean, ForeignKey, JSON, ARRAY
+from typing import Iterable, Set, Tuple
+
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Boolean, ForeignKey, JSON, ARRAY, Index, UniqueConstraint, event, inspect, select
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import Session, relationship
 from src.database import Base
 
 
+# Вид атрибута -> JSON-колонка товара, из которой он берётся
+ATTRIBUTE_SOURCES = {
+    "size": "sizes",
+    "color": "colors",
+    "feature": "features",
+}
+ATTRIBUTE_VALUE_LENGTH = 200
+
+
 class Product(Base):
     """Модель товара"""
     
@@ -19,6 +30,7 @@ class Product(Base):
     sizes = Column(JSON, default=list)  # ["XS", "S", "M", "L", "XL"]
     colors = Column(JSON, default=list)  # ["white", "black", "red"]
     image_urls = Column(JSON, default=list)  # Массив URL изображений
+    thumbnail_urls = Column(JSON, default=list)  # Миниатюры в том же порядке, что image_urls
     features = Column(JSON, default=list)  # ["slim fit", "cotton", "long sleeves"] - характеристики от GPT
     
     # Категоризация
@@ -32,6 +44,8 @@ class Product(Base):
     # Инвентарь
     stock_quantity = Column(Integer, default=0)
     is_active = Column(Boolean, default=True, index=True)
+    # pending – товар создан из фото и ждёт AI-анализа (до этого неактивен)
+    analysis_status = Column(String(20), nullable=False, default="done", server_default="done")
     
     # Векторизация для поиска
     vector_embedding = Column(JSON, nullable=True)  # Векторное представление для семантического поиска
@@ -46,6 +60,9 @@ class Product(Base):
     # Relationships
     store = relationship("Store", back_populates="products")
     reviews = relationship("Review", back_populates="product", cascade="all, delete-orphan")
+    # Нормализованные копии sizes/colors/features для индексных фильтров,
+    # синхронизируются автоматически перед flush
+    attributes = relationship("ProductAttribute", back_populates="product", cascade="all, delete-orphan")
 
     @property
     def discount_percentage(self) -> float:
@@ -67,4 +84,73 @@ class Product(Base):
             "original": self.original_price,
             "discount_percentage": self.discount_percentage,
             "has_discount": self.discount_percentage > 0
-        } 
\ No newline at end of file
+        }
+
+
+class ProductAttribute(Base):
+    """Атрибут товара (размер, цвет, характеристика) для фильтрации по индексу"""
+
+    __tablename__ = "product_attributes"
+    __table_args__ = (
+        UniqueConstraint("product_id", "kind", "value", name="uq_product_attributes_product_kind_value"),
+        # Фильтр «товары с размером M»: (kind, value) -> product_id без обращения к таблице
+        Index("ix_product_attributes_kind_value_product", "kind", "value", "product_id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False, index=True)
+    kind = Column(String(20), nullable=False)  # size, color, feature
+    value = Column(String(ATTRIBUTE_VALUE_LENGTH), nullable=False)
+
+    product = relationship("Product", back_populates="attributes")
+
+
+def attribute_pairs(product: Product) -> Set[Tuple[str, str]]:
+    """Пары (kind, value) из JSON-колонок товара"""
+    pairs = set()
+    for kind, source in ATTRIBUTE_SOURCES.items():
+        values = getattr(product, source, None)
+        if not isinstance(values, (list, tuple)):
+            continue
+        for value in values:
+            value = str(value).strip()[:ATTRIBUTE_VALUE_LENGTH] if value is not None else ""
+            if value:
+                pairs.add((kind, value))
+    return pairs
+
+
+def sync_product_attributes(product: Product) -> None:
+    """Привести строки product_attributes в соответствие с JSON-колонками товара"""
+    wanted = attribute_pairs(product)
+    existing = {(attr.kind, attr.value): attr for attr in product.attributes}
+    for pair, attr in existing.items():
+        if pair not in wanted:
+            product.attributes.remove(attr)
+    for kind, value in sorted(wanted - existing.keys()):
+        product.attributes.append(ProductAttribute(kind=kind, value=value))
+
+
+def _attributes_changed(product: Product) -> bool:
+    state = inspect(product)
+    return any(state.attrs[source].history.has_changes() for source in ATTRIBUTE_SOURCES.values())
+
+
+@event.listens_for(Session, "before_flush")
+def _sync_attributes_before_flush(session, flush_context, instances):
+    """Любое сохранение товара через ORM обновляет его product_attributes"""
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Product) and (obj in session.new or _attributes_changed(obj)):
+            sync_product_attributes(obj)
+
+
+def has_attribute(kind: str, values: Iterable[str]):
+    """
+    Условие «у товара есть хотя бы одно из values вида kind».
+    Отбор идёт по индексу (kind, value, product_id) вместо сканирования JSON.
+    """
+    return Product.id.in_(
+        select(ProductAttribute.product_id).where(
+            ProductAttribute.kind == kind,
+            ProductAttribute.value.in_([v.strip() for v in values if v and v.strip()])
+        )
+    )
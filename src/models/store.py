@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, select
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, query_expression, with_expression
 from src.database import Base
 
 
@@ -22,7 +22,28 @@ class Store(Base):
     # Relationships
     products = relationship("Product", back_populates="store", cascade="all, delete-orphan")
 
+    # Количество товаров, считается подзапросом через with_products_count()
+    products_count = query_expression()
+
     @property
     def total_products(self) -> int:
         """Количество товаров в магазине"""
-        return len(self.products) if self.products else 0 
\ No newline at end of file
+        if self.products_count is not None:
+            return self.products_count
+        return len(self.products) if self.products else 0
+
+
+def with_products_count():
+    """
+    Опция запроса: посчитать товары магазина коррелированным COUNT по индексу
+    products.store_id вместо загрузки всех товаров ради total_products.
+    """
+    from src.models.product import Product
+
+    return with_expression(
+        Store.products_count,
+        select(func.count(Product.id))
+        .where(Product.store_id == Store.id)
+        .correlate(Store)
+        .scalar_subquery()
+    ) 
\ No newline at end of file
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, JSON
+from sqlalchemy.sql import func
+from src.database import Base
+
+
+class LLMUsage(Base):
+    """Фактическое потребление токенов моделью за один запрос к агенту."""
+
+    __tablename__ = "llm_usage"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True, index=True)
+    chat_id = Column(Integer, ForeignKey("chats.id", ondelete="SET NULL"), nullable=True, index=True)
+    agent_type = Column(String(20), nullable=False)  # search / outfit / general
+    # provider – usage из ответов модели, estimate – оценка tiktoken (запрос обработан без LLM)
+    source = Column(String(20), nullable=False, default="provider")
+    requests = Column(Integer, nullable=False, default=0)
+    input_tokens = Column(Integer, nullable=False, default=0)
+    output_tokens = Column(Integer, nullable=False, default=0)
+    total_tokens = Column(Integer, nullable=False, default=0)
+    processing_time_ms = Column(Float, nullable=True)
+    # {"coordinator": {"requests": 1, "input_tokens": ..., "output_tokens": ...}, "outfit": {...}}
+    breakdown = Column(JSON, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
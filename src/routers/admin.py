@@ -5,9 +5,10 @@ from datetime import datetime, timedelta
 import os
 from typing import List
 
-from src.database import get_db, get_connection_pool_status
+from src.database import get_db, get_connection_pool_status, get_async_connection_pool_status
 from src.models.user import User, UserRole
 from src.models.store import Store
+from src.models.usage import LLMUsage
 from src.schemas.admin import (
     UserStats, 
     SimpleUserCount, 
@@ -18,13 +19,20 @@ from src.schemas.admin import (
     RegistrationTrend,
     PoolStatus,
     PoolMetrics,
-    PoolAnalysis
+    PoolAnalysis,
+    CacheMetrics,
+    CacheStatus,
+    LLMUsageBucket,
+    LLMUsageSummary
 )
 from src.schemas.store_admin import (
     StoreAdminUserCreate, StoreAdminUserResponse, StoreAdminListResponse
 )
 from src.utils.auth import get_current_user, get_password_hash
 from src.utils.roles import require_admin
+from src.agent.response_cache import get_response_cache
+from src.utils.wardrobe_snapshot import get_wardrobe_snapshot_cache
+from src.utils.image_analysis_cache import get_image_analysis_cache
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -436,6 +444,7 @@ async def get_pool_status(current_user: User = Depends(require_admin())):
     """Получить детальный статус пула соединений"""
     try:
         pool_info = get_connection_pool_status()
+        async_pool_info = get_async_connection_pool_status()
         
         # Извлекаем метрики
         pool_size = pool_info.get('pool_size', 20)
@@ -467,11 +476,83 @@ async def get_pool_status(current_user: User = Depends(require_admin())):
                 pool_usage_percentage=round(usage_percentage, 1),
                 health_status=health_status,
                 available_connections=available_connections
-            )
+            ),
+            async_pool_metrics=PoolMetrics(**async_pool_info) if async_pool_info else None
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get pool status: {str(e)}")
 
+def _cache_metrics(name: str, info: dict) -> CacheMetrics:
+    fields = set(CacheMetrics.model_fields) - {"name", "extra"}
+    return CacheMetrics(
+        name=name,
+        **{k: v for k, v in info.items() if k in fields},
+        extra={k: v for k, v in info.items() if k not in fields}
+    )
+
+@router.get("/agent/cache-stats", response_model=CacheStatus)
+async def get_agent_cache_stats(current_user: User = Depends(require_admin())):
+    """Получить размер и счётчики попаданий кэшей агентов"""
+    return CacheStatus(caches=[
+        _cache_metrics("response_cache", get_response_cache().info()),
+        _cache_metrics("wardrobe_snapshots", get_wardrobe_snapshot_cache().info()),
+        _cache_metrics("image_analyses", get_image_analysis_cache().info())
+    ])
+
+@router.post("/agent/cache/clear", response_model=AdminResponse)
+async def clear_agent_response_cache(current_user: User = Depends(require_admin())):
+    """Очистить кэши агентов (ответы и снимки гардероба)"""
+    get_response_cache().clear()
+    get_wardrobe_snapshot_cache().clear()
+    return AdminResponse(success=True, message="Agent caches cleared")
+
+@router.get("/agent/usage", response_model=LLMUsageSummary)
+async def get_agent_usage(
+    days: int = Query(7, ge=1, le=365),
+    current_user: User = Depends(require_admin()),
+    db: Session = Depends(get_db)
+):
+    """Фактическое потребление токенов агентами за последние N дней"""
+    since = datetime.utcnow() - timedelta(days=days)
+    rows = (
+        db.query(
+            LLMUsage.agent_type,
+            LLMUsage.source,
+            func.count(LLMUsage.id).label("requests_count"),
+            func.coalesce(func.sum(LLMUsage.requests), 0).label("llm_calls"),
+            func.coalesce(func.sum(LLMUsage.input_tokens), 0).label("input_tokens"),
+            func.coalesce(func.sum(LLMUsage.output_tokens), 0).label("output_tokens"),
+            func.coalesce(func.sum(LLMUsage.total_tokens), 0).label("total_tokens"),
+            func.avg(LLMUsage.processing_time_ms).label("avg_processing_time_ms"),
+        )
+        .filter(LLMUsage.created_at >= since)
+        .group_by(LLMUsage.agent_type, LLMUsage.source)
+        .order_by(func.sum(LLMUsage.total_tokens).desc())
+        .all()
+    )
+
+    buckets = [
+        LLMUsageBucket(
+            agent_type=row.agent_type,
+            source=row.source,
+            requests_count=row.requests_count,
+            llm_calls=int(row.llm_calls),
+            input_tokens=int(row.input_tokens),
+            output_tokens=int(row.output_tokens),
+            total_tokens=int(row.total_tokens),
+            avg_tokens_per_request=round(int(row.total_tokens) / row.requests_count, 1),
+            avg_processing_time_ms=round(row.avg_processing_time_ms, 1) if row.avg_processing_time_ms is not None else None
+        )
+        for row in rows
+    ]
+    return LLMUsageSummary(
+        period_days=days,
+        requests_count=sum(b.requests_count for b in buckets),
+        llm_calls=sum(b.llm_calls for b in buckets),
+        total_tokens=sum(b.total_tokens for b in buckets),
+        buckets=buckets
+    )
+
 @router.get("/users/recent", response_model=List[UserBrief])
 async def get_recent_users(
     limit: int = 10,
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from src.database import get_db
+from src.models.analysis_job import AnalysisJob
+from src.models.user import User, UserRole
+from src.schemas.clothing import AnalysisJobResponse
+from src.utils.auth import get_current_user
+
+router = APIRouter(prefix="/analysis-jobs", tags=["analysis-jobs"])
+
+@router.get("/{job_id}", response_model=AnalysisJobResponse)
+async def get_analysis_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Poll the status of a background photo analysis job.
+    The item / product is filled in once the status becomes "done".
+    """
+    job = db.query(AnalysisJob).filter(AnalysisJob.id == job_id).first()
+
+    is_admin = getattr(current_user, 'role', UserRole.USER) == UserRole.ADMIN
+    if not job or (job.user_id != current_user.id and not is_admin):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Analysis job not found"
+        )
+
+    return job
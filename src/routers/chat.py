@@ -1,9 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy import select, update
+from sse_starlette.sse import EventSourceResponse
+from typing import List, Optional
 from datetime import datetime
+import json
 
-from src.database import get_db
+from src.database import AsyncSessionLocal, get_async_db, get_db_session
 from src.models.user import User
 from src.models.chat import Chat, Message
 from src.schemas.chat import (
@@ -15,15 +19,48 @@ from src.schemas.chat import (
 )
 from src.utils.auth import get_current_user
 from src.agent.agents import process_user_request
+from src.agent.streaming import stream_events
 from src.utils.chat_title_generator import generate_chat_title
 
 router = APIRouter(prefix="/chats", tags=["chats"])
 
 
+async def _get_user_chat(
+    db: AsyncSession,
+    chat_id: int,
+    user_id: int,
+    with_messages: bool = False
+) -> Optional[Chat]:
+    """Найти чат пользователя, при необходимости вместе с сообщениями."""
+    query = select(Chat).filter(Chat.id == chat_id, Chat.user_id == user_id)
+    if with_messages:
+        query = query.options(selectinload(Chat.messages)).execution_options(populate_existing=True)
+    return await db.scalar(query)
+
+
+async def _run_agent(message: str, user_id: int, chat_id: int) -> str:
+    """
+    Run the AI agent with its own sync session.
+
+    Agents and their tools work with a synchronous Session, so they get a
+    short-lived one instead of sharing the request's AsyncSession.
+    """
+    agent_db = get_db_session()
+    try:
+        return await process_user_request(
+            message,
+            user_id,
+            db=agent_db,
+            chat_id=chat_id
+        )
+    finally:
+        agent_db.close()
+
+
 @router.post("/", response_model=ChatResponse)
 async def create_chat(
     chat: ChatCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Create a new chat."""
@@ -32,37 +69,33 @@ async def create_chat(
         user_id=current_user.id
     )
     db.add(db_chat)
-    db.commit()
-    db.refresh(db_chat)
+    await db.commit()
+    await db.refresh(db_chat)
     return db_chat
 
 
 @router.get("/", response_model=List[ChatResponse])
 async def get_my_chats(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get all chats for the current user."""
-    chats = (
-        db.query(Chat)
+    chats = (await db.scalars(
+        select(Chat)
         .filter(Chat.user_id == current_user.id)
         .order_by(Chat.updated_at.desc())
-        .all()
-    )
+    )).all()
     return chats
 
 
 @router.get("/{chat_id}", response_model=ChatWithMessages)
 async def get_chat_with_messages(
     chat_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get a specific chat with all its messages."""
-    chat = db.query(Chat).filter(
-        Chat.id == chat_id,
-        Chat.user_id == current_user.id
-    ).first()
+    chat = await _get_user_chat(db, chat_id, current_user.id, with_messages=True)
     
     if not chat:
         raise HTTPException(
@@ -77,15 +110,12 @@ async def get_chat_with_messages(
 async def send_message(
     chat_id: int,
     request: SendMessageRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Send a message to a chat and get AI response."""
     # Check if chat exists and belongs to user
-    chat = db.query(Chat).filter(
-        Chat.id == chat_id,
-        Chat.user_id == current_user.id
-    ).first()
+    chat = await _get_user_chat(db, chat_id, current_user.id)
     
     if not chat:
         raise HTTPException(
@@ -101,16 +131,10 @@ async def send_message(
             chat_id=chat_id
         )
         db.add(user_message)
-        db.commit()
-        db.refresh(user_message)
+        await db.commit()
         
         # Process message through AI agent with chat history
-        ai_response = await process_user_request(
-            request.message,
-            current_user.id,
-            db=db,
-            chat_id=chat_id
-        )
+        ai_response = await _run_agent(request.message, current_user.id, chat_id)
         
         # Save AI response
         ai_message = Message(
@@ -123,31 +147,83 @@ async def send_message(
         # Update chat's updated_at timestamp
         chat.updated_at = datetime.utcnow()
         
-        db.commit()
-        db.refresh(ai_message)
+        await db.commit()
+        await db.refresh(ai_message)
         
         return ai_message
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to process message: {str(e)}"
         )
 
 
+async def _save_assistant_message(chat_id: int, content: str) -> dict:
+    """
+    Сохранить ответ ассистента в отдельной сессии: поток SSE живёт дольше
+    запроса, и сессия из Depends к этому моменту уже закрыта.
+    """
+    async with AsyncSessionLocal() as session:
+        ai_message = Message(content=content, role="assistant", chat_id=chat_id)
+        session.add(ai_message)
+        await session.execute(
+            update(Chat).where(Chat.id == chat_id).values(updated_at=datetime.utcnow())
+        )
+        await session.commit()
+        await session.refresh(ai_message)
+        return MessageResponse.model_validate(ai_message).model_dump(mode="json")
+
+
+@router.post("/{chat_id}/messages/stream")
+async def send_message_stream(
+    chat_id: int,
+    request: SendMessageRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Send a message and stream the AI response as server-sent events.
+
+    Events: routing (chosen agent), text (response text deltas), product (each
+    product card), outfit_item, tokens (final token counts), done (saved assistant
+    message) or error. The assistant message is saved even if the client disconnects.
+    """
+    chat = await _get_user_chat(db, chat_id, current_user.id)
+    
+    if not chat:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat not found"
+        )
+    
+    # Save user message
+    db.add(Message(content=request.message, role="user", chat_id=chat_id))
+    await db.commit()
+    
+    user_id = current_user.id
+    
+    async def run() -> dict:
+        ai_response = await _run_agent(request.message, user_id, chat_id)
+        return await _save_assistant_message(chat_id, ai_response)
+    
+    async def event_publisher():
+        async for event, data in stream_events(run):
+            yield {"event": event, "data": json.dumps(data, ensure_ascii=False)}
+    
+    return EventSourceResponse(event_publisher())
+
+
 @router.get("/{chat_id}/messages", response_model=List[MessageResponse])
 async def get_chat_messages(
     chat_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get all messages from a specific chat."""
     # Check if chat exists and belongs to user
-    chat = db.query(Chat).filter(
-        Chat.id == chat_id,
-        Chat.user_id == current_user.id
-    ).first()
+    chat = await _get_user_chat(db, chat_id, current_user.id)
     
     if not chat:
         raise HTTPException(
@@ -155,12 +231,11 @@ async def get_chat_messages(
             detail="Chat not found"
         )
     
-    messages = (
-        db.query(Message)
+    messages = (await db.scalars(
+        select(Message)
         .filter(Message.chat_id == chat_id)
         .order_by(Message.created_at.asc())
-        .all()
-    )
+    )).all()
     
     return messages
 
@@ -168,14 +243,11 @@ async def get_chat_messages(
 @router.delete("/{chat_id}")
 async def delete_chat(
     chat_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Delete a chat and all its messages."""
-    chat = db.query(Chat).filter(
-        Chat.id == chat_id,
-        Chat.user_id == current_user.id
-    ).first()
+    chat = await _get_user_chat(db, chat_id, current_user.id)
     
     if not chat:
         raise HTTPException(
@@ -183,8 +255,8 @@ async def delete_chat(
             detail="Chat not found"
         )
     
-    db.delete(chat)
-    db.commit()
+    await db.delete(chat)
+    await db.commit()
     
     return {"message": "Chat deleted successfully"}
 
@@ -192,7 +264,7 @@ async def delete_chat(
 @router.post("/init", response_model=ChatWithMessages, status_code=status.HTTP_201_CREATED)
 async def init_chat_with_first_message(
     request: SendMessageRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Create a new chat, auto-generate its title from the first user message and save that message."""
@@ -203,37 +275,29 @@ async def init_chat_with_first_message(
     # 2. Create chat record
     db_chat = Chat(title=title, user_id=current_user.id)
     db.add(db_chat)
-    db.commit()
-    db.refresh(db_chat)
+    await db.commit()
+    chat_id = db_chat.id  # после rollback атрибуты истекают, а ленивая загрузка в async недоступна
 
     # 3. Save user's first message
-    first_msg = Message(content=request.message, role="user", chat_id=db_chat.id)
+    first_msg = Message(content=request.message, role="user", chat_id=chat_id)
     db.add(first_msg)
-    db.commit()
-    db.refresh(first_msg)
+    await db.commit()
 
     # 4. Получаем ответ ЛЛМ и сохраняем его
     try:
-        ai_response_text = await process_user_request(
-            request.message,
-            current_user.id,
-            db=db,
-            chat_id=db_chat.id
-        )
+        ai_response_text = await _run_agent(request.message, current_user.id, chat_id)
 
-        ai_msg = Message(content=ai_response_text, role="assistant", chat_id=db_chat.id)
+        ai_msg = Message(content=ai_response_text, role="assistant", chat_id=chat_id)
         db.add(ai_msg)
 
         # Обновляем время изменения чата
         db_chat.updated_at = datetime.utcnow()
 
-        db.commit()
+        await db.commit()
     except Exception as e:
         # Если ЛЛМ упал, откатывать сообщения не будем – чат всё равно создан.
-        db.rollback()
-        print(f"Failed to generate AI response for new chat {db_chat.id}: {e}")
+        await db.rollback()
+        print(f"Failed to generate AI response for new chat {chat_id}: {e}")
 
     # 5. Refresh chat to include relationship data (messages)
-    db.refresh(db_chat)
-
-    return db_chat 
\ No newline at end of file
+    return await _get_user_chat(db, chat_id, current_user.id, with_messages=True) 
\ No newline at end of file
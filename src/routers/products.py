@@ -1,24 +1,53 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, asc, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy import func, and_, select
 from typing import List, Optional
 import logging
 
-from src.database import get_db
+from src.database import get_async_db
 from src.models.product import Product
 from src.models.store import Store
 from src.models.review import Review
 from src.schemas.product import (
-    ProductResponse, ProductListResponse, ProductBrief, ProductCreate, ProductUpdate,
-    ProductSearchQuery, CategoryResponse, CategoriesListResponse, ProductStatsResponse
+    ProductResponse, ProductListResponse, ProductCreate, ProductUpdate,
+    ProductSearchQuery, CategoryResponse, CategoriesListResponse, ProductStatsResponse,
+    ProductFacetsResponse
 )
 from src.utils.auth import get_current_user
 from src.utils.roles import check_store_access, UserRole
+from src.utils.vector_index import semantic_search_async, index_product, is_vector_index_ready
+from src.utils.catalog_snapshot import refresh_product_in_snapshot
+from src.utils.product_projection import product_brief_options, to_product_briefs
+from src.utils.pagination import TotalMode, count_total, fetch_page, resolve_sort_column
+from src.utils.product_search import RELEVANCE_SORT, apply_text_search, fetch_ranked_page
+from src.utils.product_facets import compute_facets, product_filter_conditions
 from src.models.user import User
 
 router = APIRouter(prefix="/products", tags=["products"])
 logger = logging.getLogger(__name__)
 
+# Поля сортировки, допустимые для keyset-пагинации (NOT NULL)
+PRODUCT_SORT_FIELDS = ("created_at", "price", "rating", "name")
+
+
+async def _get_product_with_store(db: AsyncSession, product_id: int) -> Optional[Product]:
+    """Загрузить товар вместе с магазином (ленивая подгрузка в AsyncSession недоступна)"""
+    return await db.scalar(
+        select(Product)
+        .options(selectinload(Product.store))
+        .filter(Product.id == product_id)
+        .execution_options(populate_existing=True)
+    )
+
+
+async def _sync_product_indexes(db: AsyncSession, product: Product) -> None:
+    """Обновить векторный индекс и снимок каталога после изменения товара"""
+    await db.run_sync(lambda session: index_product(session, product))
+    # Эмбеддинг сохраняется в транзакции запроса
+    await db.commit()
+    refresh_product_in_snapshot(product)
+
 
 @router.get("/", response_model=ProductListResponse)
 async def get_products(
@@ -33,93 +62,66 @@ async def get_products(
     sizes: Optional[str] = Query(None, description="Размеры через запятую (S,M,L)"),
     colors: Optional[str] = Query(None, description="Цвета через запятую"),
     in_stock_only: bool = Query(False, description="Только товары в наличии"),
-    sort_by: str = Query("created_at", description="Сортировка: name, price, rating, created_at"),
+    sort_by: Optional[str] = Query(None, description="Сортировка: relevance, name, price, rating, created_at (по умолчанию relevance при query, иначе created_at)"),
     sort_order: str = Query("desc", description="Порядок: asc, desc"),
     page: int = Query(1, ge=1, description="Номер страницы"),
     per_page: int = Query(20, ge=1, le=100, description="Количество на странице"),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (keyset-пагинация вместо page)"),
+    total_mode: TotalMode = Query("exact", description="Подсчёт total: exact, estimate, none"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получить список товаров с фильтрацией и поиском"""
     
-    query_obj = db.query(Product).join(Store).filter(Product.is_active == True)
+    query_obj = select(Product).join(Store).filter(Product.is_active == True)
     
-    # Текстовый поиск
+    # Полнотекстовый поиск (tsvector в PostgreSQL, in-memory индекс иначе)
+    rank = None
     if query:
-        search_filter = or_(
-            Product.name.ilike(f"%{query}%"),
-            Product.description.ilike(f"%{query}%"),
-            Product.brand.ilike(f"%{query}%"),
-            Product.category.ilike(f"%{query}%")
-        )
-        query_obj = query_obj.filter(search_filter)
+        query_obj, rank = await apply_text_search(db, query_obj, query)
     
     # Фильтрация
-    if category:
-        query_obj = query_obj.filter(Product.category.ilike(f"%{category}%"))
-    
-    if city:
-        query_obj = query_obj.filter(Store.city.ilike(f"%{city}%"))
-    
-    if store_id:
-        query_obj = query_obj.filter(Product.store_id == store_id)
-    
-    if brand:
-        query_obj = query_obj.filter(Product.brand.ilike(f"%{brand}%"))
-    
-    if min_price:
-        query_obj = query_obj.filter(Product.price >= min_price)
-    
-    if max_price:
-        query_obj = query_obj.filter(Product.price <= max_price)
-    
-    if min_rating:
-        query_obj = query_obj.filter(Product.rating >= min_rating)
-    
-    if sizes:
-        size_list = [s.strip() for s in sizes.split(",")]
-        size_filters = [Product.sizes.contains([size]) for size in size_list]
-        query_obj = query_obj.filter(or_(*size_filters))
-    
-    if colors:
-        color_list = [c.strip() for c in colors.split(",")]
-        color_filters = [Product.colors.contains([color]) for color in color_list]
-        query_obj = query_obj.filter(or_(*color_filters))
-    
-    if in_stock_only:
-        query_obj = query_obj.filter(Product.stock_quantity > 0)
-    
-    # Сортировка
-    sort_column = getattr(Product, sort_by, Product.created_at)
-    if sort_order.lower() == "asc":
-        query_obj = query_obj.order_by(asc(sort_column))
+    conditions = product_filter_conditions(
+        category=category,
+        city=city,
+        store_id=store_id,
+        brand=brand,
+        min_price=min_price,
+        max_price=max_price,
+        min_rating=min_rating,
+        sizes=[s.strip() for s in sizes.split(",")] if sizes else None,
+        colors=[c.strip() for c in colors.split(",")] if colors else None,
+        in_stock_only=in_stock_only
+    )
+    query_obj = query_obj.filter(*conditions.values())
+    
+    total, total_is_estimate = await count_total(db, query_obj, total_mode)
+    if rank is not None and sort_by in (None, RELEVANCE_SORT):
+        # По релевантности – только по номеру страницы, курсор не выдаётся
+        products = await fetch_ranked_page(
+            db,
+            query_obj.options(*product_brief_options("joined")),
+            rank,
+            per_page=per_page,
+            page=page
+        )
+        next_cursor = None
     else:
-        query_obj = query_obj.order_by(desc(sort_column))
-    
-    # Пагинация
-    total = query_obj.count()
-    products = query_obj.offset((page - 1) * per_page).limit(per_page).all()
+        # Сортировка и пагинация: по курсору (sort_by, id) или по номеру страницы
+        sort_by, sort_column = resolve_sort_column(Product, sort_by, PRODUCT_SORT_FIELDS)
+        products, next_cursor = await fetch_page(
+            db,
+            query_obj.options(*product_brief_options("joined")),
+            sort_by=sort_by,
+            sort_column=sort_column,
+            id_column=Product.id,
+            sort_order=sort_order,
+            per_page=per_page,
+            page=page,
+            cursor=cursor
+        )
     
     # Преобразование в ProductBrief
-    products_brief = []
-    for product in products:
-        product_data = {
-            "id": product.id,
-            "name": product.name,
-            "price": product.price,
-            "original_price": product.original_price,
-            "rating": product.rating,
-            "image_urls": product.image_urls,
-            "discount_percentage": product.discount_percentage,
-            "is_in_stock": product.is_in_stock,
-            "store": {
-                "id": product.store.id,
-                "name": product.store.name,
-                "city": product.store.city,
-                "logo_url": product.store.logo_url,
-                "rating": product.store.rating
-            }
-        }
-        products_brief.append(ProductBrief(**product_data))
+    products_brief = to_product_briefs(products)
     
     # Собираем примененные фильтры
     filters = {
@@ -140,39 +142,113 @@ async def get_products(
         total=total,
         page=page,
         per_page=per_page,
-        filters={k: v for k, v in filters.items() if v is not None}
+        filters={k: v for k, v in filters.items() if v is not None},
+        next_cursor=next_cursor,
+        total_is_estimate=total_is_estimate
     )
 
 
 @router.get("/categories", response_model=CategoriesListResponse)
-async def get_categories(db: Session = Depends(get_db)):
+async def get_categories(db: AsyncSession = Depends(get_async_db)):
     """Получить список всех категорий товаров"""
     
-    categories_data = db.query(
+    categories_data = (await db.execute(
+        select(
+            Product.category,
+            func.count(Product.id).label('products_count'),
+            func.avg(Product.price).label('avg_price')
+        ).filter(Product.is_active == True).group_by(Product.category)
+    )).all()
+    
+    # Топ-3 бренда каждой категории одним запросом (row_number по категории)
+    brand_count = func.count(Product.id)
+    ranked_brands = select(
         Product.category,
-        func.count(Product.id).label('products_count'),
-        func.avg(Product.price).label('avg_price')
-    ).filter(Product.is_active == True).group_by(Product.category).all()
-    
-    categories = []
-    for cat_data in categories_data:
-        # Получаем топ брендов для категории
-        top_brands = db.query(Product.brand).filter(
-            Product.category == cat_data.category,
-            Product.is_active == True,
-            Product.brand.isnot(None)
-        ).group_by(Product.brand).order_by(func.count(Product.id).desc()).limit(3).all()
-        
-        categories.append(CategoryResponse(
+        Product.brand,
+        func.row_number().over(
+            partition_by=Product.category,
+            order_by=(brand_count.desc(), Product.brand)
+        ).label('position')
+    ).filter(
+        Product.is_active == True,
+        Product.brand.isnot(None)
+    ).group_by(Product.category, Product.brand).subquery()
+    
+    top_brands = {}
+    for category, brand in (await db.execute(
+        select(ranked_brands.c.category, ranked_brands.c.brand)
+        .filter(ranked_brands.c.position <= 3)
+        .order_by(ranked_brands.c.category, ranked_brands.c.position)
+    )).all():
+        top_brands.setdefault(category, []).append(brand)
+    
+    categories = [
+        CategoryResponse(
             category=cat_data.category,
             products_count=cat_data.products_count,
             avg_price=round(cat_data.avg_price, 2),
-            top_brands=[brand[0] for brand in top_brands]
-        ))
+            top_brands=top_brands.get(cat_data.category, [])
+        )
+        for cat_data in categories_data
+    ]
     
     return CategoriesListResponse(categories=categories)
 
 
+@router.get("/facets", response_model=ProductFacetsResponse)
+async def get_product_facets(
+    query: Optional[str] = Query(None, description="Поисковый запрос"),
+    category: Optional[str] = Query(None, description="Фильтр по категории"),
+    city: Optional[str] = Query(None, description="Фильтр по городу магазина"),
+    store_id: Optional[int] = Query(None, description="Фильтр по магазину"),
+    brand: Optional[str] = Query(None, description="Фильтр по бренду"),
+    min_price: Optional[float] = Query(None, description="Минимальная цена"),
+    max_price: Optional[float] = Query(None, description="Максимальная цена"),
+    min_rating: Optional[float] = Query(None, description="Минимальный рейтинг"),
+    sizes: Optional[str] = Query(None, description="Размеры через запятую (S,M,L)"),
+    colors: Optional[str] = Query(None, description="Цвета через запятую"),
+    in_stock_only: bool = Query(False, description="Только товары в наличии"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Счётчики по категориям, брендам, городам, размерам, цветам, цене и рейтингу для текущих фильтров"""
+    
+    size_list = [s.strip() for s in sizes.split(",")] if sizes else None
+    color_list = [c.strip() for c in colors.split(",")] if colors else None
+    
+    base = select(Product.id).join(Store).filter(Product.is_active == True)
+    if query:
+        base, _ = await apply_text_search(db, base, query)
+    
+    conditions = product_filter_conditions(
+        category=category,
+        city=city,
+        store_id=store_id,
+        brand=brand,
+        min_price=min_price,
+        max_price=max_price,
+        min_rating=min_rating,
+        sizes=size_list,
+        colors=color_list,
+        in_stock_only=in_stock_only
+    )
+    facets = await compute_facets(db, base, conditions)
+    
+    filters = {
+        "query": query,
+        "category": category,
+        "city": city,
+        "store_id": store_id,
+        "brand": brand,
+        "price_range": [min_price, max_price] if min_price or max_price else None,
+        "min_rating": min_rating,
+        "sizes": size_list,
+        "colors": color_list,
+        "in_stock_only": in_stock_only or None
+    }
+    facets.filters = {k: v for k, v in filters.items() if v is not None}
+    return facets
+
+
 @router.get("/by-city/{city}", response_model=ProductListResponse)
 async def get_products_by_city(
     city: str,
@@ -181,11 +257,13 @@ async def get_products_by_city(
     sort_order: str = Query("desc", description="Порядок"),
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (keyset-пагинация вместо page)"),
+    total_mode: TotalMode = Query("exact", description="Подсчёт total: exact, estimate, none"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получить товары по городу"""
     
-    query_obj = db.query(Product).join(Store).filter(
+    query_obj = select(Product).join(Store).filter(
         Product.is_active == True,
         Store.city.ilike(f"%{city}%")
     )
@@ -193,148 +271,132 @@ async def get_products_by_city(
     if category:
         query_obj = query_obj.filter(Product.category.ilike(f"%{category}%"))
     
-    # Сортировка
-    sort_column = getattr(Product, sort_by, Product.created_at)
-    if sort_order.lower() == "asc":
-        query_obj = query_obj.order_by(asc(sort_column))
-    else:
-        query_obj = query_obj.order_by(desc(sort_column))
-    
-    total = query_obj.count()
-    products = query_obj.offset((page - 1) * per_page).limit(per_page).all()
+    # Сортировка и пагинация: по курсору (sort_by, id) или по номеру страницы
+    sort_by, sort_column = resolve_sort_column(Product, sort_by, PRODUCT_SORT_FIELDS)
+    total, total_is_estimate = await count_total(db, query_obj, total_mode)
+    products, next_cursor = await fetch_page(
+        db,
+        query_obj.options(*product_brief_options("joined")),
+        sort_by=sort_by,
+        sort_column=sort_column,
+        id_column=Product.id,
+        sort_order=sort_order,
+        per_page=per_page,
+        page=page,
+        cursor=cursor
+    )
     
     if not products:
         raise HTTPException(status_code=404, detail=f"Товары в городе '{city}' не найдены")
     
     # Преобразование в ProductBrief
-    products_brief = []
-    for product in products:
-        product_data = {
-            "id": product.id,
-            "name": product.name,
-            "price": product.price,
-            "original_price": product.original_price,
-            "rating": product.rating,
-            "image_urls": product.image_urls,
-            "discount_percentage": product.discount_percentage,
-            "is_in_stock": product.is_in_stock,
-            "store": {
-                "id": product.store.id,
-                "name": product.store.name,
-                "city": product.store.city,
-                "logo_url": product.store.logo_url,
-                "rating": product.store.rating
-            }
-        }
-        products_brief.append(ProductBrief(**product_data))
+    products_brief = to_product_briefs(products)
     
     return ProductListResponse(
         products=products_brief,
         total=total,
         page=page,
         per_page=per_page,
-        filters={"city": city, "category": category}
+        filters={"city": city, "category": category},
+        next_cursor=next_cursor,
+        total_is_estimate=total_is_estimate
     )
 
 
 @router.get("/search", response_model=ProductListResponse)
 async def search_products(
     search_query: ProductSearchQuery = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Расширенный поиск товаров"""
     
-    query_obj = db.query(Product).join(Store).filter(Product.is_active == True)
+    query_obj = select(Product).join(Store).filter(Product.is_active == True)
+    # Пока векторный индекс строится в фоне, запрос обслуживается полнотекстовым поиском
+    use_semantic = search_query.semantic and bool(search_query.query) and is_vector_index_ready()
     
     # Применяем все фильтры из search_query
-    if search_query.query:
-        search_filter = or_(
-            Product.name.ilike(f"%{search_query.query}%"),
-            Product.description.ilike(f"%{search_query.query}%"),
-            Product.brand.ilike(f"%{search_query.query}%"),
-            Product.category.ilike(f"%{search_query.query}%")
+    rank = None
+    if search_query.query and not use_semantic:
+        query_obj, rank = await apply_text_search(db, query_obj, search_query.query)
+    
+    conditions = product_filter_conditions(
+        category=search_query.category,
+        city=search_query.city,
+        store_id=search_query.store_id,
+        brand=search_query.brand,
+        min_price=search_query.min_price,
+        max_price=search_query.max_price,
+        min_rating=search_query.min_rating,
+        sizes=search_query.sizes,
+        colors=search_query.colors,
+        in_stock_only=search_query.in_stock_only
+    )
+    query_obj = query_obj.filter(*conditions.values())
+    
+    offset = (search_query.page - 1) * search_query.per_page
+    if use_semantic:
+        # Семантический поиск: фильтры отбирают id, векторный индекс ранжирует их
+        candidate_ids = (await db.scalars(query_obj.with_only_columns(Product.id))).all()
+        ranked = await semantic_search_async(
+            search_query.query,
+            top_k=offset + search_query.per_page,
+            candidate_ids=candidate_ids
         )
-        query_obj = query_obj.filter(search_filter)
-    
-    if search_query.category:
-        query_obj = query_obj.filter(Product.category.ilike(f"%{search_query.category}%"))
-    
-    if search_query.city:
-        query_obj = query_obj.filter(Store.city.ilike(f"%{search_query.city}%"))
-    
-    if search_query.store_id:
-        query_obj = query_obj.filter(Product.store_id == search_query.store_id)
-    
-    if search_query.brand:
-        query_obj = query_obj.filter(Product.brand.ilike(f"%{search_query.brand}%"))
-    
-    if search_query.min_price:
-        query_obj = query_obj.filter(Product.price >= search_query.min_price)
-    
-    if search_query.max_price:
-        query_obj = query_obj.filter(Product.price <= search_query.max_price)
-    
-    if search_query.min_rating:
-        query_obj = query_obj.filter(Product.rating >= search_query.min_rating)
-    
-    if search_query.sizes:
-        size_filters = [Product.sizes.contains([size]) for size in search_query.sizes]
-        query_obj = query_obj.filter(or_(*size_filters))
-    
-    if search_query.colors:
-        color_filters = [Product.colors.contains([color]) for color in search_query.colors]
-        query_obj = query_obj.filter(or_(*color_filters))
-    
-    if search_query.in_stock_only:
-        query_obj = query_obj.filter(Product.stock_quantity > 0)
-    
-    # Сортировка
-    sort_column = getattr(Product, search_query.sort_by, Product.created_at)
-    if search_query.sort_order.lower() == "asc":
-        query_obj = query_obj.order_by(asc(sort_column))
+        total, total_is_estimate, next_cursor = len(candidate_ids), False, None
+        page_ids = [product_id for product_id, _ in ranked[offset:offset + search_query.per_page]]
+        products_by_id = {
+            product.id: product
+            for product in (await db.scalars(
+                select(Product).options(*product_brief_options("selectin")).filter(Product.id.in_(page_ids))
+            )).all()
+        } if page_ids else {}
+        products = [products_by_id[product_id] for product_id in page_ids if product_id in products_by_id]
+    elif rank is not None and search_query.sort_by in (None, RELEVANCE_SORT):
+        # По релевантности – только по номеру страницы, курсор не выдаётся
+        total, total_is_estimate = await count_total(db, query_obj, search_query.total_mode)
+        products = await fetch_ranked_page(
+            db,
+            query_obj.options(*product_brief_options("joined")),
+            rank,
+            per_page=search_query.per_page,
+            page=search_query.page
+        )
+        next_cursor = None
     else:
-        query_obj = query_obj.order_by(desc(sort_column))
-    
-    # Пагинация
-    total = query_obj.count()
-    products = query_obj.offset((search_query.page - 1) * search_query.per_page).limit(search_query.per_page).all()
+        # Сортировка и пагинация: по курсору (sort_by, id) или по номеру страницы
+        sort_by, sort_column = resolve_sort_column(Product, search_query.sort_by, PRODUCT_SORT_FIELDS)
+        total, total_is_estimate = await count_total(db, query_obj, search_query.total_mode)
+        products, next_cursor = await fetch_page(
+            db,
+            query_obj.options(*product_brief_options("joined")),
+            sort_by=sort_by,
+            sort_column=sort_column,
+            id_column=Product.id,
+            sort_order=search_query.sort_order,
+            per_page=search_query.per_page,
+            page=search_query.page,
+            cursor=search_query.cursor
+        )
     
     # Преобразование в ProductBrief
-    products_brief = []
-    for product in products:
-        product_data = {
-            "id": product.id,
-            "name": product.name,
-            "price": product.price,
-            "original_price": product.original_price,
-            "rating": product.rating,
-            "image_urls": product.image_urls,
-            "discount_percentage": product.discount_percentage,
-            "is_in_stock": product.is_in_stock,
-            "store": {
-                "id": product.store.id,
-                "name": product.store.name,
-                "city": product.store.city,
-                "logo_url": product.store.logo_url,
-                "rating": product.store.rating
-            }
-        }
-        products_brief.append(ProductBrief(**product_data))
+    products_brief = to_product_briefs(products)
     
     return ProductListResponse(
         products=products_brief,
         total=total,
         page=search_query.page,
         per_page=search_query.per_page,
-        filters=search_query.model_dump(exclude={"page", "per_page", "sort_by", "sort_order"})
+        filters=search_query.model_dump(exclude={"page", "per_page", "sort_by", "sort_order", "cursor", "total_mode"}),
+        next_cursor=next_cursor,
+        total_is_estimate=total_is_estimate
     )
 
 
 @router.get("/{product_id}", response_model=ProductResponse)
-async def get_product(product_id: int, db: Session = Depends(get_db)):
+async def get_product(product_id: int, db: AsyncSession = Depends(get_async_db)):
     """Получить информацию о конкретном товаре"""
     
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await _get_product_with_store(db, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Товар не найден")
     
@@ -359,7 +421,7 @@ async def get_product(product_id: int, db: Session = Depends(get_db)):
 @router.post("/", response_model=ProductResponse)
 async def create_product(
     product_data: ProductCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Создать новый товар (для админов/магазинов)"""
@@ -381,7 +443,7 @@ async def create_product(
             )
     
     # Проверяем существование магазина
-    store = db.query(Store).filter(Store.id == product_data.store_id).first()
+    store = await db.scalar(select(Store).filter(Store.id == product_data.store_id))
     if not store:
         raise HTTPException(status_code=404, detail="Магазин не найден")
     
@@ -390,8 +452,9 @@ async def create_product(
     product = Product(**product_dict)
     
     db.add(product)
-    db.commit()
-    db.refresh(product)
+    await db.commit()
+    product = await _get_product_with_store(db, product.id)
+    await _sync_product_indexes(db, product)
     
     logger.info(f"User {current_user.username} ({user_role.value}) created product: {product.name} in store {store.name}")
     
@@ -417,12 +480,12 @@ async def create_product(
 async def update_product(
     product_id: int,
     product_data: ProductUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Обновить товар (для админов/магазинов)"""
     
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await _get_product_with_store(db, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Товар не найден")
     
@@ -446,8 +509,9 @@ async def update_product(
     for field, value in product_data.model_dump(exclude_unset=True).items():
         setattr(product, field, value)
     
-    db.commit()
-    db.refresh(product)
+    await db.commit()
+    product = await _get_product_with_store(db, product.id)
+    await _sync_product_indexes(db, product)
     
     logger.info(f"User {current_user.username} ({user_role.value}) updated product: {product.name}")
     
@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, asc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy import func, desc, select
 from typing import List, Optional
 import logging
 from datetime import datetime, timedelta
 
-from src.database import get_db
+from src.database import get_async_db
 from src.models.review import Review
 from src.models.product import Product
 from src.models.user import User
@@ -13,10 +14,24 @@ from src.schemas.review import (
     ReviewResponse, ReviewListResponse, ReviewCreate, ReviewUpdate, ReviewStatsResponse
 )
 from src.utils.auth import get_current_user
+from src.utils.pagination import TotalMode, count_total, fetch_page, resolve_sort_column
 
 router = APIRouter(prefix="/reviews", tags=["reviews"])
 logger = logging.getLogger(__name__)
 
+# Поля сортировки, допустимые для keyset-пагинации (NOT NULL)
+REVIEW_SORT_FIELDS = ("created_at", "rating")
+
+
+async def _get_review(db: AsyncSession, review_id: int) -> Optional[Review]:
+    """Загрузить отзыв вместе с автором (нужен для ReviewResponse)"""
+    return await db.scalar(
+        select(Review)
+        .options(selectinload(Review.user))
+        .filter(Review.id == review_id)
+        .execution_options(populate_existing=True)
+    )
+
 
 @router.get("/product/{product_id}", response_model=ReviewListResponse)
 async def get_product_reviews(
@@ -27,16 +42,18 @@ async def get_product_reviews(
     sort_order: str = Query("desc", description="Порядок: asc, desc"),
     rating_filter: Optional[int] = Query(None, ge=1, le=5, description="Фильтр по рейтингу"),
     verified_only: bool = Query(False, description="Только проверенные отзывы"),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (keyset-пагинация вместо page)"),
+    total_mode: TotalMode = Query("exact", description="Подсчёт total: exact, estimate, none"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получить отзывы для конкретного товара"""
     
     # Проверяем существование товара
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await db.scalar(select(Product).filter(Product.id == product_id))
     if not product:
         raise HTTPException(status_code=404, detail="Товар не найден")
     
-    query = db.query(Review).filter(Review.product_id == product_id)
+    query = select(Review).filter(Review.product_id == product_id)
     
     # Фильтрация
     if rating_filter:
@@ -45,22 +62,28 @@ async def get_product_reviews(
     if verified_only:
         query = query.filter(Review.is_verified == True)
     
-    # Сортировка
-    sort_column = getattr(Review, sort_by, Review.created_at)
-    if sort_order.lower() == "asc":
-        query = query.order_by(asc(sort_column))
-    else:
-        query = query.order_by(desc(sort_column))
-    
-    # Пагинация
-    total = query.count()
-    reviews = query.offset((page - 1) * per_page).limit(per_page).all()
+    # Сортировка и пагинация: по курсору (sort_by, id) или по номеру страницы
+    sort_by, sort_column = resolve_sort_column(Review, sort_by, REVIEW_SORT_FIELDS)
+    total, total_is_estimate = await count_total(db, query, total_mode)
+    reviews, next_cursor = await fetch_page(
+        db,
+        query.options(selectinload(Review.user)),
+        sort_by=sort_by,
+        sort_column=sort_column,
+        id_column=Review.id,
+        sort_order=sort_order,
+        per_page=per_page,
+        page=page,
+        cursor=cursor
+    )
     
     # Статистика рейтингов
-    rating_stats = db.query(
-        Review.rating,
-        func.count(Review.id).label('count')
-    ).filter(Review.product_id == product_id).group_by(Review.rating).all()
+    rating_stats = (await db.execute(
+        select(
+            Review.rating,
+            func.count(Review.id).label('count')
+        ).filter(Review.product_id == product_id).group_by(Review.rating)
+    )).all()
     
     rating_distribution = {i: 0 for i in range(1, 6)}
     total_ratings = 0
@@ -69,7 +92,9 @@ async def get_product_reviews(
         total_ratings += stat.count
     
     # Средний рейтинг
-    avg_rating = db.query(func.avg(Review.rating)).filter(Review.product_id == product_id).scalar() or 0.0
+    avg_rating = await db.scalar(
+        select(func.avg(Review.rating)).filter(Review.product_id == product_id)
+    ) or 0.0
     
     return ReviewListResponse(
         reviews=reviews,
@@ -77,7 +102,9 @@ async def get_product_reviews(
         page=page,
         per_page=per_page,
         average_rating=round(avg_rating, 2),
-        rating_distribution=rating_distribution
+        rating_distribution=rating_distribution,
+        next_cursor=next_cursor,
+        total_is_estimate=total_is_estimate
     )
 
 
@@ -86,22 +113,26 @@ async def get_user_reviews(
     user_id: int,
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получить отзывы конкретного пользователя"""
     
     # Проверяем существование пользователя
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).filter(User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     
-    query = db.query(Review).filter(Review.user_id == user_id).order_by(desc(Review.created_at))
+    query = select(Review).filter(Review.user_id == user_id).order_by(desc(Review.created_at))
     
-    total = query.count()
-    reviews = query.offset((page - 1) * per_page).limit(per_page).all()
+    total = await db.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
+    reviews = (await db.scalars(
+        query.options(selectinload(Review.user)).offset((page - 1) * per_page).limit(per_page)
+    )).all()
     
     # Средний рейтинг пользователя
-    avg_rating = db.query(func.avg(Review.rating)).filter(Review.user_id == user_id).scalar() or 0.0
+    avg_rating = await db.scalar(
+        select(func.avg(Review.rating)).filter(Review.user_id == user_id)
+    ) or 0.0
     
     return ReviewListResponse(
         reviews=reviews,
@@ -116,21 +147,23 @@ async def get_user_reviews(
 @router.post("/", response_model=ReviewResponse)
 async def create_review(
     review_data: ReviewCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Создать новый отзыв"""
     
     # Проверяем существование товара
-    product = db.query(Product).filter(Product.id == review_data.product_id).first()
+    product = await db.scalar(select(Product).filter(Product.id == review_data.product_id))
     if not product:
         raise HTTPException(status_code=404, detail="Товар не найден")
     
     # Проверяем, не оставлял ли пользователь уже отзыв на этот товар
-    existing_review = db.query(Review).filter(
-        Review.product_id == review_data.product_id,
-        Review.user_id == current_user.id
-    ).first()
+    existing_review = await db.scalar(
+        select(Review).filter(
+            Review.product_id == review_data.product_id,
+            Review.user_id == current_user.id
+        ).limit(1)
+    )
     
     if existing_review:
         raise HTTPException(
@@ -145,11 +178,11 @@ async def create_review(
     )
     
     db.add(review)
-    db.commit()
-    db.refresh(review)
+    await db.commit()
     
     # Обновляем рейтинг товара
     await update_product_rating(product.id, db)
+    review = await _get_review(db, review.id)
     
     logger.info(f"Создан отзыв от пользователя {current_user.username} на товар {product.name}")
     
@@ -160,12 +193,12 @@ async def create_review(
 async def update_review(
     review_id: int,
     review_data: ReviewUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Обновить отзыв (только автор может редактировать)"""
     
-    review = db.query(Review).filter(Review.id == review_id).first()
+    review = await db.scalar(select(Review).filter(Review.id == review_id))
     if not review:
         raise HTTPException(status_code=404, detail="Отзыв не найден")
     
@@ -177,11 +210,11 @@ async def update_review(
     for field, value in review_data.model_dump(exclude_unset=True).items():
         setattr(review, field, value)
     
-    db.commit()
-    db.refresh(review)
+    await db.commit()
     
     # Обновляем рейтинг товара
     await update_product_rating(review.product_id, db)
+    review = await _get_review(db, review.id)
     
     logger.info(f"Обновлен отзыв {review_id}")
     
@@ -191,12 +224,12 @@ async def update_review(
 @router.delete("/{review_id}")
 async def delete_review(
     review_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Удалить отзыв (только автор может удалить)"""
     
-    review = db.query(Review).filter(Review.id == review_id).first()
+    review = await db.scalar(select(Review).filter(Review.id == review_id))
     if not review:
         raise HTTPException(status_code=404, detail="Отзыв не найден")
     
@@ -206,8 +239,8 @@ async def delete_review(
     
     product_id = review.product_id
     
-    db.delete(review)
-    db.commit()
+    await db.delete(review)
+    await db.commit()
     
     # Обновляем рейтинг товара
     await update_product_rating(product_id, db)
@@ -220,43 +253,53 @@ async def delete_review(
 @router.get("/stats/product/{product_id}", response_model=ReviewStatsResponse)
 async def get_product_review_stats(
     product_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получить статистику отзывов для товара"""
     
     # Проверяем существование товара
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await db.scalar(select(Product).filter(Product.id == product_id))
     if not product:
         raise HTTPException(status_code=404, detail="Товар не найден")
     
     # Общее количество отзывов
-    total_reviews = db.query(Review).filter(Review.product_id == product_id).count()
+    total_reviews = await db.scalar(
+        select(func.count(Review.id)).filter(Review.product_id == product_id)
+    )
     
     # Средний рейтинг
-    avg_rating = db.query(func.avg(Review.rating)).filter(Review.product_id == product_id).scalar() or 0.0
+    avg_rating = await db.scalar(
+        select(func.avg(Review.rating)).filter(Review.product_id == product_id)
+    ) or 0.0
     
     # Распределение рейтингов
-    rating_stats = db.query(
-        Review.rating,
-        func.count(Review.id).label('count')
-    ).filter(Review.product_id == product_id).group_by(Review.rating).all()
+    rating_stats = (await db.execute(
+        select(
+            Review.rating,
+            func.count(Review.id).label('count')
+        ).filter(Review.product_id == product_id).group_by(Review.rating)
+    )).all()
     
     rating_distribution = {i: 0 for i in range(1, 6)}
     for stat in rating_stats:
         rating_distribution[stat.rating] = stat.count
     
     # Количество проверенных отзывов
-    verified_count = db.query(Review).filter(
-        Review.product_id == product_id,
-        Review.is_verified == True
-    ).count()
+    verified_count = await db.scalar(
+        select(func.count(Review.id)).filter(
+            Review.product_id == product_id,
+            Review.is_verified == True
+        )
+    )
     
     # Количество отзывов за последние 30 дней
     thirty_days_ago = datetime.now() - timedelta(days=30)
-    recent_count = db.query(Review).filter(
-        Review.product_id == product_id,
-        Review.created_at >= thirty_days_ago
-    ).count()
+    recent_count = await db.scalar(
+        select(func.count(Review.id)).filter(
+            Review.product_id == product_id,
+            Review.created_at >= thirty_days_ago
+        )
+    )
     
     return ReviewStatsResponse(
         total_reviews=total_reviews,
@@ -267,20 +310,24 @@ async def get_product_review_stats(
     )
 
 
-async def update_product_rating(product_id: int, db: Session):
+async def update_product_rating(product_id: int, db: AsyncSession):
     """Обновить рейтинг товара на основе отзывов"""
     
     # Вычисляем новый средний рейтинг
-    avg_rating = db.query(func.avg(Review.rating)).filter(Review.product_id == product_id).scalar() or 0.0
+    avg_rating = await db.scalar(
+        select(func.avg(Review.rating)).filter(Review.product_id == product_id)
+    ) or 0.0
     
     # Подсчитываем количество отзывов
-    reviews_count = db.query(Review).filter(Review.product_id == product_id).count()
+    reviews_count = await db.scalar(
+        select(func.count(Review.id)).filter(Review.product_id == product_id)
+    )
     
     # Обновляем товар
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await db.scalar(select(Product).filter(Product.id == product_id))
     if product:
         product.rating = round(avg_rating, 2)
         product.reviews_count = reviews_count
-        db.commit()
+        await db.commit()
     
     return avg_rating, reviews_count 
\ No newline at end of file
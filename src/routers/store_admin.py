@@ -18,11 +18,21 @@ from src.schemas.store_admin import (
     StoreAnalytics, StoreAdminProductCreate, StoreAdminProductUpdate,
     LowStockAlert, PhotoProductUpload
 )
-from src.schemas.product import ProductResponse, ProductListResponse, ProductBrief
+from src.schemas.product import ProductResponse, ProductListResponse
 from src.utils.auth import get_current_user
 from src.utils.roles import check_store_access, UserRole
-from src.utils.firebase_storage import upload_image_to_firebase_async
+from src.utils.image_prep import prepare_image, upload_prepared_image
 from src.utils.analyze_image import analyze_image
+from src.models.analysis_job import ANALYSIS_PENDING, JOB_KIND_PRODUCT
+from src.utils.analysis_jobs import (
+    FALLBACK_PRODUCT_CATEGORY, FALLBACK_PRODUCT_NAME, enqueue_analysis, merge_product_analyses,
+    notify_analysis_worker
+)
+from src.utils.vector_index import index_product, remove_product_from_index
+from src.utils.product_projection import product_brief_options, to_product_briefs
+from src.utils.catalog_snapshot import (
+    refresh_product_in_snapshot, remove_product_from_snapshot, invalidate_catalog_snapshot
+)
 
 router = APIRouter(prefix="/store-admin", tags=["store-admin"])
 logger = logging.getLogger(__name__)
@@ -46,6 +56,29 @@ def get_store_admin_user(current_user: User = Depends(get_current_user)) -> User
     return current_user
 
 
+def _product_response(product: Product, store: Store, **extra) -> ProductResponse:
+    """
+    Полный ответ по товару.
+
+    Ответ собирается из словаря: после обновления снимка каталога связь store уже
+    загружена в product.__dict__ и не должна передаваться вторым аргументом store.
+    """
+    return ProductResponse(**{
+        **product.__dict__,
+        'price_info': product.price_display,
+        'discount_percentage': product.discount_percentage,
+        'is_in_stock': product.is_in_stock,
+        'store': {
+            "id": store.id,
+            "name": store.name,
+            "city": store.city,
+            "logo_url": store.logo_url,
+            "rating": store.rating
+        },
+        **extra
+    })
+
+
 @router.get("/dashboard", response_model=StoreAdminDashboard)
 async def get_dashboard(
     current_user: User = Depends(get_store_admin_user),
@@ -97,85 +130,31 @@ async def get_dashboard(
     ).scalar() or 0.0
     
     # Последние добавленные товары
-    recent_products_query = db.query(Product).filter(
+    recent_products_query = db.query(Product).options(*product_brief_options(None)).filter(
         Product.store_id == store.id,
         Product.is_active == True
     ).order_by(desc(Product.created_at)).limit(5).all()
     
-    recent_products = []
-    for product in recent_products_query:
-        recent_products.append(ProductBrief(
-            id=product.id,
-            name=product.name,
-            price=product.price,
-            original_price=product.original_price,
-            rating=product.rating,
-            image_urls=product.image_urls,
-            discount_percentage=product.discount_percentage,
-            is_in_stock=product.is_in_stock,
-            store={
-                "id": store.id,
-                "name": store.name,
-                "city": store.city,
-                "logo_url": store.logo_url,
-                "rating": store.rating
-            }
-        ))
+    recent_products = to_product_briefs(recent_products_query, store=store)
     
     # Товары с низким остатком
-    low_stock_products_query = db.query(Product).filter(
+    low_stock_products_query = db.query(Product).options(*product_brief_options(None)).filter(
         Product.store_id == store.id,
         Product.is_active == True,
         Product.stock_quantity <= 5,
         Product.stock_quantity > 0
     ).order_by(asc(Product.stock_quantity)).limit(5).all()
     
-    low_stock_products = []
-    for product in low_stock_products_query:
-        low_stock_products.append(ProductBrief(
-            id=product.id,
-            name=product.name,
-            price=product.price,
-            original_price=product.original_price,
-            rating=product.rating,
-            image_urls=product.image_urls,
-            discount_percentage=product.discount_percentage,
-            is_in_stock=product.is_in_stock,
-            store={
-                "id": store.id,
-                "name": store.name,
-                "city": store.city,
-                "logo_url": store.logo_url,
-                "rating": store.rating
-            }
-        ))
+    low_stock_products = to_product_briefs(low_stock_products_query, store=store)
     
     # Топ товары по рейтингу
-    top_rated_products_query = db.query(Product).filter(
+    top_rated_products_query = db.query(Product).options(*product_brief_options(None)).filter(
         Product.store_id == store.id,
         Product.is_active == True,
         Product.rating >= 4.0
     ).order_by(desc(Product.rating), desc(Product.reviews_count)).limit(5).all()
     
-    top_rated_products = []
-    for product in top_rated_products_query:
-        top_rated_products.append(ProductBrief(
-            id=product.id,
-            name=product.name,
-            price=product.price,
-            original_price=product.original_price,
-            rating=product.rating,
-            image_urls=product.image_urls,
-            discount_percentage=product.discount_percentage,
-            is_in_stock=product.is_in_stock,
-            store={
-                "id": store.id,
-                "name": store.name,
-                "city": store.city,
-                "logo_url": store.logo_url,
-                "rating": store.rating
-            }
-        ))
+    top_rated_products = to_product_briefs(top_rated_products_query, store=store)
     
     return StoreAdminDashboard(
         store={
@@ -240,31 +219,13 @@ async def get_store_products(
     
     # Пагинация
     total = query.count()
-    products = query.offset((page - 1) * per_page).limit(per_page).all()
+    products = query.options(*product_brief_options(None)).offset((page - 1) * per_page).limit(per_page).all()
     
     # Получаем информацию о магазине
     store = db.query(Store).filter(Store.id == store_id).first()
     
     # Преобразование в ProductBrief
-    products_brief = []
-    for product in products:
-        products_brief.append(ProductBrief(
-            id=product.id,
-            name=product.name,
-            price=product.price,
-            original_price=product.original_price,
-            rating=product.rating,
-            image_urls=product.image_urls,
-            discount_percentage=product.discount_percentage,
-            is_in_stock=product.is_in_stock,
-            store={
-                "id": store.id,
-                "name": store.name,
-                "city": store.city,
-                "logo_url": store.logo_url,
-                "rating": store.rating
-            }
-        ))
+    products_brief = to_product_briefs(products, store=store)
     
     return ProductListResponse(
         products=products_brief,
@@ -306,25 +267,16 @@ async def create_product(
     product = Product(**product_dict)
     
     db.add(product)
+    db.flush()
+    index_product(db, product)
     db.commit()
     db.refresh(product)
+    refresh_product_in_snapshot(product)
     
     logger.info(f"Store admin {current_user.username} created product: {product.name} in store {store.name}")
     
     # Возвращаем полный ответ
-    return ProductResponse(
-        **product.__dict__,
-        price_info=product.price_display,
-        discount_percentage=product.discount_percentage,
-        is_in_stock=product.is_in_stock,
-        store={
-            "id": store.id,
-            "name": store.name,
-            "city": store.city,
-            "logo_url": store.logo_url,
-            "rating": store.rating
-        }
-    )
+    return _product_response(product, store)
 
 
 @router.put("/products/{product_id}", response_model=ProductResponse)
@@ -351,25 +303,15 @@ async def update_product(
     for field, value in product_data.model_dump(exclude_unset=True).items():
         setattr(product, field, value)
     
+    index_product(db, product)
     db.commit()
     db.refresh(product)
+    refresh_product_in_snapshot(product)
     
     logger.info(f"Store admin {current_user.username} updated product: {product.name}")
     
     # Возвращаем полный ответ
-    return ProductResponse(
-        **product.__dict__,
-        price_info=product.price_display,
-        discount_percentage=product.discount_percentage,
-        is_in_stock=product.is_in_stock,
-        store={
-            "id": product.store.id,
-            "name": product.store.name,
-            "city": product.store.city,
-            "logo_url": product.store.logo_url,
-            "rating": product.store.rating
-        }
-    )
+    return _product_response(product, product.store)
 
 
 @router.delete("/products/{product_id}")
@@ -394,6 +336,8 @@ async def delete_product(
     product_name = product.name
     db.delete(product)
     db.commit()
+    remove_product_from_index(product_id)
+    remove_product_from_snapshot(product_id)
     
     logger.info(f"Store admin {current_user.username} deleted product: {product_name}")
     
@@ -554,6 +498,8 @@ async def update_store_settings(
     
     db.commit()
     db.refresh(store)
+    # Название/город магазина хранятся в снимке каталога рядом с товарами
+    invalidate_catalog_snapshot()
     
     logger.info(f"Store admin {current_user.username} updated store settings for {store.name}")
     
@@ -563,6 +509,7 @@ async def update_store_settings(
 @router.post("/products/upload-photos", response_model=ProductResponse)
 async def create_product_from_photos(
     upload_data: PhotoProductUpload,
+    background: bool = Query(False, description="Не ждать AI анализа: товар создаётся скрытым и заполняется фоновой задачей"),
     current_user: User = Depends(get_store_admin_user),
     db: Session = Depends(get_db)
 ):
@@ -584,108 +531,106 @@ async def create_product_from_photos(
             raise HTTPException(status_code=404, detail="Store not found")
 
     uploaded_image_urls = []
+    thumbnail_urls = []
     
     try:
         logger.info(f"Store admin {current_user.username} uploading {len(upload_data.images_base64)} photos for new product")
         
-        # 1. Загружаем все изображения в Firebase параллельно
-        upload_tasks = []
+        # 1. Декодируем, проверяем и уменьшаем изображения (в пуле процессов)
+        raw_images = []
         for i, image_base64 in enumerate(upload_data.images_base64):
             try:
                 # Декодируем base64 изображение
-                img_bytes = base64.b64decode(image_base64.split(",")[-1])
-                
-                # Генерируем уникальное имя файла
-                file_name = f"product_{store_id}_{uuid.uuid4()}_{i}.png"
-                
-                # Создаем задачу загрузки
-                upload_task = upload_image_to_firebase_async(img_bytes, file_name)
-                upload_tasks.append(upload_task)
-                
+                raw_images.append(base64.b64decode(image_base64.split(",")[-1]))
             except Exception as e:
                 logger.error(f"Error processing image {i}: {str(e)}")
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"Failed to process image {i+1}: invalid base64 format"
                 )
+
+        prepared_images = await asyncio.gather(
+            *(prepare_image(raw) for raw in raw_images), return_exceptions=True
+        )
+        for i, prepared in enumerate(prepared_images):
+            if isinstance(prepared, Exception):
+                logger.error(f"Error preparing image {i}: {prepared}")
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Failed to process image {i+1}: {prepared}"
+                )
+        images_bytes = [prepared.data for prepared in prepared_images]
+
+        # 2. Загружаем все изображения и миниатюры в Firebase параллельно
+        uploaded = await asyncio.gather(*(
+            upload_prepared_image(prepared, f"product_{store_id}_{uuid.uuid4()}_{i}")
+            for i, prepared in enumerate(prepared_images)
+        ))
+        uploaded_image_urls = [image_url for image_url, _ in uploaded]
+        thumbnail_urls = [thumbnail_url for _, thumbnail_url in uploaded]
+        logger.info(
+            f"Successfully uploaded {len(uploaded_image_urls)} images to Firebase "
+            f"({sum(len(raw) for raw in raw_images)} -> {sum(len(b) for b in images_bytes)} bytes)"
+        )
         
-        # Загружаем все изображения параллельно
-        uploaded_image_urls = await asyncio.gather(*upload_tasks)
-        logger.info(f"Successfully uploaded {len(uploaded_image_urls)} images to Firebase")
-        
-        # 2. Анализируем ВСЕ изображения параллельно через GPT Azure
+        if background:
+            # Анализ выполнит фоновый воркер; товар скрыт из каталога до его завершения
+            product = Product(
+                name=upload_data.name or FALLBACK_PRODUCT_NAME,
+                description="Товар ожидает анализа фото.",
+                price=upload_data.price,
+                original_price=upload_data.original_price,
+                category=FALLBACK_PRODUCT_CATEGORY,
+                brand=store.name,
+                features=[],
+                sizes=upload_data.sizes,
+                colors=upload_data.colors,
+                image_urls=uploaded_image_urls,
+                thumbnail_urls=thumbnail_urls,
+                stock_quantity=upload_data.stock_quantity,
+                store_id=store_id,
+                is_active=False,
+                analysis_status=ANALYSIS_PENDING
+            )
+            db.add(product)
+            db.flush()
+            job = enqueue_analysis(
+                db, JOB_KIND_PRODUCT, product.id, uploaded_image_urls,
+                user_id=current_user.id, name=upload_data.name
+            )
+            db.commit()
+            db.refresh(product)
+            notify_analysis_worker()
+
+            logger.info(f"Queued analysis job {job.id} for product {product.id} in store {store.name}")
+            return _product_response(product, store, analysis_job_id=job.id)
+
+        # 3. Анализируем ВСЕ изображения параллельно через GPT Azure
         logger.info(f"Analyzing {len(uploaded_image_urls)} images for comprehensive features extraction")
-        analysis_tasks = [analyze_image(image_url) for image_url in uploaded_image_urls]
+        # Байты передаются для кэша анализов: повторно загруженные фото не анализируются заново
+        analysis_tasks = [
+            analyze_image(image_url, image_bytes=img_bytes)
+            for image_url, img_bytes in zip(uploaded_image_urls, images_bytes)
+        ]
         all_analyses = await asyncio.gather(*analysis_tasks, return_exceptions=True)
-        
-        # 3. Обрабатываем результаты анализа всех изображений
-        all_features = []
-        all_names = []
-        all_categories = []
-        successful_analyses = 0
-        
+
         for i, analysis in enumerate(all_analyses):
             if isinstance(analysis, Exception):
                 logger.error(f"Error analyzing image {i+1}: {analysis}")
-                continue
-                
-            successful_analyses += 1
-            logger.info(f"Analysis {i+1} completed: {analysis}")
-            
-            # Собираем названия для выбора лучшего
-            if analysis.get("name"):
-                all_names.append(analysis["name"])
-            
-            # Собираем категории
-            if analysis.get("category"):
-                all_categories.append(analysis["category"])
-            
-            # Собираем features из всех изображений
-            image_features = analysis.get("features", [])
-            if image_features:
-                all_features.extend([f for f in image_features if f is not None and isinstance(f, str)])
-        
-        logger.info(f"Successfully analyzed {successful_analyses}/{len(uploaded_image_urls)} images")
-        
-        # 4. Убираем дубликаты features, сохраняя порядок
-        unique_features = []
-        seen_features = set()
-        for feature in all_features:
-            feature_lower = feature.lower()
-            if feature_lower not in seen_features:
-                unique_features.append(feature)
-                seen_features.add(feature_lower)
-        
-        logger.info(f"Combined {len(all_features)} features into {len(unique_features)} unique features")
-        
-        # 5. Определяем название товара
-        if upload_data.name:
-            # Используем название от фронтенда (приоритет)
-            product_name = upload_data.name
-            logger.info(f"Using name from frontend: {product_name}")
-        else:
-            # Выбираем самое подробное название из анализов
-            if all_names:
-                product_name = max(all_names, key=len)  # Самое подробное описание
-                logger.info(f"Using most detailed GPT name: {product_name}")
             else:
-                product_name = "Новый товар"
-                logger.info("Using fallback name: Новый товар")
-        
-        # 6. Определяем категорию (берем наиболее частую)
-        if all_categories:
-            from collections import Counter
-            category_counts = Counter(all_categories)
-            final_category = category_counts.most_common(1)[0][0]
-            logger.info(f"Selected category: {final_category} (appeared {category_counts[final_category]} times)")
-        else:
-            final_category = "other"
-            logger.info("Using fallback category: other")
-        
-        # 7. Финальные features (уже уникальные)
-        features = unique_features
+                logger.info(f"Analysis {i+1} completed: {analysis}")
+
+        # 4. Объединяем анализы: название, наиболее частая категория, уникальные features
+        merged = merge_product_analyses(all_analyses, upload_data.name)
+        successful_analyses = merged["successful"]
+        logger.info(f"Successfully analyzed {successful_analyses}/{len(uploaded_image_urls)} images")
+        logger.info(f"Product name: {merged['name']}, category: {merged['category']}, {len(merged['features'])} unique features")
+
+        product_name = merged["name"]
+        final_category = merged["category"]
+        features = merged["features"]
         
-        # 8. Создаем товар в базе данных
+        # 5. Создаем товар в базе данных
         product_data = {
             "name": product_name,
             "description": f"Товар добавлен через анализ {successful_analyses} фото.",
@@ -697,6 +642,7 @@ async def create_product_from_photos(
             "sizes": upload_data.sizes,  # От фронтенда
             "colors": upload_data.colors,  # От фронтенда
             "image_urls": uploaded_image_urls,  # URL изображений из Firebase
+            "thumbnail_urls": thumbnail_urls,  # Миниатюры в том же порядке
             "stock_quantity": upload_data.stock_quantity,
             "store_id": store_id,
             "is_active": True
@@ -704,25 +650,16 @@ async def create_product_from_photos(
         
         product = Product(**product_data)
         db.add(product)
+        db.flush()
+        index_product(db, product)
         db.commit()
         db.refresh(product)
+        refresh_product_in_snapshot(product)
         
         logger.info(f"Successfully created product: {product.name} (ID: {product.id}) in store {store.name}")
         
-        # 9. Возвращаем полный ответ
-        return ProductResponse(
-            **product.__dict__,
-            price_info=product.price_display,
-            discount_percentage=product.discount_percentage,
-            is_in_stock=product.is_in_stock,
-            store={
-                "id": store.id,
-                "name": store.name,
-                "city": store.city,
-                "logo_url": store.logo_url,
-                "rating": store.rating
-            }
-        )
+        # 6. Возвращаем полный ответ
+        return _product_response(product, store)
         
     except HTTPException:
         # Переподнимаем HTTP исключения
@@ -733,9 +670,8 @@ async def create_product_from_photos(
         # В случае ошибки пытаемся удалить загруженные изображения
         if uploaded_image_urls:
             try:
-                from src.utils.firebase_storage import delete_image_from_firebase_async
-                delete_tasks = [delete_image_from_firebase_async(url) for url in uploaded_image_urls]
-                await asyncio.gather(*delete_tasks, return_exceptions=True)
+                from src.utils.firebase_storage import delete_images_from_firebase_async
+                await delete_images_from_firebase_async([*uploaded_image_urls, *thumbnail_urls])
                 logger.info("Cleaned up uploaded images after error")
             except Exception as cleanup_error:
                 logger.error(f"Failed to cleanup images: {cleanup_error}")
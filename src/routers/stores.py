@@ -1,24 +1,40 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, asc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, desc, asc, select
 from typing import List, Optional
 import logging
 
-from src.database import get_db
-from src.models.store import Store
+from src.database import get_async_db
+from src.models.store import Store, with_products_count
 from src.models.product import Product
 from src.schemas.store import (
     StoreResponse, StoreListResponse, StoreBrief, StoreCreate, StoreUpdate,
     CityStatsResponse, CitiesListResponse, StoreStatsResponse
 )
-from src.schemas.product import ProductBrief, ProductListResponse
+from src.schemas.product import ProductListResponse
 from src.utils.auth import get_current_user
 from src.utils.roles import require_admin
+from src.utils.catalog_snapshot import invalidate_catalog_snapshot
+from src.utils.product_projection import product_brief_options, to_product_briefs
+from src.utils.pagination import TotalMode, count_total, fetch_page, resolve_sort_column
 from src.models.user import User
 
 router = APIRouter(prefix="/stores", tags=["stores"])
 logger = logging.getLogger(__name__)
 
+# Поля сортировки, допустимые для keyset-пагинации (NOT NULL)
+STORE_SORT_FIELDS = ("created_at", "name", "rating", "city")
+
+
+async def _get_store(db: AsyncSession, store_id: int) -> Optional[Store]:
+    """Загрузить магазин вместе с количеством товаров (для total_products)"""
+    return await db.scalar(
+        select(Store)
+        .options(with_products_count())
+        .filter(Store.id == store_id)
+        .execution_options(populate_existing=True)
+    )
+
 
 @router.get("/", response_model=StoreListResponse)
 async def get_stores(
@@ -28,11 +44,13 @@ async def get_stores(
     sort_order: str = Query("desc", description="Порядок: asc, desc"),
     page: int = Query(1, ge=1, description="Номер страницы"),
     per_page: int = Query(20, ge=1, le=100, description="Количество на странице"),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (keyset-пагинация вместо page)"),
+    total_mode: TotalMode = Query("exact", description="Подсчёт total: exact, estimate, none"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получить список всех магазинов с фильтрацией"""
     
-    query = db.query(Store)
+    query = select(Store)
     
     # Фильтрация
     if city:
@@ -41,39 +59,43 @@ async def get_stores(
     if rating_min:
         query = query.filter(Store.rating >= rating_min)
     
-    # Сортировка
-    sort_column = getattr(Store, sort_by, Store.created_at)
-    if sort_order.lower() == "asc":
-        query = query.order_by(asc(sort_column))
-    else:
-        query = query.order_by(desc(sort_column))
-    
-    # Пагинация
-    total = query.count()
-    stores = query.offset((page - 1) * per_page).limit(per_page).all()
+    # Сортировка и пагинация: по курсору (sort_by, id) или по номеру страницы
+    sort_by, sort_column = resolve_sort_column(Store, sort_by, STORE_SORT_FIELDS)
+    total, total_is_estimate = await count_total(db, query, total_mode)
+    stores, next_cursor = await fetch_page(
+        db,
+        query.options(with_products_count()),
+        sort_by=sort_by,
+        sort_column=sort_column,
+        id_column=Store.id,
+        sort_order=sort_order,
+        per_page=per_page,
+        page=page,
+        cursor=cursor
+    )
     
     return StoreListResponse(
         stores=stores,
         total=total,
         page=page,
-        per_page=per_page
+        per_page=per_page,
+        next_cursor=next_cursor,
+        total_is_estimate=total_is_estimate
     )
 
 
 @router.get("/cities", response_model=CitiesListResponse)
-async def get_cities(db: Session = Depends(get_db)):
+async def get_cities(db: AsyncSession = Depends(get_async_db)):
     """Получить список всех городов с магазинами"""
     
     # Получаем статистику по городам
-    cities_data = db.query(
-        Store.city,
-        func.count(Store.id).label('stores_count'),
-        func.coalesce(func.sum(
-            db.query(func.count(Product.id))
-            .filter(Product.store_id == Store.id)
-            .scalar_subquery()
-        ), 0).label('products_count')
-    ).group_by(Store.city).all()
+    cities_data = (await db.execute(
+        select(
+            Store.city,
+            func.count(func.distinct(Store.id)).label('stores_count'),
+            func.count(Product.id).label('products_count')
+        ).outerjoin(Product, Product.store_id == Store.id).group_by(Store.city)
+    )).all()
     
     cities = [
         CityStatsResponse(
@@ -92,14 +114,16 @@ async def get_stores_by_city(
     city: str,
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получить магазины по городу"""
     
-    query = db.query(Store).filter(Store.city.ilike(f"%{city}%"))
+    query = select(Store).filter(Store.city.ilike(f"%{city}%"))
     
-    total = query.count()
-    stores = query.offset((page - 1) * per_page).limit(per_page).all()
+    total = await db.scalar(select(func.count()).select_from(query.subquery()))
+    stores = (await db.scalars(
+        query.options(with_products_count()).offset((page - 1) * per_page).limit(per_page)
+    )).all()
     
     if not stores:
         raise HTTPException(status_code=404, detail=f"Магазины в городе '{city}' не найдены")
@@ -113,10 +137,10 @@ async def get_stores_by_city(
 
 
 @router.get("/{store_id}", response_model=StoreResponse)
-async def get_store(store_id: int, db: Session = Depends(get_db)):
+async def get_store(store_id: int, db: AsyncSession = Depends(get_async_db)):
     """Получить информацию о конкретном магазине"""
     
-    store = db.query(Store).filter(Store.id == store_id).first()
+    store = await _get_store(db, store_id)
     if not store:
         raise HTTPException(status_code=404, detail="Магазин не найден")
     
@@ -132,16 +156,16 @@ async def get_store_products(
     sort_order: str = Query("desc", description="Порядок: asc, desc"),
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получить товары конкретного магазина"""
     
     # Проверяем существование магазина
-    store = db.query(Store).filter(Store.id == store_id).first()
+    store = await db.scalar(select(Store).filter(Store.id == store_id))
     if not store:
         raise HTTPException(status_code=404, detail="Магазин не найден")
     
-    query = db.query(Product).filter(Product.store_id == store_id, Product.is_active == True)
+    query = select(Product).filter(Product.store_id == store_id, Product.is_active == True)
     
     # Фильтрация
     if category:
@@ -158,30 +182,13 @@ async def get_store_products(
         query = query.order_by(desc(sort_column))
     
     # Пагинация
-    total = query.count()
-    products = query.offset((page - 1) * per_page).limit(per_page).all()
+    total = await db.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
+    products = (await db.scalars(
+        query.options(*product_brief_options(None)).offset((page - 1) * per_page).limit(per_page)
+    )).all()
     
     # Преобразование в ProductBrief с вычисляемыми полями
-    products_brief = []
-    for product in products:
-        product_data = {
-            "id": product.id,
-            "name": product.name,
-            "price": product.price,
-            "original_price": product.original_price,
-            "rating": product.rating,
-            "image_urls": product.image_urls,
-            "discount_percentage": product.discount_percentage,
-            "is_in_stock": product.is_in_stock,
-            "store": {
-                "id": product.store.id,
-                "name": product.store.name,
-                "city": product.store.city,
-                "logo_url": product.store.logo_url,
-                "rating": product.store.rating
-            }
-        }
-        products_brief.append(ProductBrief(**product_data))
+    products_brief = to_product_briefs(products, store=store)
     
     return ProductListResponse(
         products=products_brief,
@@ -192,45 +199,55 @@ async def get_store_products(
 
 
 @router.get("/{store_id}/stats", response_model=StoreStatsResponse)
-async def get_store_stats(store_id: int, db: Session = Depends(get_db)):
+async def get_store_stats(store_id: int, db: AsyncSession = Depends(get_async_db)):
     """Получить статистику магазина"""
     
-    store = db.query(Store).filter(Store.id == store_id).first()
+    store = await db.scalar(select(Store).filter(Store.id == store_id))
     if not store:
         raise HTTPException(status_code=404, detail="Магазин не найден")
     
     # Статистика товаров
-    total_products = db.query(Product).filter(Product.store_id == store_id).count()
-    active_products = db.query(Product).filter(
-        Product.store_id == store_id, 
-        Product.is_active == True
-    ).count()
+    total_products = await db.scalar(
+        select(func.count(Product.id)).filter(Product.store_id == store_id)
+    )
+    active_products = await db.scalar(
+        select(func.count(Product.id)).filter(
+            Product.store_id == store_id, 
+            Product.is_active == True
+        )
+    )
     
     # Средний рейтинг товаров
-    avg_rating = db.query(func.avg(Product.rating)).filter(
-        Product.store_id == store_id,
-        Product.is_active == True
-    ).scalar() or 0.0
+    avg_rating = await db.scalar(
+        select(func.avg(Product.rating)).filter(
+            Product.store_id == store_id,
+            Product.is_active == True
+        )
+    ) or 0.0
     
     # Количество отзывов
-    total_reviews = db.query(func.sum(Product.reviews_count)).filter(
-        Product.store_id == store_id
-    ).scalar() or 0
+    total_reviews = await db.scalar(
+        select(func.sum(Product.reviews_count)).filter(Product.store_id == store_id)
+    ) or 0
     
     # Количество категорий
-    categories_count = db.query(func.count(func.distinct(Product.category))).filter(
-        Product.store_id == store_id,
-        Product.is_active == True
-    ).scalar() or 0
+    categories_count = await db.scalar(
+        select(func.count(func.distinct(Product.category))).filter(
+            Product.store_id == store_id,
+            Product.is_active == True
+        )
+    ) or 0
     
     # Топ категории
-    top_categories = db.query(
-        Product.category,
-        func.count(Product.id).label('count')
-    ).filter(
-        Product.store_id == store_id,
-        Product.is_active == True
-    ).group_by(Product.category).order_by(desc('count')).limit(5).all()
+    top_categories = (await db.execute(
+        select(
+            Product.category,
+            func.count(Product.id).label('count')
+        ).filter(
+            Product.store_id == store_id,
+            Product.is_active == True
+        ).group_by(Product.category).order_by(desc('count')).limit(5)
+    )).all()
     
     return StoreStatsResponse(
         id=store.id,
@@ -250,46 +267,29 @@ async def get_store_by_name_with_products(
     store_name: str,
     page: int = Query(1, ge=1, description="Номер страницы"),
     per_page: int = Query(20, ge=1, le=100, description="Количество на странице"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получить магазин по имени и его товары (без авторизации)"""
     
     # Ищем магазин по имени (case-insensitive)
-    store = db.query(Store).filter(Store.name.ilike(store_name)).first()
+    store = await db.scalar(select(Store).filter(Store.name.ilike(store_name)).limit(1))
     if not store:
         raise HTTPException(status_code=404, detail=f"Магазин '{store_name}' не найден")
     
     # Получаем активные товары магазина
-    query = db.query(Product).filter(
+    query = select(Product).filter(
         Product.store_id == store.id,
         Product.is_active == True
     ).order_by(desc(Product.created_at))
     
     # Пагинация
-    total = query.count()
-    products = query.offset((page - 1) * per_page).limit(per_page).all()
+    total = await db.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
+    products = (await db.scalars(
+        query.options(*product_brief_options(None)).offset((page - 1) * per_page).limit(per_page)
+    )).all()
     
     # Преобразование в ProductBrief
-    products_brief = []
-    for product in products:
-        product_data = {
-            "id": product.id,
-            "name": product.name,
-            "price": product.price,
-            "original_price": product.original_price,
-            "rating": product.rating,
-            "image_urls": product.image_urls,
-            "discount_percentage": product.discount_percentage,
-            "is_in_stock": product.is_in_stock,
-            "store": {
-                "id": store.id,
-                "name": store.name,
-                "city": store.city,
-                "logo_url": store.logo_url,
-                "rating": store.rating
-            }
-        }
-        products_brief.append(ProductBrief(**product_data))
+    products_brief = to_product_briefs(products, store=store)
     
     return ProductListResponse(
         products=products_brief,
@@ -303,16 +303,18 @@ async def get_store_by_name_with_products(
 @router.post("/", response_model=StoreResponse)
 async def create_store(
     store_data: StoreCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(require_admin())
 ):
     """Создать новый магазин (только для суперадминов)"""
     
     # Проверяем, не существует ли уже магазин с таким названием в этом городе
-    existing_store = db.query(Store).filter(
-        Store.name == store_data.name,
-        Store.city == store_data.city
-    ).first()
+    existing_store = await db.scalar(
+        select(Store).filter(
+            Store.name == store_data.name,
+            Store.city == store_data.city
+        ).limit(1)
+    )
     
     if existing_store:
         raise HTTPException(
@@ -322,8 +324,8 @@ async def create_store(
     
     store = Store(**store_data.model_dump())
     db.add(store)
-    db.commit()
-    db.refresh(store)
+    await db.commit()
+    store = await _get_store(db, store.id)
     
     logger.info(f"Создан новый магазин: {store.name} в {store.city}")
     
@@ -334,12 +336,12 @@ async def create_store(
 async def update_store(
     store_id: int,
     store_data: StoreUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(require_admin())
 ):
     """Обновить информацию о магазине (только для суперадминов)"""
     
-    store = db.query(Store).filter(Store.id == store_id).first()
+    store = await db.scalar(select(Store).filter(Store.id == store_id))
     if not store:
         raise HTTPException(status_code=404, detail="Магазин не найден")
     
@@ -347,8 +349,10 @@ async def update_store(
     for field, value in store_data.model_dump(exclude_unset=True).items():
         setattr(store, field, value)
     
-    db.commit()
-    db.refresh(store)
+    await db.commit()
+    store = await _get_store(db, store.id)
+    # Название/город магазина хранятся в снимке каталога рядом с товарами
+    invalidate_catalog_snapshot()
     
     logger.info(f"Обновлен магазин: {store.name}")
     
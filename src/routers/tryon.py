@@ -9,8 +9,11 @@ from src.models.tryon import TryOn
 from src.models.user import User
 from src.schemas.tryon import TryOnResponse
 from src.utils.auth import get_current_user
-from src.utils.firebase_storage import upload_image_to_firebase_async, delete_image_from_firebase_async
+from src.utils.firebase_storage import (
+    upload_image_to_firebase_async, upload_images_to_firebase_async, delete_images_from_firebase_async
+)
 from src.utils.tryon_analyzer import analyze_image_for_tryon
+from src.utils.image_prep import InvalidImageError, PreparedImage, prepare_image
 import replicate
 import asyncio
 
@@ -22,8 +25,8 @@ router = APIRouter(prefix="/tryon", tags=["tryon"])
 
 async def process_tryon_in_background(
     tryon_id: int, 
-    clothing_bytes: bytes, 
-    human_bytes: bytes
+    clothing_image: PreparedImage, 
+    human_image: PreparedImage
 ):
     """
     Background task to process the try-on request without blocking the server.
@@ -45,13 +48,13 @@ async def process_tryon_in_background(
             return
 
         # 2. Upload images asynchronously
-        clothing_file_name = f"clothing_{uuid.uuid4()}.png"
-        human_file_name = f"human_{uuid.uuid4()}.png"
+        clothing_file_name = f"clothing_{uuid.uuid4()}.{clothing_image.extension}"
+        human_file_name = f"human_{uuid.uuid4()}.{human_image.extension}"
         
-        clothing_url_task = upload_image_to_firebase_async(clothing_bytes, clothing_file_name)
-        human_url_task = upload_image_to_firebase_async(human_bytes, human_file_name)
-        
-        clothing_url, human_url = await asyncio.gather(clothing_url_task, human_url_task)
+        clothing_url, human_url = await upload_images_to_firebase_async([
+            (clothing_image.data, clothing_file_name, clothing_image.content_type),
+            (human_image.data, human_file_name, human_image.content_type)
+        ])
 
         # Update DB with image URLs
         tryon.clothing_image_url = clothing_url
@@ -60,7 +63,7 @@ async def process_tryon_in_background(
 
         # Analyze the clothing image to get a description
         logger.info(f"Analyzing clothing image for try-on: {clothing_url}")
-        analysis_result = await analyze_image_for_tryon(clothing_url)
+        analysis_result = await analyze_image_for_tryon(clothing_url, image_bytes=clothing_image.data)
         garment_description = analysis_result.get("garment_des", "")
         category = analysis_result.get("category", "upper_body") # Default to upper_body
         logger.info(f"Generated garment description: {garment_description}")
@@ -127,6 +130,18 @@ async def create_tryon(
     clothing_bytes = await clothing_image.read()
     human_bytes = await human_image.read()
 
+    # Validate and downscale both photos before accepting the request
+    try:
+        clothing_prepared, human_prepared = await asyncio.gather(
+            prepare_image(clothing_bytes),
+            prepare_image(human_bytes)
+        )
+    except InvalidImageError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
     # Create initial TryOn object in DB with minimal info
     # URLs will be populated by the background task
     tryon = TryOn(
@@ -143,8 +158,8 @@ async def create_tryon(
     background_tasks.add_task(
         process_tryon_in_background,
         tryon_id=tryon.id,
-        clothing_bytes=clothing_bytes,
-        human_bytes=human_bytes
+        clothing_image=clothing_prepared,
+        human_image=human_prepared
     )
 
     return tryon
@@ -200,12 +215,7 @@ async def delete_tryon(
         )
 
     # Delete all associated images from Firebase
-    if tryon.clothing_image_url:
-        await delete_image_from_firebase_async(tryon.clothing_image_url)
-    if tryon.human_image_url:
-        await delete_image_from_firebase_async(tryon.human_image_url)
-    if tryon.result_url:
-        await delete_image_from_firebase_async(tryon.result_url)
+    await delete_images_from_firebase_async([tryon.clothing_image_url, tryon.human_image_url, tryon.result_url])
 
     # Delete from database
     db.delete(tryon)
@@ -19,8 +19,10 @@ from src.schemas.waitlist import (
     TryOnRequest,
 )
 from src.utils.auth import get_current_user
-from src.utils.firebase_storage import upload_image_to_firebase_async, delete_image_from_firebase_async
+from src.utils.firebase_storage import upload_image_to_firebase_async, delete_images_from_firebase_async
 from src.utils.tryon_analyzer import analyze_image_for_tryon
+from src.utils.image_analysis_cache import get_image_analysis_cache
+from src.utils.image_prep import InvalidImageError, prepare_image, upload_prepared_image
 
 router = APIRouter(prefix="/waitlist", tags=["waitlist"])
 
@@ -58,17 +60,28 @@ async def upload_screenshot(
             detail="Invalid base64 image data",
         )
 
+    # Validate, downscale and re-encode; a thumbnail is stored next to the screenshot
+    try:
+        prepared = await prepare_image(img_bytes)
+    except InvalidImageError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+
     # Upload to Firebase Storage
-    file_name = f"{uuid.uuid4()}.png"
     try:
-        image_url = await upload_image_to_firebase_async(img_bytes, file_name)
+        image_url, thumbnail_url = await upload_prepared_image(prepared, str(uuid.uuid4()))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to save screenshot to Firebase: {e}",
         )
 
-    db_item = WaitListItem(image_url=image_url, user_id=current_user.id)
+    # Try-on of this screenshot will look up its analysis by content hash without downloading it
+    get_image_analysis_cache().remember(image_url, prepared.data)
+
+    db_item = WaitListItem(image_url=image_url, thumbnail_url=thumbnail_url, user_id=current_user.id)
     db.add(db_item)
     db.commit()
     db.refresh(db_item)
@@ -98,8 +111,9 @@ async def try_on_item(
     try:
         # Decode and upload user's photo
         img_bytes = base64.b64decode(payload.image_base64.split(",")[-1])
-        file_name = f"user_photo_{uuid.uuid4()}.png"
-        user_photo_url = await upload_image_to_firebase_async(img_bytes, file_name)
+        prepared = await prepare_image(img_bytes)
+        file_name = f"user_photo_{uuid.uuid4()}.{prepared.extension}"
+        user_photo_url = await upload_image_to_firebase_async(prepared.data, file_name, content_type=prepared.content_type)
 
         # Analyze the clothing image to get a description and category
         analysis_result = await analyze_image_for_tryon(db_item.image_url)
@@ -140,6 +154,11 @@ async def try_on_item(
 
         return db_item
 
+    except InvalidImageError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -182,10 +201,7 @@ async def delete_waitlist_item(
         )
 
     # Delete images from Firebase
-    if item.image_url:
-        await delete_image_from_firebase_async(item.image_url)
-    if item.try_on_url:
-        await delete_image_from_firebase_async(item.try_on_url)
+    await delete_images_from_firebase_async([item.image_url, item.thumbnail_url, item.try_on_url])
 
     # Delete from database
     db.delete(item)
@@ -1,65 +1,119 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from typing import List
-import base64
-import uuid
 from src.database import get_db
 from src.models.clothing import ClothingItem
 from src.models.user import User
 from src.schemas.clothing import ClothingItemCreate, ClothingItemResponse
 from src.utils.auth import get_current_user
-from src.utils.firebase_storage import upload_image_to_firebase_async, delete_image_from_firebase_async
-from src.schemas.clothing import PhotoUpload
-from src.utils.analyze_image import analyze_image
+from src.utils.firebase_storage import delete_images_from_firebase_async
+from src.schemas.clothing import PhotoUpload, PhotoUploadResult, PhotoBatchResponse
+from src.utils.wardrobe_ingest import IngestResult, discard_uploads, ingest_photos
+from src.utils.wardrobe_snapshot import invalidate_wardrobe_snapshot
+from src.models.analysis_job import JOB_KIND_CLOTHING_ITEM
+from src.utils.analysis_jobs import enqueue_analysis, notify_analysis_worker
 
 router = APIRouter(prefix="/wardrobe", tags=["wardrobe"])
 
 @router.post("/items", response_model=List[ClothingItemResponse])
 async def create_clothing_items(
     photos: List[PhotoUpload],
+    background: bool = Query(False, description="Return right after upload; items are analyzed by a background job"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    created_items = []
-    
-    for photo in photos:
-        try:
-            # Decode base64 image
-            img_bytes = base64.b64decode(photo.image_base64.split(",")[-1])
-            
-            # Upload to Firebase Storage
-            file_name = f"{uuid.uuid4()}.png"
-            image_url = await upload_image_to_firebase_async(img_bytes, file_name)
-            
-            # Analyze image using Azure OpenAI
-            analysis = await analyze_image(image_url)
-            
-            # Filter out None values from features to prevent validation errors
-            features = [f for f in analysis.get("features", []) if f is not None and isinstance(f, str)]
-            
-            # Create database entry
-            db_item = ClothingItem(
-                name=analysis["name"],  # Use the name from analysis
-                image_url=image_url,
-                category=analysis["category"],
-                features=features,
-                user_id=current_user.id
-            )
-            db.add(db_item)
-            created_items.append(db_item)
-            
-        except Exception as e:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Failed to process image: {str(e)}"
+    # Photos are uploaded and analyzed concurrently; the batch fails as a whole
+    results = await ingest_photos(photos, current_user.id, analyze=not background)
+
+    failed = next((r for r in results if not r.success), None)
+    if failed is not None:
+        await discard_uploads(results)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Failed to process image: {failed.error}"
+        )
+
+    if background:
+        return await _save_pending_items(db, results, current_user.id)
+    return await _save_ingested_items(db, results, current_user.id)
+
+@router.post("/items/batch", response_model=PhotoBatchResponse)
+async def create_clothing_items_batch(
+    photos: List[PhotoUpload],
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Upload several photos at once and report the outcome of each one.
+    Successful items are saved in one transaction even if other photos failed.
+    """
+    results = await ingest_photos(photos, current_user.id)
+    await discard_uploads(results, only_failed=True)
+
+    saved = iter(await _save_ingested_items(db, [r for r in results if r.success], current_user.id))
+    return PhotoBatchResponse(
+        results=[
+            PhotoUploadResult(
+                index=r.index,
+                success=r.success,
+                item=next(saved) if r.success else None,
+                error=r.error
             )
-    
-    db.commit()
+            for r in results
+        ],
+        created=sum(1 for r in results if r.success),
+        failed=sum(1 for r in results if not r.success)
+    )
+
+async def _save_ingested_items(db: Session, results: List[IngestResult], user_id: int) -> List[ClothingItem]:
+    """Commit all ingested rows at once; on failure remove their uploaded images."""
+    created_items = [r.item for r in results]
+    if not created_items:
+        return []
+
+    try:
+        db.add_all(created_items)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        await discard_uploads(results)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to save clothing items: {str(e)}"
+        )
+
+    invalidate_wardrobe_snapshot(user_id)
     for item in created_items:
         db.refresh(item)
     
     return created_items
 
+async def _save_pending_items(db: Session, results: List[IngestResult], user_id: int) -> List[ClothingItemResponse]:
+    """Save pending rows together with their analysis jobs in one transaction."""
+    created_items = [r.item for r in results]
+    try:
+        db.add_all(created_items)
+        db.flush()
+        jobs = [
+            enqueue_analysis(db, JOB_KIND_CLOTHING_ITEM, item.id, [item.image_url], user_id=user_id)
+            for item in created_items
+        ]
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        await discard_uploads(results)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to save clothing items: {str(e)}"
+        )
+
+    notify_analysis_worker()
+    response = []
+    for item, job in zip(created_items, jobs):
+        db.refresh(item)
+        response.append(ClothingItemResponse.model_validate(item).model_copy(update={"analysis_job_id": job.id}))
+    return response
+
 @router.get("/items", response_model=List[ClothingItemResponse])
 async def get_my_clothing_items(
     db: Session = Depends(get_db),
@@ -94,12 +148,12 @@ async def delete_clothing_item(
             detail="Clothing item not found"
         )
 
-    # Delete image from Firebase
-    if item.image_url:
-        await delete_image_from_firebase_async(item.image_url)
+    # Delete image and its thumbnail from Firebase
+    await delete_images_from_firebase_async([item.image_url, item.thumbnail_url])
 
     # Delete from database
     db.delete(item)
     db.commit()
+    invalidate_wardrobe_snapshot(current_user.id)
 
     return 
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class UserBrief(BaseModel):
@@ -77,6 +77,44 @@ class PoolStatus(BaseModel):
     """Полный статус пула соединений."""
     pool_metrics: PoolMetrics = Field(..., description="Метрики пула")
     analysis: PoolAnalysis = Field(..., description="Анализ пула")
+    async_pool_metrics: Optional[PoolMetrics] = Field(None, description="Метрики пула async-движка")
+
+class CacheMetrics(BaseModel):
+    """Метрики in-process кэша."""
+    name: str = Field(..., description="Название кэша")
+    size: int = Field(..., description="Количество записей")
+    maxsize: int = Field(..., description="Максимум записей")
+    ttl_seconds: float = Field(0, description="Время жизни записи (0 – без ограничения)")
+    hits: int = Field(0, description="Попадания")
+    misses: int = Field(0, description="Промахи")
+    hit_rate: float = Field(0.0, description="Доля попаданий")
+    evictions: int = Field(0, description="Вытеснено по LRU")
+    expirations: int = Field(0, description="Удалено по TTL")
+    extra: dict = Field(default_factory=dict, description="Дополнительные счётчики")
+
+class LLMUsageBucket(BaseModel):
+    """Потребление токенов по типу агента и источнику цифр."""
+    agent_type: str = Field(..., description="Агент, обработавший запрос")
+    source: str = Field(..., description="provider – usage модели, estimate – оценка без вызова LLM")
+    requests_count: int = Field(..., description="Запросов пользователей")
+    llm_calls: int = Field(..., description="Вызовов модели")
+    input_tokens: int = Field(..., description="Входные токены")
+    output_tokens: int = Field(..., description="Выходные токены")
+    total_tokens: int = Field(..., description="Всего токенов")
+    avg_tokens_per_request: float = Field(..., description="Среднее токенов на запрос")
+    avg_processing_time_ms: Optional[float] = Field(None, description="Среднее время обработки")
+
+class LLMUsageSummary(BaseModel):
+    """Сводка потребления токенов агентами за период."""
+    period_days: int = Field(..., description="Период в днях")
+    requests_count: int = Field(..., description="Запросов пользователей")
+    llm_calls: int = Field(..., description="Вызовов модели")
+    total_tokens: int = Field(..., description="Всего токенов")
+    buckets: List[LLMUsageBucket] = Field(default_factory=list, description="Разбивка по агентам")
+
+class CacheStatus(BaseModel):
+    """Статус кэшей агентов."""
+    caches: List[CacheMetrics] = Field(default_factory=list, description="Кэши процесса")
 
 class AdminResponse(BaseModel):
     """Общий формат ответа админ API."""
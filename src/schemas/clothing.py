@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import Optional, List
+from datetime import datetime
 
 class ClothingItemBase(BaseModel):
     name: str
@@ -13,9 +14,37 @@ class ClothingItemCreate(ClothingItemBase):
 class ClothingItemResponse(ClothingItemBase):
     id: int
     user_id: int
+    thumbnail_url: Optional[str] = None
+    analysis_status: str = "done"  # pending / done / failed
+    analysis_job_id: Optional[int] = None
 
     class Config:
         from_attributes = True 
 
 class PhotoUpload(BaseModel):
-    image_base64: str
\ No newline at end of file
+    image_base64: str
+
+class PhotoUploadResult(BaseModel):
+    index: int
+    success: bool
+    item: Optional[ClothingItemResponse] = None
+    error: Optional[str] = None
+
+class PhotoBatchResponse(BaseModel):
+    results: List[PhotoUploadResult]
+    created: int
+    failed: int
+
+class AnalysisJobResponse(BaseModel):
+    id: int
+    kind: str
+    target_id: int
+    status: str
+    attempts: int
+    max_attempts: int
+    last_error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
\ No newline at end of file
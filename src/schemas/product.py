@@ -1,5 +1,5 @@
 from pydantic import BaseModel, validator
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime
 from .store import StoreBrief
 
@@ -72,6 +72,9 @@ class ProductResponse(ProductBase):
     is_in_stock: bool
     created_at: datetime
     updated_at: Optional[datetime] = None
+    thumbnail_urls: Optional[List[str]] = None  # миниатюры для изображений, загруженных через фото
+    analysis_status: str = "done"  # pending / done / failed – AI анализ фото
+    analysis_job_id: Optional[int] = None  # задача анализа, если товар создан в фоне
 
     class Config:
         from_attributes = True
@@ -108,10 +111,12 @@ class ProductBrief(BaseModel):
 class ProductListResponse(BaseModel):
     """Схема списка товаров"""
     products: List[ProductBrief]
-    total: int
+    total: Optional[int]  # None при total_mode=none
     page: int
     per_page: int
     filters: Dict[str, Any] = {}
+    next_cursor: Optional[str] = None  # Курсор следующей страницы, None на последней
+    total_is_estimate: bool = False
 
 
 class ProductSearchQuery(BaseModel):
@@ -127,10 +132,13 @@ class ProductSearchQuery(BaseModel):
     sizes: Optional[List[str]] = None
     colors: Optional[List[str]] = None
     in_stock_only: bool = False
-    sort_by: str = "created_at"  # created_at, price, rating, name
+    semantic: bool = False  # Ранжировать по семантической близости к query (векторный индекс)
+    sort_by: Optional[str] = None  # relevance, created_at, price, rating, name (по умолчанию relevance при query, иначе created_at)
     sort_order: str = "desc"  # asc, desc
     page: int = 1
     per_page: int = 20
+    cursor: Optional[str] = None  # Keyset-пагинация вместо page
+    total_mode: Literal["exact", "estimate", "none"] = "exact"
 
 
 class CategoryResponse(BaseModel):
@@ -146,6 +154,38 @@ class CategoriesListResponse(BaseModel):
     categories: List[CategoryResponse]
 
 
+class FacetValue(BaseModel):
+    """Значение фасета и количество товаров с ним"""
+    value: str
+    count: int
+
+
+class PriceBucket(BaseModel):
+    """Ценовой диапазон [min_price, max_price); None – без границы"""
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    count: int
+
+
+class RatingBucket(BaseModel):
+    """Количество товаров с рейтингом не ниже min_rating"""
+    min_rating: float
+    count: int
+
+
+class ProductFacetsResponse(BaseModel):
+    """Счётчики фасетов для панели фильтров"""
+    total: int
+    categories: List[FacetValue] = []
+    brands: List[FacetValue] = []
+    cities: List[FacetValue] = []
+    sizes: List[FacetValue] = []
+    colors: List[FacetValue] = []
+    price_ranges: List[PriceBucket] = []
+    ratings: List[RatingBucket] = []
+    filters: Dict[str, Any] = {}
+
+
 class ProductStatsResponse(BaseModel):
     """Статистика товара"""
     id: int
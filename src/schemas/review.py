@@ -58,11 +58,13 @@ class ReviewResponse(ReviewBase):
 class ReviewListResponse(BaseModel):
     """Схема списка отзывов"""
     reviews: List[ReviewResponse]
-    total: int
+    total: Optional[int]  # None при total_mode=none
     page: int
     per_page: int
     average_rating: float
     rating_distribution: dict  # {5: 10, 4: 5, 3: 2, 2: 1, 1: 0}
+    next_cursor: Optional[str] = None  # Курсор следующей страницы, None на последней
+    total_is_estimate: bool = False
 
 
 class ReviewStatsResponse(BaseModel):
@@ -42,9 +42,11 @@ class StoreResponse(StoreBase):
 class StoreListResponse(BaseModel):
     """Схема списка магазинов"""
     stores: List[StoreResponse]
-    total: int
+    total: Optional[int]  # None при total_mode=none
     page: int
     per_page: int
+    next_cursor: Optional[str] = None  # Курсор следующей страницы, None на последней
+    total_is_estimate: bool = False
 
 
 class StoreBrief(BaseModel):
@@ -28,6 +28,7 @@ class TryOnRequest(BaseModel):
 class WaitListItemResponse(WaitListItemBase):
     id: int
     user_id: int
+    thumbnail_url: Optional[str] = None
     created_at: datetime
 
     class Config:
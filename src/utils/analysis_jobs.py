@@ -0,0 +1,424 @@
+"""
+Durable background jobs for AI analysis of uploaded photos.
+
+Wardrobe uploads and store-admin product uploads used to keep the HTTP request open
+while GPT-4o vision analyzed every image. In background mode the endpoints only
+upload the images, save the rows with ``analysis_status="pending"`` and enqueue an
+:class:`~src.models.analysis_job.AnalysisJob`; the worker fills in
+name / category / features later and marks the row ``done``.
+
+Jobs live in the ``analysis_jobs`` table, so they survive restarts:
+
+* the worker claims due jobs (``FOR UPDATE SKIP LOCKED`` on PostgreSQL, so several
+  processes can run workers), marking them ``running``;
+* failed attempts are retried with exponential backoff up to ``max_attempts``;
+* jobs stuck in ``running`` longer than ``ANALYSIS_JOB_LOCK_TIMEOUT`` (the process
+  died mid-job) are picked up again.
+
+:class:`AnalysisWorker` takes the analyzer and session factory as arguments, so it
+can be driven in-process with a stub analyzer via :meth:`AnalysisWorker.run_once`.
+Only the analyzer calls run on the event loop; claiming jobs, writing results and
+re-indexing products (blocking queries, commits, embedding calls) run in the
+default thread pool, each step with its own session.
+
+Environment variables:
+
+* ``ANALYSIS_WORKER_ENABLED`` – start the worker with the application (default true);
+* ``ANALYSIS_WORKER_CONCURRENCY`` – jobs analyzed in parallel (default 4);
+* ``ANALYSIS_WORKER_POLL_SECONDS`` – idle polling interval (default 5);
+* ``ANALYSIS_JOB_MAX_ATTEMPTS`` – attempts per job (default 3);
+* ``ANALYSIS_JOB_RETRY_SECONDS`` – base retry delay, doubled per attempt (default 30);
+* ``ANALYSIS_JOB_LOCK_TIMEOUT`` – seconds before a running job is reclaimed (default 600).
+"""
+import asyncio
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from src.database import SessionLocal
+from src.models.analysis_job import (
+    ANALYSIS_DONE, ANALYSIS_FAILED, JOB_DONE, JOB_FAILED, JOB_KIND_CLOTHING_ITEM, JOB_KIND_PRODUCT,
+    JOB_PENDING, JOB_RUNNING, AnalysisJob
+)
+from src.models.clothing import ClothingItem
+from src.models.product import Product
+from src.utils.analyze_image import analyze_image
+from src.utils.catalog_snapshot import refresh_product_in_snapshot
+from src.utils.vector_index import index_product
+from src.utils.wardrobe_snapshot import invalidate_wardrobe_snapshot
+
+
+WORKER_ENABLED = os.getenv("ANALYSIS_WORKER_ENABLED", "true").lower() in ("1", "true", "yes")
+WORKER_CONCURRENCY = int(os.getenv("ANALYSIS_WORKER_CONCURRENCY", "4"))
+WORKER_POLL_SECONDS = float(os.getenv("ANALYSIS_WORKER_POLL_SECONDS", "5"))
+JOB_MAX_ATTEMPTS = int(os.getenv("ANALYSIS_JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_SECONDS = float(os.getenv("ANALYSIS_JOB_RETRY_SECONDS", "30"))
+JOB_LOCK_TIMEOUT_SECONDS = float(os.getenv("ANALYSIS_JOB_LOCK_TIMEOUT", "600"))
+
+PENDING_CLOTHING_NAME = "Analyzing..."
+PENDING_CLOTHING_CATEGORY = "pending"
+FALLBACK_PRODUCT_NAME = "Новый товар"
+FALLBACK_PRODUCT_CATEGORY = "other"
+
+Analyzer = Callable[[str], Awaitable[dict]]
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def clean_features(features: Optional[Iterable[Any]]) -> List[str]:
+    """Убрать None и не-строки из features анализа."""
+    return [f for f in (features or []) if f is not None and isinstance(f, str)]
+
+
+def merge_product_analyses(analyses: Iterable[Any], name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Объединить анализы нескольких фото одного товара.
+
+    Args:
+        analyses: Результаты analyze_image (исключения пропускаются)
+        name: Название от фронтенда – приоритетнее сгенерированного
+
+    Returns:
+        dict: name, category, features (без дубликатов) и число успешных анализов
+    """
+    names: List[str] = []
+    categories: List[str] = []
+    features: List[str] = []
+    seen: Set[str] = set()
+    successful = 0
+
+    for analysis in analyses:
+        if isinstance(analysis, Exception) or not isinstance(analysis, dict):
+            continue
+        successful += 1
+        if analysis.get("name"):
+            names.append(analysis["name"])
+        if analysis.get("category"):
+            categories.append(analysis["category"])
+        # Убираем дубликаты features, сохраняя порядок
+        for feature in clean_features(analysis.get("features")):
+            if feature.lower() not in seen:
+                seen.add(feature.lower())
+                features.append(feature)
+
+    return {
+        # Самое подробное название из анализов, если не задано явно
+        "name": name or (max(names, key=len) if names else FALLBACK_PRODUCT_NAME),
+        # Наиболее частая категория
+        "category": Counter(categories).most_common(1)[0][0] if categories else FALLBACK_PRODUCT_CATEGORY,
+        "features": features,
+        "successful": successful,
+    }
+
+
+def enqueue_analysis(
+    db: Session,
+    kind: str,
+    target_id: int,
+    image_urls: List[str],
+    user_id: Optional[int] = None,
+    **payload: Any,
+) -> AnalysisJob:
+    """
+    Добавить задачу анализа в сессию (коммитит вызывающий код вместе со строкой).
+
+    Args:
+        kind: clothing_item или product
+        target_id: id строки, которую заполнит задача
+        image_urls: Загруженные изображения для анализа
+        user_id: Владелец (для проверки доступа к статусу)
+        payload: Дополнительные данные обработчика (например, name товара)
+    """
+    job = AnalysisJob(
+        kind=kind,
+        target_id=target_id,
+        user_id=user_id,
+        status=JOB_PENDING,
+        payload={"image_urls": list(image_urls), **payload},
+        attempts=0,
+        max_attempts=JOB_MAX_ATTEMPTS,
+        run_after=_utcnow(),
+    )
+    db.add(job)
+    return job
+
+
+def _complete_clothing_item(db: Session, job: AnalysisJob, analyses: List[Any]) -> None:
+    item = db.get(ClothingItem, job.target_id)
+    if item is None:
+        return
+    analysis = analyses[0]
+    if isinstance(analysis, Exception):
+        raise analysis
+    item.name = analysis["name"]
+    item.category = analysis["category"]
+    item.features = clean_features(analysis.get("features"))
+    item.analysis_status = ANALYSIS_DONE
+
+
+def _complete_product(db: Session, job: AnalysisJob, analyses: List[Any]) -> None:
+    product = db.get(Product, job.target_id)
+    if product is None:
+        return
+    errors = [a for a in analyses if isinstance(a, Exception)]
+    if errors and len(errors) == len(analyses):
+        raise errors[0]
+    merged = merge_product_analyses(analyses, job.payload.get("name"))
+    product.name = merged["name"]
+    product.category = merged["category"]
+    product.features = merged["features"]
+    product.description = f"Товар добавлен через анализ {merged['successful']} фото."
+    product.analysis_status = ANALYSIS_DONE
+    product.is_active = True
+
+
+def _fail_clothing_item(db: Session, job: AnalysisJob) -> None:
+    item = db.get(ClothingItem, job.target_id)
+    if item is not None:
+        item.analysis_status = ANALYSIS_FAILED
+
+
+def _fail_product(db: Session, job: AnalysisJob) -> None:
+    # Как и при синхронной загрузке: товар создаётся с запасными названием и категорией
+    product = db.get(Product, job.target_id)
+    if product is None:
+        return
+    product.name = job.payload.get("name") or FALLBACK_PRODUCT_NAME
+    product.category = FALLBACK_PRODUCT_CATEGORY
+    product.features = []
+    product.description = "Товар добавлен без анализа фото: анализ не удался."
+    product.analysis_status = ANALYSIS_FAILED
+    product.is_active = True
+
+
+def _after_commit_clothing_item(db: Session, job: AnalysisJob) -> None:
+    if job.user_id is not None:
+        invalidate_wardrobe_snapshot(job.user_id)
+
+
+def _after_commit_product(db: Session, job: AnalysisJob) -> None:
+    product = db.get(Product, job.target_id)
+    if product is not None:
+        index_product(db, product)
+        db.commit()
+        refresh_product_in_snapshot(product)
+
+
+# kind -> (заполнить строку, пометить ошибку, действия после коммита)
+JOB_HANDLERS = {
+    JOB_KIND_CLOTHING_ITEM: (_complete_clothing_item, _fail_clothing_item, _after_commit_clothing_item),
+    JOB_KIND_PRODUCT: (_complete_product, _fail_product, _after_commit_product),
+}
+
+
+class AnalysisWorker:
+    """
+    Воркер задач анализа.
+
+    Args:
+        analyzer: Функция анализа изображения по URL (по умолчанию analyze_image)
+        session_factory: Фабрика синхронных сессий БД
+        concurrency: Сколько задач анализируется одновременно
+        poll_interval: Пауза между опросами очереди, если задач нет
+    """
+
+    def __init__(
+        self,
+        analyzer: Analyzer = analyze_image,
+        session_factory: Callable[[], Session] = SessionLocal,
+        concurrency: int = WORKER_CONCURRENCY,
+        poll_interval: float = WORKER_POLL_SECONDS,
+    ):
+        self.analyzer = analyzer
+        self.session_factory = session_factory
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.processed = 0
+        self.failed = 0
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+    def _claim(self, limit: int) -> List[int]:
+        """Забрать до limit готовых к запуску задач и пометить их running."""
+        now = _utcnow()
+        stale = now - timedelta(seconds=JOB_LOCK_TIMEOUT_SECONDS)
+        db = self.session_factory()
+        try:
+            query = (
+                db.query(AnalysisJob)
+                .filter(or_(
+                    and_(AnalysisJob.status == JOB_PENDING, AnalysisJob.run_after <= now),
+                    and_(AnalysisJob.status == JOB_RUNNING, AnalysisJob.locked_at < stale),
+                ))
+                .order_by(AnalysisJob.id.asc())
+                .limit(limit)
+            )
+            if db.get_bind().dialect.name == "postgresql":
+                query = query.with_for_update(skip_locked=True)
+            jobs = query.all()
+            for job in jobs:
+                job.status = JOB_RUNNING
+                job.locked_at = now
+                job.attempts = (job.attempts or 0) + 1
+            db.commit()
+            return [job.id for job in jobs]
+        finally:
+            db.close()
+
+    async def _run_sync(self, func: Callable[..., Any], *args: Any) -> Any:
+        # Запросы к БД, коммиты и индексация блокируют – выполняем их вне event loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(func, *args))
+
+    def _load_images(self, job_id: int) -> Optional[List[str]]:
+        """URL изображений задачи или None, если задача уже не в статусе running."""
+        db = self.session_factory()
+        try:
+            job = db.get(AnalysisJob, job_id)
+            if job is None or job.status != JOB_RUNNING:
+                return None
+            return list(job.payload.get("image_urls") or [])
+        finally:
+            db.close()
+
+    def _finish(self, job_id: int, analyses: List[Any], error: Optional[Exception] = None) -> Optional[str]:
+        """Записать результат анализа (или ошибку) и вернуть новый статус задачи."""
+        db = self.session_factory()
+        try:
+            job = db.get(AnalysisJob, job_id)
+            if job is None:
+                return None
+            complete, fail, after_commit = JOB_HANDLERS[job.kind]
+
+            try:
+                if error is not None:
+                    raise error
+                complete(db, job, analyses)
+                job.status = JOB_DONE
+                job.last_error = None
+                job.completed_at = _utcnow()
+                db.commit()
+                after_commit(db, job)
+                print(f"✅ Analysis job {job.id} ({job.kind} {job.target_id}) done")
+            except Exception as e:
+                db.rollback()
+                job = db.get(AnalysisJob, job_id)
+                job.last_error = str(e) or type(e).__name__
+                if job.attempts < job.max_attempts:
+                    # Экспоненциальная задержка перед повтором
+                    delay = JOB_RETRY_SECONDS * (2 ** (job.attempts - 1))
+                    job.status = JOB_PENDING
+                    job.run_after = _utcnow() + timedelta(seconds=delay)
+                    print(f"⚠️ Analysis job {job.id} failed (attempt {job.attempts}/{job.max_attempts}), retry in {delay:.0f}s: {e}")
+                else:
+                    job.status = JOB_FAILED
+                    job.completed_at = _utcnow()
+                    fail(db, job)
+                    print(f"❌ Analysis job {job.id} failed permanently: {e}")
+                db.commit()
+                if job.status == JOB_FAILED:
+                    after_commit(db, job)
+            return job.status
+        except Exception as e:
+            print(f"Error processing analysis job {job_id}: {e}")
+            db.rollback()
+            return None
+        finally:
+            db.close()
+
+    async def _process(self, job_id: int) -> None:
+        try:
+            image_urls = await self._run_sync(self._load_images, job_id)
+            if image_urls is None:
+                return
+            # На event loop остаются только вызовы анализатора
+            if image_urls:
+                analyses = await asyncio.gather(*(self.analyzer(url) for url in image_urls), return_exceptions=True)
+                status = await self._run_sync(self._finish, job_id, list(analyses))
+            else:
+                status = await self._run_sync(self._finish, job_id, [], ValueError("Job has no images to analyze"))
+        except Exception as e:
+            print(f"Error processing analysis job {job_id}: {e}")
+            return
+
+        if status == JOB_DONE:
+            self.processed += 1
+        elif status == JOB_FAILED:
+            self.failed += 1
+
+    async def run_once(self) -> int:
+        """Обработать одну порцию готовых задач. Возвращает число взятых задач."""
+        job_ids = await self._run_sync(self._claim, self.concurrency)
+        if job_ids:
+            await asyncio.gather(*(self._process(job_id) for job_id in job_ids))
+        return len(job_ids)
+
+    def wake(self) -> None:
+        """Разбудить воркер сразу после постановки задачи (в том же процессе)."""
+        self._wakeup.set()
+
+    async def run_forever(self) -> None:
+        print(f"🧵 Analysis worker started (concurrency {self.concurrency})")
+        while not self._stopping:
+            try:
+                if await self.run_once():
+                    continue
+            except Exception as e:
+                print(f"Error in analysis worker loop: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        self._stopping = True
+        self.wake()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=self.poll_interval + 5)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+            self._task = None
+
+
+_analysis_worker: Optional[AnalysisWorker] = None
+
+
+def get_analysis_worker() -> AnalysisWorker:
+    global _analysis_worker
+    if _analysis_worker is None:
+        _analysis_worker = AnalysisWorker()
+    return _analysis_worker
+
+
+def notify_analysis_worker() -> None:
+    """Сообщить воркеру процесса о новых задачах (если он запущен)."""
+    if _analysis_worker is not None:
+        _analysis_worker.wake()
+
+
+__all__ = [
+    "WORKER_ENABLED",
+    "PENDING_CLOTHING_NAME",
+    "PENDING_CLOTHING_CATEGORY",
+    "clean_features",
+    "merge_product_analyses",
+    "enqueue_analysis",
+    "AnalysisWorker",
+    "get_analysis_worker",
+    "notify_analysis_worker",
+]
@@ -1,6 +1,8 @@
 import os, json, asyncio
+from typing import Optional
 from openai import AsyncAzureOpenAI        
 from dotenv import load_dotenv
+from src.utils.image_analysis_cache import analysis_version, get_image_analysis_cache
 
 load_dotenv()
 
@@ -92,12 +94,27 @@ QUALITY STANDARDS:
 
 async def analyze_image(
     image_url: str,
-    deployment: str = "gpt-4o"     # имя вашей Azure-деплойки
+    deployment: str = "gpt-4o",    # имя вашей Azure-деплойки
+    image_bytes: Optional[bytes] = None
 ) -> dict:
     """
     Возвращает dict c ключами `category` и `features`.
     В случае ошибки бросает исключение.
+
+    Результат кэшируется по хэшу содержимого изображения; если байты изображения
+    уже есть у вызывающего кода, их стоит передать, чтобы не скачивать его заново.
     """
+    return await get_image_analysis_cache().get_or_compute(
+        "clothing",
+        analysis_version(SYSTEM_PROMPT, deployment),
+        image_url,
+        lambda: _analyze_image_uncached(image_url, deployment),
+        image_bytes=image_bytes,
+        required_keys=("name", "category"),
+    )
+
+
+async def _analyze_image_uncached(image_url: str, deployment: str) -> dict:
     response = await client.chat.completions.create(
         model=deployment,           # Azure OpenAI uses deployment name as model name
         messages=[
@@ -0,0 +1,300 @@
+"""
+Process-wide snapshot of the active product catalog.
+
+Agent tools used to run ``db.query(Product).join(Store)...all()`` several times per
+chat message. Instead they read an immutable, versioned snapshot that lives in
+memory and is patched in place (copy-on-write) whenever the product endpoints
+create, update or delete a row.
+
+Readers never take a lock: they grab the current :class:`CatalogSnapshot` object and
+work with it, while writers build a new snapshot and swap the reference.
+
+Environment variables:
+
+* ``CATALOG_SNAPSHOT_TTL`` – seconds after which the snapshot is fully rebuilt from
+  the database (default 600). This is a safety net for changes made outside the API
+  (scripts, manual SQL); regular edits are applied incrementally.
+"""
+import os
+import time
+from bisect import bisect_left, insort
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from src.models.product import Product
+from src.models.store import Store
+from src.utils.product_projection import catalog_product_options
+
+
+SNAPSHOT_TTL_SECONDS = float(os.getenv("CATALOG_SNAPSHOT_TTL", "600"))
+
+
+@dataclass(frozen=True)
+class CatalogStore:
+    """Поля магазина, нужные агентам."""
+    id: int
+    name: str
+    city: str
+    logo_url: Optional[str] = None
+    rating: float = 0.0
+
+
+@dataclass(frozen=True)
+class CatalogProduct:
+    """
+    Неизменяемая копия активного товара вместе с данными магазина.
+
+    Повторяет атрибуты ORM-модели Product, которыми пользуются агенты, поэтому
+    может передаваться в те же функции форматирования и ранжирования.
+    """
+    id: int
+    name: str
+    price: float
+    category: str
+    store: CatalogStore
+    description: Optional[str] = None
+    original_price: Optional[float] = None
+    brand: Optional[str] = None
+    sizes: Tuple[str, ...] = ()
+    colors: Tuple[str, ...] = ()
+    image_urls: Tuple[str, ...] = ()
+    features: Tuple[str, ...] = ()
+    stock_quantity: int = 0
+    rating: float = 0.0
+    reviews_count: int = 0
+
+    @property
+    def store_id(self) -> int:
+        return self.store.id
+
+    @property
+    def is_in_stock(self) -> bool:
+        return self.stock_quantity > 0
+
+    @property
+    def discount_percentage(self) -> float:
+        if self.original_price and self.original_price > self.price:
+            return round(((self.original_price - self.price) / self.original_price) * 100, 1)
+        return 0.0
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """Версионированный снимок каталога. Никогда не изменяется после создания."""
+    version: int
+    built_at: float
+    products: Tuple[CatalogProduct, ...] = ()
+    by_id: Dict[int, CatalogProduct] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def in_stock(self) -> Tuple[CatalogProduct, ...]:
+        """Товары с ненулевым остатком."""
+        return tuple(p for p in self.products if p.stock_quantity > 0)
+
+    def get(self, product_id: int) -> Optional[CatalogProduct]:
+        return self.by_id.get(product_id)
+
+
+def _as_tuple(value: Any) -> Tuple[str, ...]:
+    if not value or not isinstance(value, (list, tuple)):
+        return ()
+    return tuple(str(v) for v in value if v)
+
+
+def to_catalog_store(store: Store) -> CatalogStore:
+    return CatalogStore(
+        id=store.id,
+        name=store.name,
+        city=store.city,
+        logo_url=store.logo_url,
+        rating=store.rating or 0.0,
+    )
+
+
+def to_catalog_product(product: Product, store: Optional[CatalogStore] = None) -> CatalogProduct:
+    """Сделать неизменяемую копию ORM-товара."""
+    return CatalogProduct(
+        id=product.id,
+        name=product.name,
+        price=product.price,
+        category=product.category,
+        store=store or to_catalog_store(product.store),
+        description=product.description,
+        original_price=product.original_price,
+        brand=product.brand,
+        sizes=_as_tuple(product.sizes),
+        colors=_as_tuple(product.colors),
+        image_urls=_as_tuple(product.image_urls),
+        features=_as_tuple(product.features),
+        stock_quantity=product.stock_quantity or 0,
+        rating=product.rating or 0.0,
+        reviews_count=product.reviews_count or 0,
+    )
+
+
+def _sort_key(product: CatalogProduct) -> Tuple[str, int]:
+    # Порядок по названию – как в прежних запросах агентов
+    return product.name, product.id
+
+
+def _make_snapshot(
+    version: int,
+    products: Iterable[CatalogProduct],
+    built_at: Optional[float] = None,
+) -> CatalogSnapshot:
+    ordered = tuple(sorted(products, key=_sort_key))
+    return CatalogSnapshot(
+        version=version,
+        built_at=time.monotonic() if built_at is None else built_at,
+        products=ordered,
+        by_id={p.id: p for p in ordered},
+    )
+
+
+def _patch_snapshot(
+    snapshot: CatalogSnapshot,
+    version: int,
+    old: Optional[CatalogProduct],
+    new: Optional[CatalogProduct],
+) -> CatalogSnapshot:
+    """Заменить один товар в уже отсортированном снимке (бинарный поиск, без пересортировки)."""
+    products = list(snapshot.products)
+    by_id = dict(snapshot.by_id)
+    if old is not None:
+        del products[bisect_left(products, _sort_key(old), key=_sort_key)]
+        del by_id[old.id]
+    if new is not None:
+        insort(products, new, key=_sort_key)
+        by_id[new.id] = new
+    # Инкрементальные правки не продлевают TTL полного пересбора
+    return CatalogSnapshot(version=version, built_at=snapshot.built_at, products=tuple(products), by_id=by_id)
+
+
+class CatalogSnapshotCache:
+    """Holder of the current snapshot with incremental copy-on-write updates."""
+
+    def __init__(self, ttl_seconds: float = SNAPSHOT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = Lock()
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._version = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def _is_fresh(self, snapshot: Optional[CatalogSnapshot]) -> bool:
+        if snapshot is None:
+            return False
+        if self.ttl_seconds <= 0:
+            return True
+        return time.monotonic() - snapshot.built_at < self.ttl_seconds
+
+    def get(self, db: Session) -> CatalogSnapshot:
+        """Вернуть текущий снимок, пересобрав его при первом обращении или по TTL."""
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot):
+            return snapshot
+
+        with self._lock:
+            if not self._is_fresh(self._snapshot):
+                self._snapshot = self._build(db)
+            return self._snapshot
+
+    def _build(self, db: Session) -> CatalogSnapshot:
+        rows = (
+            db.query(Product)
+            .join(Store)
+            .options(*catalog_product_options())
+            .filter(Product.is_active == True)
+            .all()
+        )
+        stores: Dict[int, CatalogStore] = {}
+        products = []
+        for row in rows:
+            store = stores.get(row.store_id)
+            if store is None:
+                store = stores[row.store_id] = to_catalog_store(row.store)
+            products.append(to_catalog_product(row, store))
+
+        self._version += 1
+        print(f"📦 Снимок каталога v{self._version}: {len(products)} активных товаров")
+        return _make_snapshot(self._version, products)
+
+    def upsert(self, product: Product) -> None:
+        """Применить создание/изменение товара. Неактивные товары удаляются из снимка."""
+        with self._lock:
+            if self._snapshot is None:
+                return
+            old = self._snapshot.by_id.get(product.id)
+            new = to_catalog_product(product) if product.is_active else None
+            if old is None and new is None:
+                return
+            self._version += 1
+            self._snapshot = _patch_snapshot(self._snapshot, self._version, old, new)
+
+    def remove(self, product_id: int) -> None:
+        """Удалить товар из снимка."""
+        with self._lock:
+            if self._snapshot is None or product_id not in self._snapshot.by_id:
+                return
+            self._version += 1
+            self._snapshot = _patch_snapshot(self._snapshot, self._version, self._snapshot.by_id[product_id], None)
+
+    def invalidate(self) -> None:
+        """Сбросить снимок – следующий читатель пересоберёт его из БД."""
+        with self._lock:
+            self._snapshot = None
+            # Версия меняется сразу: кэши, завязанные на неё, не должны ждать пересборки
+            self._version += 1
+
+
+_catalog_snapshot_cache = CatalogSnapshotCache()
+
+
+def get_catalog_snapshot(db: Session) -> CatalogSnapshot:
+    """Return the current catalog snapshot, building it on first use."""
+    return _catalog_snapshot_cache.get(db)
+
+
+def get_catalog_version() -> int:
+    """Current snapshot version; changes whenever the catalog is rebuilt or patched."""
+    return _catalog_snapshot_cache.version
+
+
+def refresh_product_in_snapshot(product: Product) -> None:
+    """Apply a created/updated product to the snapshot."""
+    try:
+        _catalog_snapshot_cache.upsert(product)
+    except Exception as e:
+        # Снимок не должен ломать сохранение товара – сбрасываем его целиком
+        print(f"Error refreshing product {product.id} in catalog snapshot: {e}")
+        _catalog_snapshot_cache.invalidate()
+
+
+def remove_product_from_snapshot(product_id: int) -> None:
+    """Drop a deleted product from the snapshot."""
+    _catalog_snapshot_cache.remove(product_id)
+
+
+def invalidate_catalog_snapshot() -> None:
+    """Force a full rebuild on next access (e.g. after a store was renamed)."""
+    _catalog_snapshot_cache.invalidate()
+
+
+__all__ = [
+    "CatalogStore",
+    "CatalogProduct",
+    "CatalogSnapshot",
+    "CatalogSnapshotCache",
+    "get_catalog_snapshot",
+    "get_catalog_version",
+    "refresh_product_in_snapshot",
+    "remove_product_from_snapshot",
+    "invalidate_catalog_snapshot",
+]
@@ -3,7 +3,10 @@ from __future__ import annotations
 """Utility helpers for interacting with Firebase Cloud Storage.
 
 The main entry-point is :pyfunc:`upload_image_to_firebase` which uploads raw
-bytes to a bucket and returns a publicly accessible URL to the object.
+bytes to a bucket and returns a publicly accessible URL to the object. The
+transfer itself is done by :mod:`src.utils.storage_client` (dedicated thread
+pool, cached bucket, ``STORAGE_BACKEND=local`` for offline work); this module
+owns the Firebase initialisation and keeps the historical function names.
 
 The module is intentionally written with *lazy* initialisation – the Firebase
 Admin SDK is only initialised the first time it is needed which avoids slowing
@@ -25,19 +28,18 @@ can authenticate:
 If none are supplied the helper will raise a ``RuntimeError`` on first use.
 """
 
-from typing import Optional
+from typing import Iterable, List, Optional, Sequence, Tuple
 import os
 import json
 import tempfile
-import asyncio
-from functools import partial
 from threading import Lock
-import re
 
 import firebase_admin
-from firebase_admin import credentials, storage
+from firebase_admin import credentials
 import dotenv
 
+from src.utils.storage_client import get_storage_client
+
 dotenv.load_dotenv()
 
 # Holds the singleton Firebase app instance once initialised.
@@ -137,68 +139,51 @@ def upload_image_to_firebase(image_bytes: bytes, file_name: str, *, content_type
         If Firebase SDK could not be initialised due to missing configuration.
     Exception
         Propagates any errors raised by the underlying Firebase SDK when
-        uploading/making the object public.
+        uploading the object.
     """
 
-    app = _initialise_firebase()
-
-    bucket = storage.bucket(app=app)
-    blob = bucket.blob(file_name)
+    # The object is created publicly readable in the same request.
+    return get_storage_client().backend.upload(image_bytes, file_name, content_type)
 
-    # Perform the upload.
-    blob.upload_from_string(image_bytes, content_type=content_type)
 
-    # Make the file publicly readable so that we can return a URL to the user.
-    blob.make_public()
+async def upload_image_to_firebase_async(image_bytes: bytes, file_name: str, *, content_type: str = "image/png") -> str:
+    """Asynchronous upload running in the storage client's dedicated thread pool."""
+    return await get_storage_client().upload(image_bytes, file_name, content_type)
 
-    return blob.public_url
 
+async def upload_images_to_firebase_async(items: Sequence[Tuple[bytes, str, str]]) -> List[str]:
+    """Upload several ``(bytes, file_name, content_type)`` objects in parallel.
 
-async def upload_image_to_firebase_async(image_bytes: bytes, file_name: str, *, content_type: str = "image/png") -> str:
-    """Asynchronous wrapper for upload_image_to_firebase that runs it in a separate thread."""
-    loop = asyncio.get_running_loop()
-    # Use to_thread to run the synchronous, blocking function in a separate thread
-    # and wait for its result without blocking the main asyncio event loop.
-    func = partial(upload_image_to_firebase, image_bytes, file_name, content_type=content_type)
-    return await loop.run_in_executor(
-        None,  # Use the default thread pool executor
-        func
-    )
+    All-or-nothing: if one upload fails, the others are deleted and the error
+    is raised.
+    """
+    return await get_storage_client().upload_many(items)
 
 
 def delete_image_from_firebase(file_url: str):
     """
     Deletes an image from Firebase Storage using its public URL.
+    A missing object is treated as already deleted.
     """
     if not file_url:
         return
-
-    app = _initialise_firebase()
-    bucket = storage.bucket(app=app)
-
-    # Extract file name from URL.
-    # The file name is the part of the path after the bucket name.
-    # Example URL: https://storage.googleapis.com/your-bucket-name/path/to/your/file.jpg
-    bucket_name = bucket.name
-    # We use a regex to robustly find the file path after the bucket name in the URL.
-    match = re.search(f"{bucket_name}/(.+?)(?=\\?|$)", file_url)
-    if not match:
-        # Log this situation? For now, we just ignore it.
-        return
-
-    file_name = match.group(1)
-    blob = bucket.blob(file_name)
-
-    # Check if the blob exists before trying to delete it.
-    if blob.exists():
-        blob.delete()
+    get_storage_client().backend.delete(file_url)
 
 
 async def delete_image_from_firebase_async(file_url: str):
     """Asynchronous wrapper for delete_image_from_firebase."""
-    loop = asyncio.get_running_loop()
-    func = partial(delete_image_from_firebase, file_url)
-    await loop.run_in_executor(None, func)
+    await get_storage_client().delete(file_url)
+
+
+async def delete_images_from_firebase_async(file_urls: Iterable[Optional[str]]):
+    """Delete several images in parallel; failures are logged, not raised."""
+    await get_storage_client().delete_many(file_urls)
 
 
-__all__ = ["upload_image_to_firebase", "upload_image_to_firebase_async", "delete_image_from_firebase_async"]
+__all__ = [
+    "upload_image_to_firebase",
+    "upload_image_to_firebase_async",
+    "upload_images_to_firebase_async",
+    "delete_image_from_firebase_async",
+    "delete_images_from_firebase_async",
+]
@@ -0,0 +1,258 @@
+"""
+Content-addressed cache of vision-model analyses of garment images.
+
+``analyze_image`` and ``analyze_image_for_tryon`` used to call GPT-4o on every request,
+even for an image that was already analyzed: re-uploads of the same photo, the same
+waitlist screenshot tried on again, products reused across stores. Results are now
+stored in the ``image_analysis_cache`` table keyed by
+
+* ``kind`` – which analyzer produced the result (``clothing`` / ``tryon``);
+* ``image_hash`` – SHA-256 of the image bytes, so the same image uploaded under a
+  different URL is still a hit;
+* ``version`` – hash of the system prompt and deployment: editing the prompt or
+  switching the model makes old results invisible without a migration.
+
+Callers that already hold the image bytes pass them in; otherwise the image is
+downloaded once to be hashed (far cheaper than a vision call) and the URL -> hash
+mapping is remembered in memory, since uploaded objects are never overwritten.
+Concurrent requests for the same image share one model call, and recent results
+are also kept in an in-process LRU in front of the table.
+
+The cache never breaks an analysis: database or download errors fall back to
+calling the model directly. Table reads and writes use short sync sessions in the
+default thread pool, off the event loop.
+
+Environment variables:
+
+* ``IMAGE_ANALYSIS_CACHE_ENABLED`` – turn the cache off (default true);
+* ``IMAGE_ANALYSIS_CACHE_MEMORY_SIZE`` – results kept in memory (default 1024);
+* ``IMAGE_ANALYSIS_URL_CACHE_SIZE`` – remembered URL hashes (default 4096).
+"""
+import asyncio
+import copy
+import hashlib
+import os
+from functools import partial
+from typing import Awaitable, Callable, Dict, Optional, Sequence, Tuple
+
+import httpx
+from sqlalchemy.exc import IntegrityError
+
+from src.database import SessionLocal
+from src.models.image_analysis import ImageAnalysisCache
+from src.utils.lru_cache import LRUCache
+
+
+CACHE_ENABLED = os.getenv("IMAGE_ANALYSIS_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+MEMORY_CACHE_SIZE = int(os.getenv("IMAGE_ANALYSIS_CACHE_MEMORY_SIZE", "1024"))
+URL_CACHE_SIZE = int(os.getenv("IMAGE_ANALYSIS_URL_CACHE_SIZE", "4096"))
+DOWNLOAD_TIMEOUT_SECONDS = 15.0
+
+CacheKey = Tuple[str, str, str]  # (kind, version, image_hash)
+
+
+def image_content_hash(image_bytes: bytes) -> str:
+    """SHA-256 содержимого изображения."""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def analysis_version(prompt: str, deployment: str) -> str:
+    """Версия результатов анализатора: меняется вместе с промптом или деплойментом."""
+    return hashlib.sha256(f"{deployment}\n{prompt.strip()}".encode("utf-8")).hexdigest()[:32]
+
+
+class ImageAnalysisCacheStore:
+    """
+    Кэш анализов: LRU в памяти поверх таблицы image_analysis_cache.
+
+    Args:
+        session_factory: Фабрика синхронных сессий БД
+        memory_size: Сколько результатов держать в памяти
+        url_cache_size: Сколько хэшей URL запоминать
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        memory_size: int = MEMORY_CACHE_SIZE,
+        url_cache_size: int = URL_CACHE_SIZE,
+    ):
+        self.session_factory = session_factory
+        self._results: LRUCache[dict] = LRUCache(memory_size)
+        self._url_hashes: LRUCache[str] = LRUCache(url_cache_size)
+        self._inflight: Dict[CacheKey, asyncio.Future] = {}
+        self.db_hits = 0
+        self.model_calls = 0
+        self.errors = 0
+
+    async def _download(self, image_url: str) -> bytes:
+        async with httpx.AsyncClient(timeout=DOWNLOAD_TIMEOUT_SECONDS, follow_redirects=True) as client:
+            response = await client.get(image_url)
+            response.raise_for_status()
+            return response.content
+
+    async def image_hash(self, image_url: str, image_bytes: Optional[bytes] = None) -> str:
+        """Хэш изображения: по переданным байтам, по запомненному URL или после скачивания."""
+        if image_bytes is not None:
+            digest = image_content_hash(image_bytes)
+        else:
+            digest = self._url_hashes.get(image_url, count=False)
+            if digest is not None:
+                return digest
+            digest = image_content_hash(await self._download(image_url))
+        self._url_hashes.set(image_url, digest)
+        return digest
+
+    def remember(self, image_url: str, image_bytes: bytes) -> None:
+        """Запомнить хэш только что загруженного изображения, чтобы потом не скачивать его."""
+        self._url_hashes.set(image_url, image_content_hash(image_bytes))
+
+    def _load(self, key: CacheKey) -> Optional[dict]:
+        kind, version, image_hash = key
+        db = self.session_factory()
+        try:
+            row = (
+                db.query(ImageAnalysisCache.result)
+                .filter(
+                    ImageAnalysisCache.kind == kind,
+                    ImageAnalysisCache.image_hash == image_hash,
+                    ImageAnalysisCache.version == version,
+                )
+                .first()
+            )
+            return dict(row.result) if row is not None else None
+        finally:
+            db.close()
+
+    def _save(self, key: CacheKey, result: dict) -> None:
+        kind, version, image_hash = key
+        db = self.session_factory()
+        try:
+            db.add(ImageAnalysisCache(kind=kind, image_hash=image_hash, version=version, result=result))
+            db.commit()
+        except IntegrityError:
+            # Тот же результат уже сохранил другой процесс
+            db.rollback()
+        finally:
+            db.close()
+
+    async def _run_sync(self, func: Callable, *args):
+        # Синхронные сессии БД не должны блокировать event loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(func, *args))
+
+    async def _compute(
+        self,
+        key: CacheKey,
+        compute: Callable[[], Awaitable[dict]],
+        required_keys: Sequence[str],
+    ) -> dict:
+        try:
+            result = await self._run_sync(self._load, key)
+        except Exception as e:
+            self.errors += 1
+            print(f"Error reading image analysis cache: {e}")
+            result = None
+
+        if result is not None:
+            self.db_hits += 1
+        else:
+            self.model_calls += 1
+            result = await compute()
+            # Неполные ответы модели не кэшируем, чтобы не закрепить ошибку навсегда
+            if not isinstance(result, dict) or any(not result.get(k) for k in required_keys):
+                return result
+            try:
+                await self._run_sync(self._save, key, result)
+            except Exception as e:
+                self.errors += 1
+                print(f"Error saving image analysis cache: {e}")
+
+        self._results.set(key, result)
+        return result
+
+    async def get_or_compute(
+        self,
+        kind: str,
+        version: str,
+        image_url: str,
+        compute: Callable[[], Awaitable[dict]],
+        image_bytes: Optional[bytes] = None,
+        required_keys: Sequence[str] = (),
+    ) -> dict:
+        """
+        Результат анализа из кэша или от модели (с сохранением в кэш).
+
+        Args:
+            kind: Тип анализатора (clothing / tryon)
+            version: Версия промпта и деплоймента (analysis_version)
+            image_url: URL изображения, передаётся модели
+            compute: Вызов модели без кэша
+            image_bytes: Байты изображения, если они уже есть у вызывающего кода
+            required_keys: Ключи, без которых результат не сохраняется
+
+        Returns:
+            dict: Копия результата анализа
+        """
+        if not CACHE_ENABLED:
+            return await compute()
+
+        try:
+            key = (kind, version, await self.image_hash(image_url, image_bytes))
+        except Exception as e:
+            self.errors += 1
+            print(f"Error hashing image {image_url} for analysis cache: {e}")
+            return await compute()
+
+        cached = self._results.get(key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+
+        # Одинаковые изображения, анализируемые одновременно, ждут один вызов модели
+        future = self._inflight.get(key)
+        if future is not None:
+            return copy.deepcopy(await asyncio.shield(future))
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._compute(key, compute, required_keys)
+            future.set_result(result)
+            return copy.deepcopy(result)
+        except BaseException as e:
+            future.set_exception(e)
+            # Исключение получат ожидающие; здесь оно поднимается заново
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        """Очистить кэш в памяти (таблица не затрагивается)."""
+        self._results.clear()
+        self._url_hashes.clear()
+
+    def info(self) -> dict:
+        info = self._results.info()
+        info.update({
+            "db_hits": self.db_hits,
+            "model_calls": self.model_calls,
+            "errors": self.errors,
+            "url_hashes": len(self._url_hashes),
+        })
+        return info
+
+
+_image_analysis_cache = ImageAnalysisCacheStore()
+
+
+def get_image_analysis_cache() -> ImageAnalysisCacheStore:
+    return _image_analysis_cache
+
+
+__all__ = [
+    "image_content_hash",
+    "analysis_version",
+    "ImageAnalysisCacheStore",
+    "get_image_analysis_cache",
+]
@@ -0,0 +1,252 @@
+"""
+Image preparation stage for user and store uploads.
+
+Uploaded photos used to be stored exactly as received – multi-megabyte phone photos
+or PNG screenshots, always labelled ``image/png`` – and the full-resolution URL was
+handed to the vision model. Before upload every image now goes through
+:func:`prepare_image`, which:
+
+* validates that the bytes are an image in an accepted format;
+* applies the EXIF orientation and drops EXIF / other metadata (GPS etc.);
+* downsizes to ``IMAGE_MAX_EDGE`` pixels on the longest side;
+* re-encodes to ``IMAGE_OUTPUT_FORMAT`` (WebP by default, JPEG also supported);
+* produces a thumbnail no larger than ``IMAGE_THUMBNAIL_EDGE``.
+
+Decoding and encoding are CPU-bound and hold the GIL, so they run in a dedicated
+process pool instead of the event loop or the default thread pool.
+:func:`upload_prepared_image` stores both variants with their real content type.
+
+Environment variables:
+
+* ``IMAGE_MAX_EDGE`` – longest side of the stored image in pixels (default 1600);
+* ``IMAGE_THUMBNAIL_EDGE`` – longest side of the thumbnail (default 384);
+* ``IMAGE_OUTPUT_FORMAT`` – ``webp`` or ``jpeg`` (default webp);
+* ``IMAGE_QUALITY`` / ``IMAGE_THUMBNAIL_QUALITY`` – encoder quality (default 85 / 75);
+* ``IMAGE_MAX_PIXELS`` – reject images with more pixels than this (default 50M);
+* ``IMAGE_PREP_WORKERS`` – size of the process pool, 0 runs in a thread (default 2);
+* ``IMAGE_PREP_START_METHOD`` – ``forkserver`` (default) or ``spawn``.
+
+The pool is created from the application lifespan (:func:`start_image_prep_pool`).
+Workers are never forked from the running server: a forked child would inherit its
+threads, locks and open database / HTTP connections.
+"""
+import asyncio
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from functools import partial
+from threading import Lock
+from typing import Optional, Tuple
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1600"))
+THUMBNAIL_EDGE = int(os.getenv("IMAGE_THUMBNAIL_EDGE", "384"))
+OUTPUT_FORMAT = os.getenv("IMAGE_OUTPUT_FORMAT", "webp").lower()
+QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+THUMBNAIL_QUALITY = int(os.getenv("IMAGE_THUMBNAIL_QUALITY", "75"))
+MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(50_000_000)))
+PREP_WORKERS = int(os.getenv("IMAGE_PREP_WORKERS", "2"))
+PREP_START_METHOD = os.getenv("IMAGE_PREP_START_METHOD", "forkserver")
+
+ALLOWED_INPUT_FORMATS = {"JPEG", "PNG", "WEBP", "GIF", "BMP", "TIFF", "MPO"}
+
+# формат -> (формат Pillow, content type, расширение)
+OUTPUT_FORMATS = {
+    "webp": ("WEBP", "image/webp", "webp"),
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+    "jpg": ("JPEG", "image/jpeg", "jpg"),
+}
+
+
+class InvalidImageError(ValueError):
+    """Загруженные байты не являются допустимым изображением."""
+
+
+@dataclass(frozen=True)
+class PreparedImage:
+    """Подготовленное изображение и его миниатюра."""
+    data: bytes
+    thumbnail: bytes
+    content_type: str
+    extension: str
+    width: int
+    height: int
+    original_size: int
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+
+def _encode(image: Image.Image, pil_format: str, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    if pil_format == "JPEG":
+        if image.mode == "RGBA":
+            # У JPEG нет прозрачности: кладём изображение на белый фон
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        image.save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(buffer, "WEBP", quality=quality, method=4)
+    return buffer.getvalue()
+
+
+def prepare_image_sync(
+    raw: bytes,
+    max_edge: int = MAX_EDGE,
+    thumbnail_edge: int = THUMBNAIL_EDGE,
+    output_format: str = OUTPUT_FORMAT,
+    quality: int = QUALITY,
+    thumbnail_quality: int = THUMBNAIL_QUALITY,
+    max_pixels: int = MAX_PIXELS,
+) -> PreparedImage:
+    """
+    Проверить, уменьшить и перекодировать изображение (выполняется в пуле процессов).
+
+    Raises:
+        InvalidImageError: Не изображение, неподдерживаемый формат или слишком большое
+    """
+    if not raw:
+        raise InvalidImageError("Empty image")
+    pil_format, content_type, extension = OUTPUT_FORMATS.get(output_format, OUTPUT_FORMATS["webp"])
+
+    try:
+        image = Image.open(io.BytesIO(raw))
+        if image.format not in ALLOWED_INPUT_FORMATS:
+            raise InvalidImageError(f"Unsupported image format: {image.format}")
+        if image.width * image.height > max_pixels:
+            raise InvalidImageError(f"Image is too large: {image.width}x{image.height}")
+        # Первый кадр для анимаций; поворот по EXIF до удаления метаданных
+        image.seek(0)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    except InvalidImageError:
+        raise
+    except UnidentifiedImageError as e:
+        raise InvalidImageError("Unrecognized image format") from e
+    except (Image.DecompressionBombError, OSError, ValueError) as e:
+        raise InvalidImageError(f"Invalid image: {e}") from e
+
+    mode = "RGBA" if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info else "RGB"
+    clean = image.convert(mode)
+    # Метаданные (EXIF с GPS, ICC, XMP, комментарии) не переносятся в новый файл
+    clean.info = {}
+
+    clean.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+    data = _encode(clean, pil_format, quality)
+
+    thumb = clean.copy()
+    thumb.thumbnail((thumbnail_edge, thumbnail_edge), Image.Resampling.LANCZOS)
+    thumbnail = _encode(thumb, pil_format, thumbnail_quality)
+
+    return PreparedImage(
+        data=data,
+        thumbnail=thumbnail,
+        content_type=content_type,
+        extension=extension,
+        width=clean.width,
+        height=clean.height,
+        original_size=len(raw),
+    )
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = Lock()
+
+
+def _create_executor() -> ProcessPoolExecutor:
+    context = multiprocessing.get_context(PREP_START_METHOD)
+    if PREP_START_METHOD == "forkserver":
+        # Воркеры форкаются от сервера, в котором Pillow и этот модуль уже импортированы
+        context.set_forkserver_preload([__name__])
+    return ProcessPoolExecutor(max_workers=PREP_WORKERS, mp_context=context)
+
+
+def _get_executor() -> Optional[ProcessPoolExecutor]:
+    global _executor
+    if PREP_WORKERS <= 0:
+        return None
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = _create_executor()
+    return _executor
+
+
+def start_image_prep_pool() -> None:
+    """Создать пул процессов (при запуске приложения; скрипты создают его при первом вызове)."""
+    _get_executor()
+
+
+def _reset_executor(wait: bool = False) -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait, cancel_futures=True)
+        _executor = None
+
+
+async def prepare_image(raw: bytes, **options) -> PreparedImage:
+    """
+    Подготовить изображение в пуле процессов.
+
+    Args:
+        raw: Исходные байты загруженного изображения
+        options: Параметры prepare_image_sync (max_edge, output_format, ...)
+
+    Raises:
+        InvalidImageError: Изображение не прошло проверку
+    """
+    loop = asyncio.get_running_loop()
+    func = partial(prepare_image_sync, raw, **options)
+    executor = _get_executor()
+    try:
+        return await loop.run_in_executor(executor, func)
+    except BrokenProcessPool:
+        # Процесс пула упал (например, OOM) – пересоздаём пул и повторяем один раз
+        print("⚠️ Image preparation pool is broken, recreating it")
+        _reset_executor()
+        return await loop.run_in_executor(_get_executor(), func)
+
+
+def shutdown_image_prep_pool() -> None:
+    """Остановить пул процессов (при остановке приложения)."""
+    _reset_executor(wait=True)
+
+
+async def upload_prepared_image(prepared: PreparedImage, name: str) -> Tuple[str, str]:
+    """
+    Загрузить изображение и миниатюру с правильным content type.
+
+    Args:
+        prepared: Результат prepare_image
+        name: Имя объекта без расширения, например ``product_1_<uuid>_0``
+
+    Returns:
+        Tuple[str, str]: URL изображения и URL миниатюры
+    """
+    # Импорт здесь: процессы пула импортируют этот модуль и не должны тянуть Firebase SDK
+    from src.utils.firebase_storage import upload_images_to_firebase_async
+
+    image_url, thumbnail_url = await upload_images_to_firebase_async([
+        (prepared.data, f"{name}.{prepared.extension}", prepared.content_type),
+        (prepared.thumbnail, f"{name}_thumb.{prepared.extension}", prepared.content_type),
+    ])
+    return image_url, thumbnail_url
+
+
+__all__ = [
+    "InvalidImageError",
+    "PreparedImage",
+    "prepare_image_sync",
+    "prepare_image",
+    "upload_prepared_image",
+    "start_image_prep_pool",
+    "shutdown_image_prep_pool",
+]
@@ -0,0 +1,131 @@
+"""
+Thread-safe in-process LRU cache with optional TTL and hit/miss counters.
+
+Used for short-lived process-local caches (agent responses, per-user agent state)
+where a shared store like Redis would cost more than the work it saves. Each
+process keeps its own copy; entries never outlive ``ttl_seconds``.
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Callable, Dict, Generic, Hashable, Iterator, Optional, Tuple, TypeVar
+
+
+V = TypeVar("V")
+
+
+@dataclass
+class CacheStats:
+    """Счётчики кэша."""
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return round(self.hits / total, 4) if total else 0.0
+
+
+class LRUCache(Generic[V]):
+    """
+    LRU-кэш с ограничением по числу записей и (опционально) по времени жизни.
+
+    Args:
+        maxsize: Максимум записей; самая давно использованная вытесняется первой
+        ttl_seconds: Время жизни записи, 0 – без ограничения
+        on_evict: Вызывается с (key, value) при вытеснении или истечении записи
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 256,
+        ttl_seconds: float = 0,
+        on_evict: Optional[Callable[[Hashable, V], None]] = None,
+    ):
+        self.maxsize = max(1, maxsize)
+        self.ttl_seconds = ttl_seconds
+        self.on_evict = on_evict
+        self.stats = CacheStats()
+        self._data: "OrderedDict[Hashable, Tuple[float, V]]" = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, count=False) is not None
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl_seconds > 0 and time.monotonic() - stored_at >= self.ttl_seconds
+
+    def _drop(self, key: Hashable, expired: bool) -> None:
+        _, value = self._data.pop(key)
+        if expired:
+            self.stats.expirations += 1
+        else:
+            self.stats.evictions += 1
+        if self.on_evict is not None:
+            try:
+                self.on_evict(key, value)
+            except Exception as e:
+                print(f"Error in cache eviction callback for {key}: {e}")
+
+    def get(self, key: Hashable, count: bool = True) -> Optional[V]:
+        """Вернуть значение и отметить его как недавно использованное (None при промахе)."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self._expired(entry[0]):
+                self._drop(key, expired=True)
+                entry = None
+            if entry is None:
+                if count:
+                    self.stats.misses += 1
+                return None
+            self._data.move_to_end(key)
+            if count:
+                self.stats.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: V) -> None:
+        """Сохранить значение, вытеснив самые старые записи сверх maxsize."""
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._drop(next(iter(self._data)), expired=False)
+
+    def pop(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return entry[1] if entry is not None else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def items(self) -> Iterator[Tuple[Hashable, V]]:
+        """Снимок актуальных записей (без обновления порядка LRU)."""
+        with self._lock:
+            return iter([(k, v) for k, (stored_at, v) in self._data.items() if not self._expired(stored_at)])
+
+    def info(self) -> Dict[str, Any]:
+        """Размер и счётчики для мониторинга."""
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.stats.hits,
+            "misses": self.stats.misses,
+            "hit_rate": self.stats.hit_rate,
+            "evictions": self.stats.evictions,
+            "expirations": self.stats.expirations,
+        }
+
+
+__all__ = [
+    "CacheStats",
+    "LRUCache",
+]
@@ -0,0 +1,209 @@
+"""
+Keyset (cursor) pagination helpers for list endpoints.
+
+Offset pagination makes the database walk through ``(page - 1) * per_page`` rows
+for every deep page. Keyset pagination instead continues from the last row of the
+previous page: ``WHERE (sort_column, id) < (:last_value, :last_id)``, which an
+index on the sort column serves in constant time regardless of depth.
+
+The cursor is an opaque url-safe base64 JSON blob containing the sort key and
+direction it was issued for, the sort value of the last row and its id.
+
+Total counting can be tuned per request with ``total_mode``:
+
+* ``exact`` – ``SELECT count(*)`` over the filtered set (previous behaviour);
+* ``estimate`` – PostgreSQL planner estimate, or a count capped at
+  ``PAGINATION_COUNT_CAP`` rows on other databases;
+* ``none`` – skip counting, ``total`` is returned as ``null``.
+"""
+import base64
+import json
+import os
+from datetime import datetime
+from typing import Any, List, Literal, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import Numeric, and_, asc, desc, func, literal, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+
+TotalMode = Literal["exact", "estimate", "none"]
+COUNT_CAP = int(os.getenv("PAGINATION_COUNT_CAP", "1000"))
+# Значение, которым заменяется NULL в nullable числовых колонках сортировки
+NULL_SORT_VALUE = 0
+
+
+def _dump_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _load_value(value: Any) -> Any:
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(sort_by: str, sort_order: str, value: Any, row_id: int) -> str:
+    """Упаковать позицию последней строки страницы в непрозрачный курсор"""
+    payload = {"s": sort_by, "o": sort_order.lower(), "v": _dump_value(value), "id": row_id}
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str, sort_order: str) -> Tuple[Any, int]:
+    """
+    Распаковать курсор. Курсор действителен только для той же сортировки,
+    для которой он был выдан.
+
+    Raises:
+        HTTPException: 400 если курсор повреждён или выдан для другой сортировки
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if payload["s"] != sort_by or payload["o"] != sort_order.lower():
+            raise ValueError("cursor was issued for a different sort order")
+        return _load_value(payload["v"]), int(payload["id"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {e}")
+
+
+def resolve_sort_column(model: Any, sort_by: str, allowed: Sequence[str], default: str = "created_at"):
+    """
+    Вернуть выражение сортировки для колонки из allowed (остальное сводится к default).
+
+    Keyset-условие ``col < :v OR (col = :v AND id < :id)`` не выполняется для NULL,
+    поэтому nullable числовые колонки (например, rating) сортируются по
+    ``coalesce(col, 0)`` – и в ORDER BY, и в условии курсора. created_at
+    заполняется server_default и NULL не содержит.
+    """
+    if sort_by not in allowed:
+        sort_by = default
+    column = getattr(model, sort_by)
+    if column.nullable and isinstance(column.type, Numeric):
+        return sort_by, func.coalesce(column, NULL_SORT_VALUE)
+    return sort_by, column
+
+
+def apply_keyset(
+    stmt: Select,
+    sort_column,
+    id_column,
+    sort_order: str,
+    after: Optional[Tuple[Any, int]] = None,
+    dialect_name: Optional[str] = None,
+) -> Select:
+    """
+    Добавить к запросу порядок (sort_column, id) и, если задана позиция after,
+    условие «строго после неё» в этом порядке.
+    """
+    descending = sort_order.lower() != "asc"
+    if after is not None:
+        value, row_id = after
+        column, bound = sort_column, value
+        if dialect_name == "sqlite" and isinstance(value, datetime):
+            # SQLite хранит даты строками: CURRENT_TIMESTAMP без микросекунд, а
+            # параметр – с ними, поэтому сравниваем через julianday()
+            column, bound = func.julianday(sort_column), func.julianday(literal(value, sort_column.type))
+        if descending:
+            stmt = stmt.filter(or_(column < bound, and_(column == bound, id_column < row_id)))
+        else:
+            stmt = stmt.filter(or_(column > bound, and_(column == bound, id_column > row_id)))
+
+    direction = desc if descending else asc
+    return stmt.order_by(direction(sort_column), direction(id_column))
+
+
+async def fetch_page(
+    db: AsyncSession,
+    stmt: Select,
+    *,
+    sort_by: str,
+    sort_column,
+    id_column,
+    sort_order: str,
+    per_page: int,
+    page: int = 1,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Получить одну страницу и курсор следующей.
+
+    С курсором страница отбирается по ключу (без OFFSET), без курсора –
+    обычным OFFSET по номеру страницы. В обоих случаях читается per_page + 1
+    строка, чтобы понять, есть ли следующая страница, не считая total.
+
+    Returns:
+        Tuple[List, Optional[str]]: Строки страницы и next_cursor (None на последней странице)
+    """
+    after = decode_cursor(cursor, sort_by, sort_order) if cursor else None
+    stmt = apply_keyset(stmt, sort_column, id_column, sort_order, after, db.bind.dialect.name)
+    if after is None:
+        stmt = stmt.offset((page - 1) * per_page)
+
+    rows = (await db.scalars(stmt.limit(per_page + 1))).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        value = getattr(last, sort_by)
+        next_cursor = encode_cursor(sort_by, sort_order, NULL_SORT_VALUE if value is None else value, last.id)
+    return list(rows), next_cursor
+
+
+async def count_total(db: AsyncSession, stmt: Select, total_mode: TotalMode = "exact") -> Tuple[Optional[int], bool]:
+    """
+    Посчитать total согласно total_mode.
+
+    Returns:
+        Tuple[Optional[int], bool]: total (None для режима none) и признак того, что это оценка
+    """
+    stmt = stmt.order_by(None)
+    if total_mode == "none":
+        return None, False
+
+    if total_mode == "estimate":
+        estimate = await _planner_estimate(db, stmt)
+        if estimate is not None:
+            return estimate, True
+        capped = await db.scalar(select(func.count()).select_from(stmt.limit(COUNT_CAP + 1).subquery()))
+        if capped > COUNT_CAP:
+            return COUNT_CAP, True
+        return capped, False
+
+    return await db.scalar(select(func.count()).select_from(stmt.subquery())), False
+
+
+async def _planner_estimate(db: AsyncSession, stmt: Select) -> Optional[int]:
+    """Оценка числа строк из EXPLAIN (только PostgreSQL)."""
+    dialect = db.bind.dialect
+    if dialect.name != "postgresql":
+        return None
+    try:
+        compiled = stmt.compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+        # SAVEPOINT: ошибка EXPLAIN не должна ломать транзакцию запроса
+        async with db.begin_nested():
+            plan = await db.scalar(text(f"EXPLAIN (FORMAT JSON) {compiled}"))
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except Exception as e:
+        # Например, параметр без литерального представления – считаем иначе
+        print(f"⚠️ Не удалось получить оценку total из EXPLAIN: {e}")
+        return None
+
+
+__all__ = [
+    "TotalMode",
+    "encode_cursor",
+    "decode_cursor",
+    "resolve_sort_column",
+    "apply_keyset",
+    "fetch_page",
+    "count_total",
+]
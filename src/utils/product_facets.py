@@ -0,0 +1,171 @@
+"""
+Facet counts for the product filter panel.
+
+The panel shows, for the current filter set, how many active products fall into
+each category, brand, city, size, color, price range and rating bucket. Every
+facet is one grouped aggregate query (a fixed number per request, independent of
+the number of categories or brands), and sizes/colors are counted through the
+indexed ``product_attributes`` table.
+
+Facets are disjunctive: the counts of a facet ignore the filter on that facet
+itself, so choosing ``brand=Zara`` still shows how many products the other brands
+would give.
+
+Environment variables:
+
+* ``PRODUCT_FACET_LIMIT`` – max values returned per facet (default 50);
+* ``PRODUCT_PRICE_BUCKETS`` – comma-separated price bucket edges
+  (default ``5000,10000,20000,50000,100000``).
+"""
+import os
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, case, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import ColumnElement, Select
+
+from src.models.product import Product, ProductAttribute, has_attribute
+from src.models.store import Store
+from src.schemas.product import FacetValue, PriceBucket, ProductFacetsResponse, RatingBucket
+
+
+FACET_VALUES_LIMIT = int(os.getenv("PRODUCT_FACET_LIMIT", "50"))
+PRICE_BUCKET_EDGES = tuple(
+    float(edge) for edge in os.getenv("PRODUCT_PRICE_BUCKETS", "5000,10000,20000,50000,100000").split(",") if edge.strip()
+)
+RATING_THRESHOLDS = (4.5, 4.0, 3.0, 2.0, 1.0)
+
+
+def product_filter_conditions(
+    *,
+    category: Optional[str] = None,
+    city: Optional[str] = None,
+    store_id: Optional[int] = None,
+    brand: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_rating: Optional[float] = None,
+    sizes: Optional[List[str]] = None,
+    colors: Optional[List[str]] = None,
+    in_stock_only: bool = False,
+) -> Dict[str, ColumnElement]:
+    """
+    Условия фильтров товаров, сгруппированные по фасетам.
+
+    Returns:
+        Dict[str, ColumnElement]: фасет -> условие (только для заданных фильтров)
+    """
+    conditions: Dict[str, ColumnElement] = {}
+    if category:
+        conditions["category"] = Product.category.ilike(f"%{category}%")
+    if city:
+        conditions["city"] = Store.city.ilike(f"%{city}%")
+    if store_id:
+        conditions["store"] = Product.store_id == store_id
+    if brand:
+        conditions["brand"] = Product.brand.ilike(f"%{brand}%")
+
+    price = []
+    if min_price:
+        price.append(Product.price >= min_price)
+    if max_price:
+        price.append(Product.price <= max_price)
+    if price:
+        conditions["price"] = and_(*price)
+
+    if min_rating:
+        conditions["rating"] = Product.rating >= min_rating
+    if sizes:
+        conditions["size"] = has_attribute("size", sizes)
+    if colors:
+        conditions["color"] = has_attribute("color", colors)
+    if in_stock_only:
+        conditions["stock"] = Product.stock_quantity > 0
+    return conditions
+
+
+def _filtered(base: Select, conditions: Dict[str, ColumnElement], exclude: Optional[str] = None) -> Select:
+    return base.filter(*[condition for facet, condition in conditions.items() if facet != exclude])
+
+
+async def _value_counts(db: AsyncSession, stmt: Select, column, count_column=Product.id) -> List[FacetValue]:
+    count = func.count(count_column.distinct()).label("count")
+    rows = (await db.execute(
+        stmt.with_only_columns(column, count)
+        .filter(column.isnot(None))
+        .group_by(column)
+        .order_by(count.desc(), column)
+        .limit(FACET_VALUES_LIMIT)
+    )).all()
+    return [FacetValue(value=str(value), count=count) for value, count in rows]
+
+
+async def _attribute_counts(db: AsyncSession, stmt: Select, kind: str) -> List[FacetValue]:
+    stmt = stmt.join(ProductAttribute, ProductAttribute.product_id == Product.id).filter(ProductAttribute.kind == kind)
+    return await _value_counts(db, stmt, ProductAttribute.value)
+
+
+def _price_buckets(edges: Iterable[float]) -> List[tuple]:
+    bounds = [None, *sorted(edges), None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+async def _price_histogram(db: AsyncSession, stmt: Select) -> List[PriceBucket]:
+    buckets = _price_buckets(PRICE_BUCKET_EDGES)
+    sums = []
+    for low, high in buckets:
+        bounds = []
+        if low is not None:
+            bounds.append(Product.price >= low)
+        if high is not None:
+            bounds.append(Product.price < high)
+        sums.append(func.sum(case((and_(*bounds), 1), else_=0)))
+    row = (await db.execute(stmt.with_only_columns(*sums))).one()
+    return [
+        PriceBucket(min_price=low, max_price=high, count=count or 0)
+        for (low, high), count in zip(buckets, row)
+    ]
+
+
+async def _rating_buckets(db: AsyncSession, stmt: Select) -> List[RatingBucket]:
+    sums = [func.sum(case((Product.rating >= threshold, 1), else_=0)) for threshold in RATING_THRESHOLDS]
+    row = (await db.execute(stmt.with_only_columns(*sums))).one()
+    return [
+        RatingBucket(min_rating=threshold, count=count or 0)
+        for threshold, count in zip(RATING_THRESHOLDS, row)
+    ]
+
+
+async def compute_facets(
+    db: AsyncSession,
+    base: Select,
+    conditions: Dict[str, ColumnElement],
+) -> ProductFacetsResponse:
+    """
+    Посчитать все фасеты для набора фильтров.
+
+    Args:
+        db: Асинхронная сессия
+        base: select(...).join(Store) с фильтром активности и текстовым поиском
+        conditions: Условия фильтров из product_filter_conditions()
+
+    Returns:
+        ProductFacetsResponse: total и счётчики по каждому фасету
+    """
+    total = await db.scalar(_filtered(base, conditions).with_only_columns(func.count(Product.id)))
+    return ProductFacetsResponse(
+        total=total or 0,
+        categories=await _value_counts(db, _filtered(base, conditions, "category"), Product.category),
+        brands=await _value_counts(db, _filtered(base, conditions, "brand"), Product.brand),
+        cities=await _value_counts(db, _filtered(base, conditions, "city"), Store.city),
+        sizes=await _attribute_counts(db, _filtered(base, conditions, "size"), "size"),
+        colors=await _attribute_counts(db, _filtered(base, conditions, "color"), "color"),
+        price_ranges=await _price_histogram(db, _filtered(base, conditions, "price")),
+        ratings=await _rating_buckets(db, _filtered(base, conditions, "rating")),
+    )
+
+
+__all__ = [
+    "product_filter_conditions",
+    "compute_facets",
+]
@@ -0,0 +1,159 @@
+"""
+Shared projection of products for list responses.
+
+List endpoints only need a handful of product columns plus a few store fields.
+The helpers here keep that projection in one place:
+
+* :func:`product_brief_options` – loader options that select only the columns a
+  ``ProductBrief`` needs and load the store together with the page
+  (``contains_eager`` over an existing join or one ``selectinload`` query), so a page
+  never triggers per-row store queries;
+* :func:`to_product_briefs` – serialises a page in one pass, building each
+  ``StoreBrief`` once per store.
+"""
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import contains_eager, load_only, selectinload
+
+from src.models.product import Product
+from src.models.store import Store
+from src.schemas.product import ProductBrief
+from src.schemas.store import StoreBrief
+
+
+# Колонки, нужные ProductBrief (+ created_at для keyset-пагинации)
+PRODUCT_BRIEF_COLUMNS = (
+    Product.id,
+    Product.name,
+    Product.price,
+    Product.original_price,
+    Product.rating,
+    Product.image_urls,
+    Product.stock_quantity,
+    Product.store_id,
+    Product.created_at,
+)
+
+STORE_BRIEF_COLUMNS = (
+    Store.id,
+    Store.name,
+    Store.city,
+    Store.logo_url,
+    Store.rating,
+)
+
+# Колонки для снимка каталога агентов: всё, кроме тяжёлого vector_embedding
+CATALOG_PRODUCT_COLUMNS = (
+    Product.id,
+    Product.name,
+    Product.description,
+    Product.price,
+    Product.original_price,
+    Product.sizes,
+    Product.colors,
+    Product.image_urls,
+    Product.features,
+    Product.category,
+    Product.brand,
+    Product.rating,
+    Product.reviews_count,
+    Product.stock_quantity,
+    Product.is_active,
+    Product.store_id,
+)
+
+
+def _store_loader(store: str):
+    if store == "joined":
+        return contains_eager(Product.store)
+    if store == "selectin":
+        return selectinload(Product.store)
+    raise ValueError(f"Unknown store loading strategy: {store}")
+
+
+def product_brief_options(store: Optional[str] = "joined") -> tuple:
+    """
+    Опции загрузки товаров для ProductBrief.
+
+    Args:
+        store: "joined" – запрос уже делает join(Store), магазин берётся из него;
+               "selectin" – магазины страницы догружаются одним запросом;
+               None – магазин известен заранее и не загружается
+
+    Returns:
+        tuple: Опции для .options(*...)
+    """
+    options = [load_only(*PRODUCT_BRIEF_COLUMNS)]
+    if store is not None:
+        options.append(_store_loader(store).load_only(*STORE_BRIEF_COLUMNS))
+    return tuple(options)
+
+
+def catalog_product_options() -> tuple:
+    """Опции загрузки товаров для снимка каталога (запрос делает join(Store))."""
+    return (
+        load_only(*CATALOG_PRODUCT_COLUMNS),
+        contains_eager(Product.store).load_only(*STORE_BRIEF_COLUMNS),
+    )
+
+
+def to_store_brief(store: Store) -> StoreBrief:
+    """Краткая информация о магазине"""
+    return StoreBrief(
+        id=store.id,
+        name=store.name,
+        city=store.city,
+        logo_url=store.logo_url,
+        rating=store.rating
+    )
+
+
+def to_product_brief(product: Product, store_brief: Optional[StoreBrief] = None) -> ProductBrief:
+    """Краткая информация о товаре"""
+    return ProductBrief(
+        id=product.id,
+        name=product.name,
+        price=product.price,
+        original_price=product.original_price,
+        rating=product.rating,
+        image_urls=product.image_urls or [],
+        discount_percentage=product.discount_percentage,
+        is_in_stock=product.is_in_stock,
+        store=store_brief or to_store_brief(product.store)
+    )
+
+
+def to_product_briefs(products: Iterable[Product], store: Optional[Store] = None) -> List[ProductBrief]:
+    """
+    Сериализовать страницу товаров за один проход.
+
+    Args:
+        products: Товары страницы
+        store: Магазин, если все товары из одного магазина и он уже загружен
+
+    Returns:
+        List[ProductBrief]: Товары в исходном порядке
+    """
+    store_briefs: Dict[int, StoreBrief] = {}
+    if store is not None:
+        store_briefs[store.id] = to_store_brief(store)
+
+    briefs = []
+    for product in products:
+        store_brief = store_briefs.get(product.store_id)
+        if store_brief is None:
+            store_brief = store_briefs[product.store_id] = to_store_brief(product.store)
+        briefs.append(to_product_brief(product, store_brief))
+    return briefs
+
+
+__all__ = [
+    "PRODUCT_BRIEF_COLUMNS",
+    "STORE_BRIEF_COLUMNS",
+    "CATALOG_PRODUCT_COLUMNS",
+    "product_brief_options",
+    "catalog_product_options",
+    "to_store_brief",
+    "to_product_brief",
+    "to_product_briefs",
+]
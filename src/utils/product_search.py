@@ -0,0 +1,209 @@
+"""
+Full-text search over products with relevance ranking.
+
+A leading-wildcard ``ILIKE '%query%'`` over four columns cannot use any index, so
+every search scanned the whole products table and returned rows in arbitrary order.
+This module replaces it with two backends:
+
+* ``postgres`` – the ``products.search_vector`` generated ``tsvector`` column
+  (migration ``7c3e9a1f4b2d``) with a GIN index. The query is turned into a prefix
+  ``tsquery`` (``term:*`` joined with ``&``) and rows are ranked with ``ts_rank``;
+  name matches weigh more than category/brand, which weigh more than description.
+* ``memory`` – an inverted index built from the catalog snapshot
+  (:mod:`src.utils.catalog_snapshot`) for SQLite and local development. It uses
+  the same tokenizer/stemmer as the agents' catalog retrieval, the same field
+  weights and AND semantics with prefix matching.
+
+Environment variables:
+
+* ``PRODUCT_FTS_BACKEND`` – ``auto`` (default: ``postgres`` on PostgreSQL,
+  ``memory`` elsewhere), ``postgres`` or ``memory``.
+"""
+import math
+import os
+import re
+from bisect import bisect_left
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, desc, false, func, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import ColumnElement, Select
+
+from src.agent.sub_agents.catalog_retrieval import normalize_text, stem
+from src.models.product import Product
+from src.utils.catalog_snapshot import CatalogProduct, CatalogSnapshot, get_catalog_snapshot
+
+
+FTS_BACKEND = os.getenv("PRODUCT_FTS_BACKEND", "auto").lower()
+# Конфигурация литералом, а не параметром REGCONFIG: иначе запрос нельзя
+# отрендерить с literal_binds для EXPLAIN в total_mode=estimate
+FTS_CONFIG = literal_column("'russian'::regconfig")
+RELEVANCE_SORT = "relevance"
+
+# Веса полей: совпадают с setweight A/B/B/C в миграции
+FIELD_WEIGHTS = (
+    ("name", 1.0),
+    ("category", 0.4),
+    ("brand", 0.4),
+    ("description", 0.2),
+)
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+_MAX_TERMS = 8
+
+# Колонка не описана в модели: она generated и существует только в PostgreSQL
+search_vector = literal_column("products.search_vector")
+
+
+def search_terms(query: str) -> List[str]:
+    """
+    Разбить запрос на термы. Остаются только буквы и цифры, поэтому
+    пользовательский ввод не может сломать синтаксис tsquery.
+    """
+    terms = []
+    for token in _TERM_RE.findall(normalize_text(query)):
+        token = token.replace("_", "")
+        # Однобуквенный префикс совпал бы почти со всем каталогом
+        if (len(token) > 1 or token.isdigit()) and token not in terms:
+            terms.append(token)
+    return terms[:_MAX_TERMS]
+
+
+def resolve_backend(dialect_name: str) -> str:
+    if FTS_BACKEND in ("postgres", "memory"):
+        return FTS_BACKEND
+    return "postgres" if dialect_name == "postgresql" else "memory"
+
+
+class ProductTextIndex:
+    """Инвертированный индекс по неизменяемому снимку каталога."""
+
+    def __init__(self, products: Iterable[CatalogProduct]):
+        # терм -> {product_id: вес лучшего поля, где он встречается}
+        self._postings: Dict[str, Dict[int, float]] = {}
+        count = 0
+        for product in products:
+            count += 1
+            for field_name, weight in FIELD_WEIGHTS:
+                for term in self._analyze(getattr(product, field_name, None)):
+                    posting = self._postings.setdefault(term, {})
+                    if posting.get(product.id, 0.0) < weight:
+                        posting[product.id] = weight
+        self._size = count
+        self._vocabulary = sorted(self._postings)
+
+    @staticmethod
+    def _analyze(text: Optional[str]) -> List[str]:
+        return [stem(t) for t in _TERM_RE.findall(normalize_text(text or "")) if t]
+
+    def _expand(self, term: str) -> List[str]:
+        """Термы словаря, начинающиеся с term (аналог term:* в tsquery)."""
+        start = bisect_left(self._vocabulary, term)
+        matched = []
+        for candidate in self._vocabulary[start:]:
+            if not candidate.startswith(term):
+                break
+            matched.append(candidate)
+        return matched
+
+    def search(self, query: str) -> Dict[int, float]:
+        """
+        Найти товары, содержащие все термы запроса (с учётом префиксов).
+
+        Returns:
+            Dict[int, float]: product_id -> релевантность
+        """
+        scores: Optional[Dict[int, float]] = None
+        for term in search_terms(query):
+            term_scores: Dict[int, float] = {}
+            for variant in self._expand(stem(term)):
+                posting = self._postings[variant]
+                idf = math.log(1.0 + self._size / len(posting))
+                for product_id, weight in posting.items():
+                    score = weight * idf
+                    if term_scores.get(product_id, 0.0) < score:
+                        term_scores[product_id] = score
+
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {pid: s + term_scores[pid] for pid, s in scores.items() if pid in term_scores}
+            if not scores:
+                return {}
+        return scores or {}
+
+
+class _TextIndexCache:
+    """Индекс пересобирается только при смене версии снимка каталога."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version: Optional[int] = None
+        self._index: Optional[ProductTextIndex] = None
+
+    def get(self, snapshot: CatalogSnapshot) -> ProductTextIndex:
+        with self._lock:
+            if self._index is None or self._version != snapshot.version:
+                self._index = ProductTextIndex(snapshot.products)
+                self._version = snapshot.version
+            return self._index
+
+
+_text_index_cache = _TextIndexCache()
+
+
+def search_catalog_index(db: Session, query: str) -> Dict[int, float]:
+    """Поиск по in-memory индексу (синхронно, для db.run_sync)."""
+    return _text_index_cache.get(get_catalog_snapshot(db)).search(query)
+
+
+async def apply_text_search(
+    db: AsyncSession,
+    stmt: Select,
+    query: str,
+) -> Tuple[Select, Optional[ColumnElement]]:
+    """
+    Отфильтровать запрос товаров по тексту.
+
+    Returns:
+        Tuple[Select, Optional[ColumnElement]]: Запрос с фильтром и выражение
+        релевантности для сортировки (None, если в запросе нет ни одного терма)
+    """
+    terms = search_terms(query)
+    if not terms:
+        return stmt, None
+
+    if resolve_backend(db.bind.dialect.name) == "postgres":
+        tsquery = func.to_tsquery(FTS_CONFIG, " & ".join(f"{term}:*" for term in terms))
+        return stmt.filter(search_vector.op("@@")(tsquery)), func.ts_rank(search_vector, tsquery)
+
+    scores = await db.run_sync(lambda session: search_catalog_index(session, query))
+    if not scores:
+        return stmt.filter(false()), None
+    rank = case(scores, value=Product.id, else_=0.0)
+    return stmt.filter(Product.id.in_(list(scores))), rank
+
+
+async def fetch_ranked_page(
+    db: AsyncSession,
+    stmt: Select,
+    rank: ColumnElement,
+    *,
+    per_page: int,
+    page: int = 1,
+) -> List[Product]:
+    """Страница товаров по убыванию релевантности (OFFSET-пагинация)."""
+    stmt = stmt.order_by(desc(rank), desc(Product.id)).offset((page - 1) * per_page).limit(per_page)
+    return list((await db.scalars(stmt)).all())
+
+
+__all__ = [
+    "RELEVANCE_SORT",
+    "search_terms",
+    "ProductTextIndex",
+    "search_catalog_index",
+    "apply_text_search",
+    "fetch_ranked_page",
+]
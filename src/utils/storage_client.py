@@ -0,0 +1,261 @@
+"""
+Storage client for uploaded images.
+
+Storage calls used to go through ``loop.run_in_executor(None, ...)``, sharing the
+default thread pool with everything else, and every call re-resolved the bucket.
+Each upload cost two round trips (upload + ``make_public()``) and each delete two
+more (``exists()`` + ``delete()``). :class:`StorageClient` instead:
+
+* runs blocking SDK calls in its own thread pool of ``STORAGE_MAX_WORKERS`` threads,
+  with an HTTP connection pool of the same size so connections are reused;
+* resolves the bucket once and caches the handle;
+* uploads with ``predefined_acl="publicRead"`` – the object is public in the same
+  request;
+* deletes without an existence check; a missing object (404) counts as deleted;
+* offers :meth:`StorageClient.upload_many` / :meth:`StorageClient.delete_many` for
+  batches.
+
+Two backends are available, selected with ``STORAGE_BACKEND``:
+
+* ``firebase`` (default) – Firebase Cloud Storage, configured as described in
+  :mod:`src.utils.firebase_storage`;
+* ``local`` – files under ``LOCAL_STORAGE_DIR`` (default ``./uploads``) served at
+  ``LOCAL_STORAGE_BASE_URL`` (default ``/uploads``), for offline development and
+  tests without Firebase credentials.
+"""
+import asyncio
+import os
+import re
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from threading import Lock
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firebase").lower()
+STORAGE_MAX_WORKERS = int(os.getenv("STORAGE_MAX_WORKERS", "16"))
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "uploads")
+LOCAL_STORAGE_BASE_URL = os.getenv("LOCAL_STORAGE_BASE_URL", "/uploads").rstrip("/")
+
+# (байты, имя объекта, content type)
+UploadItem = Tuple[bytes, str, str]
+
+
+class StorageBackend(ABC):
+    """Синхронный бэкенд хранилища; вызывается из пула потоков StorageClient."""
+
+    @abstractmethod
+    def upload(self, data: bytes, name: str, content_type: str) -> str:
+        """Загрузить объект и вернуть его публичный URL."""
+
+    @abstractmethod
+    def delete(self, url: str) -> None:
+        """Удалить объект по URL; отсутствующий объект не считается ошибкой."""
+
+
+class FirebaseStorageBackend(StorageBackend):
+    """Firebase Cloud Storage с кэшированным бакетом."""
+
+    def __init__(self, max_connections: int = STORAGE_MAX_WORKERS):
+        self.max_connections = max_connections
+        self._bucket = None
+        self._name_re: Optional[re.Pattern] = None
+        self._lock = Lock()
+
+    def _tune_connection_pool(self, client: Any) -> None:
+        # По умолчанию requests держит 10 соединений на хост – меньше, чем потоков в пуле
+        session = getattr(client, "_http", None)
+        if session is None or not hasattr(session, "mount"):
+            return
+        try:
+            from requests.adapters import HTTPAdapter
+            session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=self.max_connections))
+        except Exception as e:
+            print(f"Could not resize storage connection pool: {e}")
+
+    def _ensure_bucket(self) -> None:
+        """Лениво подключиться к бакету и подготовить регулярку имён объектов"""
+        if self._bucket is not None:
+            return
+        with self._lock:
+            if self._bucket is None:
+                from firebase_admin import storage
+                from src.utils.firebase_storage import _initialise_firebase
+
+                bucket = storage.bucket(app=_initialise_firebase())
+                self._tune_connection_pool(bucket.client)
+                # Имя объекта – часть URL после имени бакета (до query string)
+                self._name_re = re.compile(f"{re.escape(bucket.name)}/(.+?)(?=\\?|$)")
+                self._bucket = bucket
+
+    @property
+    def bucket(self):
+        self._ensure_bucket()
+        return self._bucket
+
+    def object_name(self, url: str) -> Optional[str]:
+        self._ensure_bucket()
+        match = self._name_re.search(url)
+        return match.group(1) if match else None
+
+    def upload(self, data: bytes, name: str, content_type: str) -> str:
+        blob = self.bucket.blob(name)
+        # Публичный доступ выставляется в том же запросе, без отдельного make_public()
+        blob.upload_from_string(data, content_type=content_type, predefined_acl="publicRead")
+        return blob.public_url
+
+    def delete(self, url: str) -> None:
+        from google.api_core.exceptions import NotFound
+
+        name = self.object_name(url)
+        if not name:
+            return
+        try:
+            self.bucket.blob(name).delete()
+        except NotFound:
+            pass
+
+
+class LocalStorageBackend(StorageBackend):
+    """Файлы в локальной директории – для разработки и тестов без Firebase."""
+
+    def __init__(self, directory: str = LOCAL_STORAGE_DIR, base_url: str = LOCAL_STORAGE_BASE_URL):
+        self.directory = os.path.abspath(directory)
+        self.base_url = base_url.rstrip("/")
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        path = os.path.abspath(os.path.join(self.directory, name))
+        if os.path.commonpath([path, self.directory]) != self.directory:
+            raise ValueError(f"Invalid object name: {name}")
+        return path
+
+    def upload(self, data: bytes, name: str, content_type: str) -> str:
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return f"{self.base_url}/{name}"
+
+    def delete(self, url: str) -> None:
+        prefix = f"{self.base_url}/"
+        if not url.startswith(prefix):
+            return
+        try:
+            os.remove(self._path(url[len(prefix):].split("?", 1)[0]))
+        except FileNotFoundError:
+            pass
+
+
+class StorageClient:
+    """
+    Асинхронный клиент хранилища с собственным пулом потоков.
+
+    Args:
+        backend: Бэкенд хранилища
+        max_workers: Размер пула потоков для вызовов SDK
+    """
+
+    def __init__(self, backend: StorageBackend, max_workers: int = STORAGE_MAX_WORKERS):
+        self.backend = backend
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="storage")
+        return self._executor
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    async def upload(self, data: bytes, name: str, content_type: str = "image/png") -> str:
+        """Загрузить объект и вернуть публичный URL."""
+        return await self._run(self.backend.upload, data, name, content_type)
+
+    async def delete(self, url: Optional[str]) -> None:
+        """Удалить объект по URL (пустой URL и отсутствующий объект игнорируются)."""
+        if url:
+            await self._run(self.backend.delete, url)
+
+    async def upload_many(self, items: Sequence[UploadItem]) -> List[str]:
+        """
+        Загрузить несколько объектов параллельно.
+
+        Если хотя бы одна загрузка не удалась, уже загруженные объекты удаляются и
+        поднимается первая ошибка.
+        """
+        results = await asyncio.gather(
+            *(self.upload(data, name, content_type) for data, name, content_type in items),
+            return_exceptions=True,
+        )
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            await self.delete_many([r for r in results if isinstance(r, str)])
+            raise errors[0]
+        return list(results)
+
+    async def delete_many(self, urls: Iterable[Optional[str]]) -> List[Optional[BaseException]]:
+        """
+        Удалить несколько объектов параллельно.
+
+        Returns:
+            List: Ошибка для каждого URL (None – удалён или отсутствовал)
+        """
+        urls = [url for url in urls if url]
+        results = await asyncio.gather(*(self.delete(url) for url in urls), return_exceptions=True)
+        for url, result in zip(urls, results):
+            if isinstance(result, BaseException):
+                print(f"Error deleting {url} from storage: {result}")
+        return [r if isinstance(r, BaseException) else None for r in results]
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def create_storage_backend(name: str = STORAGE_BACKEND) -> StorageBackend:
+    if name == "local":
+        return LocalStorageBackend()
+    if name == "firebase":
+        return FirebaseStorageBackend()
+    raise ValueError(f"Unknown STORAGE_BACKEND: {name}")
+
+
+_storage_client: Optional[StorageClient] = None
+_storage_client_lock = Lock()
+
+
+def get_storage_client() -> StorageClient:
+    global _storage_client
+    if _storage_client is None:
+        with _storage_client_lock:
+            if _storage_client is None:
+                _storage_client = StorageClient(create_storage_backend())
+    return _storage_client
+
+
+def set_storage_client(client: Optional[StorageClient]) -> None:
+    """Подменить клиент (например, LocalStorageBackend во временной директории в тестах)."""
+    global _storage_client
+    with _storage_client_lock:
+        _storage_client = client
+
+
+__all__ = [
+    "StorageBackend",
+    "FirebaseStorageBackend",
+    "LocalStorageBackend",
+    "StorageClient",
+    "create_storage_backend",
+    "get_storage_client",
+    "set_storage_client",
+]
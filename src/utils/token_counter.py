@@ -1,26 +1,25 @@
 import os
+import time
+from functools import lru_cache
+from threading import Lock
 import tiktoken
-from typing import Optional, Tuple, Dict, Any
+from typing import Optional, Tuple, Dict, Any, List, Sequence
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-def get_tiktoken_model_name(azure_deployment_name: Optional[str] = None) -> str:
-    """
-    Определяет имя модели для tiktoken на основе Azure deployment name.
-    
-    Args:
-        azure_deployment_name: Имя deployment в Azure OpenAI
-        
-    Returns:
-        str: Имя модели для tiktoken (gpt-4, gpt-3.5-turbo, etc.)
-    """
-    if not azure_deployment_name:
-        azure_deployment_name = os.environ.get("AZURE_DEPLOYMENT_NAME", "")
-    
+# Повторная попытка загрузить encoder после ошибки (например, нет доступа к сети)
+ENCODER_RETRY_SECONDS = float(os.getenv("TIKTOKEN_RETRY_SECONDS", "300"))
+
+# Примерная оценка, если encoder недоступен (4 символа ≈ 1 токен)
+FALLBACK_CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=64)
+def _model_name_for_deployment(deployment_name: str) -> str:
     # Приводим к нижнему регистру для проверки
-    deployment_lower = azure_deployment_name.lower()
+    deployment_lower = deployment_name.lower()
     
     # Маппинг Azure deployment names к tiktoken model names
     if "gpt-4o" in deployment_lower:
@@ -34,6 +33,79 @@ def get_tiktoken_model_name(azure_deployment_name: Optional[str] = None) -> str:
         return "gpt-4"
 
 
+def get_tiktoken_model_name(azure_deployment_name: Optional[str] = None) -> str:
+    """
+    Определяет имя модели для tiktoken на основе Azure deployment name.
+    
+    Args:
+        azure_deployment_name: Имя deployment в Azure OpenAI
+        
+    Returns:
+        str: Имя модели для tiktoken (gpt-4, gpt-3.5-turbo, etc.)
+    """
+    if not azure_deployment_name:
+        azure_deployment_name = os.environ.get("AZURE_DEPLOYMENT_NAME", "")
+    return _model_name_for_deployment(azure_deployment_name)
+
+
+class EncoderRegistry:
+    """
+    Encoder'ы tiktoken по имени модели, создаются один раз на процесс.
+
+    Ошибка загрузки тоже кэшируется на ENCODER_RETRY_SECONDS: без этого каждый
+    подсчёт токенов заново пытался бы скачать словарь и печатал ошибку.
+    """
+
+    def __init__(self, retry_seconds: float = ENCODER_RETRY_SECONDS):
+        self.retry_seconds = retry_seconds
+        self._encoders: Dict[str, tiktoken.Encoding] = {}
+        self._failures: Dict[str, float] = {}
+        self._lock = Lock()
+
+    def get(self, model: str) -> Optional[tiktoken.Encoding]:
+        """Encoder для модели или None, если он сейчас недоступен."""
+        encoding = self._encoders.get(model)
+        if encoding is not None:
+            return encoding
+
+        with self._lock:
+            encoding = self._encoders.get(model)
+            if encoding is not None:
+                return encoding
+            failed_at = self._failures.get(model)
+            if failed_at is not None and time.monotonic() - failed_at < self.retry_seconds:
+                return None
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except Exception as e:
+                print(f"Error loading tiktoken encoding for {model}, using estimate: {e}")
+                self._failures[model] = time.monotonic()
+                return None
+            self._failures.pop(model, None)
+            self._encoders[model] = encoding
+            return encoding
+
+    def clear(self) -> None:
+        with self._lock:
+            self._encoders.clear()
+            self._failures.clear()
+
+
+_encoder_registry = EncoderRegistry()
+
+
+def get_encoding(model: Optional[str] = None) -> Optional[tiktoken.Encoding]:
+    """
+    Encoder tiktoken для модели (кэшируется на процесс; токены считаются только как
+    запасная оценка – основной источник usage, который возвращает модель).
+    """
+    return _encoder_registry.get(model or get_tiktoken_model_name())
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // FALLBACK_CHARS_PER_TOKEN
+
+
 def count_tokens(text: str, model: Optional[str] = None) -> int:
     """
     Подсчитывает количество токенов в тексте.
@@ -47,22 +119,45 @@ def count_tokens(text: str, model: Optional[str] = None) -> int:
     """
     if not text or not isinstance(text, str):
         return 0
+    return count_tokens_batch([text], model)[0]
+
+
+def count_tokens_batch(texts: Sequence[str], model: Optional[str] = None) -> List[int]:
+    """
+    Подсчитывает токены для нескольких текстов одним вызовом tiktoken
+    (encode_ordinary_batch кодирует тексты параллельно в нативном коде).
     
-    try:
-        if not model:
-            model = get_tiktoken_model_name()
-        
-        # Получаем encoder для модели
-        encoding = tiktoken.encoding_for_model(model)
-        
-        # Подсчитываем токены
-        tokens = encoding.encode(text)
-        return len(tokens)
+    Args:
+        texts: Тексты для подсчета токенов (пустые и не-строки дают 0)
+        model: Имя модели для tiktoken (если не указано, определяется автоматически)
         
-    except Exception as e:
-        print(f"Error counting tokens: {e}")
-        # Fallback: приблизительная оценка (4 символа ≈ 1 токен)
-        return len(text) // 4
+    Returns:
+        List[int]: Количество токенов для каждого текста в том же порядке
+    """
+    counts = [0] * len(texts)
+    positions = [i for i, text in enumerate(texts) if text and isinstance(text, str)]
+    if not positions:
+        return counts
+
+    batch = [texts[i] for i in positions]
+    encoding = get_encoding(model)
+    if encoding is not None:
+        try:
+            # Спецтокены вроде <|endoftext|> в тексте пользователя считаются обычным текстом
+            if len(batch) == 1:
+                encoded = [encoding.encode_ordinary(batch[0])]
+            else:
+                encoded = encoding.encode_ordinary_batch(batch)
+            for i, tokens in zip(positions, encoded):
+                counts[i] = len(tokens)
+            return counts
+        except Exception as e:
+            print(f"Error counting tokens: {e}")
+
+    # Fallback: приблизительная оценка (4 символа ≈ 1 токен)
+    for i, text in zip(positions, batch):
+        counts[i] = _estimate_tokens(text)
+    return counts
 
 
 def count_message_tokens(message: str, response: str = "", model: Optional[str] = None) -> Dict[str, int]:
@@ -80,8 +175,7 @@ def count_message_tokens(message: str, response: str = "", model: Optional[str]
     if not model:
         model = get_tiktoken_model_name()
     
-    input_tokens = count_tokens(message, model)
-    output_tokens = count_tokens(response, model) if response else 0
+    input_tokens, output_tokens = count_tokens_batch([message, response], model)
     total_tokens = input_tokens + output_tokens
     
     return {
@@ -1,8 +1,10 @@
 import os
 import asyncio
 import json
+from typing import Optional
 from openai import AsyncAzureOpenAI
 from dotenv import load_dotenv
+from src.utils.image_analysis_cache import analysis_version, get_image_analysis_cache
 
 load_dotenv()
 
@@ -45,11 +47,24 @@ Example for jeans:
 
 async def analyze_image_for_tryon(
     image_url: str,
-    deployment: str = "gpt-4o"
+    deployment: str = "gpt-4o",
+    image_bytes: Optional[bytes] = None
 ) -> dict:
     """
     Analyzes a clothing image and returns a dictionary with description and category.
+    Results are cached by the image content hash; pass image_bytes when available.
     """
+    return await get_image_analysis_cache().get_or_compute(
+        "tryon",
+        analysis_version(SYSTEM_PROMPT, deployment),
+        image_url,
+        lambda: _analyze_image_for_tryon_uncached(image_url, deployment),
+        image_bytes=image_bytes,
+        required_keys=("garment_des", "category"),
+    )
+
+
+async def _analyze_image_for_tryon_uncached(image_url: str, deployment: str) -> dict:
     response = await client.chat.completions.create(
         model=deployment,
         messages=[
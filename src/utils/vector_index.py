@@ -0,0 +1,512 @@
+"""
+In-process vector index over ``Product.vector_embedding`` for semantic catalog search.
+
+Embeddings are computed through a pluggable embedder and persisted in the existing
+JSON column as base64-encoded float32 arrays. At query time all vectors live in a
+single contiguous ``float32`` matrix, so a cosine top-K lookup is one matrix-vector
+product instead of a Python loop over the table.
+
+Environment variables:
+
+* ``EMBEDDING_BACKEND`` – ``hashing`` (default, deterministic and offline) or ``azure``.
+* ``EMBEDDING_DIM`` – dimensionality of the hashing embedder (default 384).
+* ``AZURE_EMBEDDING_DEPLOYMENT`` – Azure OpenAI embedding deployment for ``azure``.
+* ``VECTOR_INDEX_TTL`` – seconds after which the index is rebuilt from the database in
+  the background (default 600). Regular product edits are applied incrementally.
+
+The index is built in a background thread with its own database session, started
+from the application lifespan; request handlers never build it or wait for it.
+"""
+import asyncio
+import base64
+import hashlib
+import os
+import re
+import time
+from abc import ABC, abstractmethod
+from functools import partial
+from threading import Lock, Thread
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from src.database import SessionLocal
+from src.models.product import Product
+
+
+VECTOR_INDEX_TTL_SECONDS = float(os.getenv("VECTOR_INDEX_TTL", "600"))
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class Embedder(ABC):
+    """Base class for embedders. Subclasses return L2-normalised float32 rows."""
+
+    name: str = "base"
+    dim: int = 0
+
+    @abstractmethod
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed a batch of texts into a ``(len(texts), dim)`` float32 matrix."""
+
+    def embed_one(self, text: str) -> np.ndarray:
+        return self.embed([text])[0]
+
+
+class HashingEmbedder(Embedder):
+    """
+    Deterministic local embedder based on the hashing trick.
+
+    Words and character trigrams are hashed into ``dim`` buckets with a signed
+    blake2b hash, so the same text always yields the same vector across processes
+    without any model download or network call.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> List[str]:
+        words = _TOKEN_RE.findall((text or "").lower().replace("ё", "е"))
+        features = list(words)
+        for word in words:
+            padded = f"#{word}#"
+            features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        return features
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                sign = 1.0 if value & 1 else -1.0
+                matrix[row, (value >> 1) % self.dim] += sign
+        return _normalize_rows(matrix)
+
+
+class AzureOpenAIEmbedder(Embedder):
+    """Embedder backed by an Azure OpenAI embedding deployment."""
+
+    def __init__(self, deployment: str, batch_size: int = 64):
+        from openai import AzureOpenAI
+
+        self.deployment = deployment
+        self.batch_size = batch_size
+        self.name = f"azure-{deployment}"
+        self.dim = 0
+        self._client = AzureOpenAI(
+            azure_endpoint=os.environ["AZURE_API_BASE"],
+            api_key=os.environ["AZURE_API_KEY"],
+            api_version=os.environ["AZURE_API_VERSION"],
+        )
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        rows: List[List[float]] = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = [text or " " for text in texts[start:start + self.batch_size]]
+            response = self._client.embeddings.create(model=self.deployment, input=batch)
+            rows.extend(item.embedding for item in response.data)
+        matrix = np.asarray(rows, dtype=np.float32)
+        if matrix.size:
+            self.dim = matrix.shape[1]
+        return _normalize_rows(matrix)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    if matrix.size == 0:
+        return matrix
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+_embedder_instance: Optional[Embedder] = None
+
+
+def get_embedder() -> Embedder:
+    """Return the process-wide embedder selected by ``EMBEDDING_BACKEND``."""
+    global _embedder_instance
+
+    if _embedder_instance is None:
+        backend = os.getenv("EMBEDDING_BACKEND", "hashing").lower()
+        if backend == "azure":
+            _embedder_instance = AzureOpenAIEmbedder(os.environ["AZURE_EMBEDDING_DEPLOYMENT"])
+        else:
+            _embedder_instance = HashingEmbedder(int(os.getenv("EMBEDDING_DIM", "384")))
+
+    return _embedder_instance
+
+
+def product_embedding_text(product: Any) -> str:
+    """Text representation of a product used for embedding."""
+    parts = [
+        product.name or "",
+        product.category or "",
+        product.brand or "",
+        " ".join(str(c) for c in (product.colors or []) if c),
+        " ".join(str(f) for f in (product.features or []) if f),
+        product.description or "",
+    ]
+    return " ".join(part for part in parts if part)
+
+
+def encode_embedding(vector: np.ndarray, model_name: str) -> Dict[str, Any]:
+    """Pack a vector into a compact JSON-serialisable payload (base64 float32)."""
+    data = np.asarray(vector, dtype=np.float32)
+    return {
+        "model": model_name,
+        "dim": int(data.shape[0]),
+        "data": base64.b64encode(data.tobytes()).decode("ascii"),
+    }
+
+
+def decode_embedding(payload: Any, model_name: str) -> Optional[np.ndarray]:
+    """Unpack a stored embedding. Returns None if it was produced by another model."""
+    if not isinstance(payload, dict) or payload.get("model") != model_name:
+        return None
+    try:
+        vector = np.frombuffer(base64.b64decode(payload["data"]), dtype=np.float32)
+    except (KeyError, ValueError, TypeError):
+        return None
+    if vector.shape[0] != payload.get("dim"):
+        return None
+    return vector
+
+
+class ProductVectorIndex:
+    """
+    Brute-force cosine index over product embeddings.
+
+    ``ids`` and ``matrix`` are replaced together on every mutation, so readers
+    always see a consistent pair without taking the lock.
+    """
+
+    def __init__(self, embedder: Embedder):
+        self.embedder = embedder
+        self._lock = Lock()
+        self._state: Tuple[np.ndarray, np.ndarray] = (
+            np.empty(0, dtype=np.int64),
+            np.empty((0, 0), dtype=np.float32),
+        )
+
+    def __len__(self) -> int:
+        return int(self._state[0].shape[0])
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._state[0]
+
+    def load(self, ids: Sequence[int], vectors: Sequence[np.ndarray]) -> None:
+        """Replace the whole index contents."""
+        id_array = np.asarray(list(ids), dtype=np.int64)
+        if len(vectors):
+            matrix = np.ascontiguousarray(np.vstack(vectors), dtype=np.float32)
+        else:
+            matrix = np.empty((0, 0), dtype=np.float32)
+        with self._lock:
+            self._state = (id_array, matrix)
+
+    def upsert(self, product_id: int, vector: np.ndarray) -> None:
+        """Insert or replace the vector of one product."""
+        vector = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+        with self._lock:
+            ids, matrix = self._state
+            positions = np.nonzero(ids == product_id)[0]
+            if positions.size:
+                matrix = matrix.copy()
+                matrix[positions[0]] = vector[0]
+            elif ids.size:
+                ids = np.append(ids, np.int64(product_id))
+                matrix = np.ascontiguousarray(np.vstack([matrix, vector]))
+            else:
+                ids = np.asarray([product_id], dtype=np.int64)
+                matrix = np.ascontiguousarray(vector)
+            self._state = (ids, matrix)
+
+    def remove(self, product_id: int) -> None:
+        """Drop a product from the index if present."""
+        with self._lock:
+            ids, matrix = self._state
+            keep = ids != product_id
+            if not keep.all():
+                self._state = (ids[keep], np.ascontiguousarray(matrix[keep]))
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 20,
+        candidate_ids: Optional[Iterable[int]] = None,
+    ) -> List[Tuple[int, float]]:
+        """
+        Cosine top-K search.
+
+        Args:
+            query: Free-text query
+            top_k: Number of results to return
+            candidate_ids: Optional subset of product ids to restrict the search to
+
+        Returns:
+            List of ``(product_id, score)`` sorted by descending similarity
+        """
+        ids, matrix = self._state
+        if ids.size == 0 or not query:
+            return []
+
+        if candidate_ids is not None:
+            mask = np.isin(ids, np.fromiter(candidate_ids, dtype=np.int64))
+            ids, matrix = ids[mask], matrix[mask]
+            if ids.size == 0:
+                return []
+
+        query_vector = self.embedder.embed_one(query)
+        if query_vector.shape[0] != matrix.shape[1]:
+            return []
+        scores = matrix @ query_vector
+
+        k = min(top_k, scores.shape[0])
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+
+def compute_product_embedding(product: Any, embedder: Optional[Embedder] = None) -> np.ndarray:
+    """Compute the embedding of a single product."""
+    embedder = embedder or get_embedder()
+    return embedder.embed_one(product_embedding_text(product))
+
+
+_EMBEDDING_TEXT_COLUMNS = (
+    Product.name,
+    Product.category,
+    Product.brand,
+    Product.colors,
+    Product.features,
+    Product.description,
+)
+
+
+def build_product_vector_index(session_factory=SessionLocal, embedder: Optional[Embedder] = None) -> ProductVectorIndex:
+    """
+    Build an index over all active products in a dedicated session.
+
+    Only the id and stored embedding are loaded for every product; the text columns
+    are read just for products whose embedding is missing or was produced by another
+    model. Those are computed in one batch and written back to
+    ``Product.vector_embedding``.
+    """
+    embedder = embedder or get_embedder()
+    db = session_factory()
+    try:
+        rows = db.query(Product.id, Product.vector_embedding).filter(Product.is_active == True).all()
+
+        ids: List[int] = []
+        vectors: List[np.ndarray] = []
+        missing_ids: List[int] = []
+        for product_id, payload in rows:
+            vector = decode_embedding(payload, embedder.name)
+            if vector is None:
+                missing_ids.append(product_id)
+                continue
+            ids.append(product_id)
+            vectors.append(vector)
+
+        if missing_ids:
+            missing = (
+                db.query(Product.id, *_EMBEDDING_TEXT_COLUMNS)
+                .filter(Product.id.in_(missing_ids))
+                .all()
+            )
+            computed = embedder.embed([product_embedding_text(row) for row in missing])
+            db.bulk_update_mappings(Product, [
+                {"id": row.id, "vector_embedding": encode_embedding(vector, embedder.name)}
+                for row, vector in zip(missing, computed)
+            ])
+            db.commit()
+            for row, vector in zip(missing, computed):
+                ids.append(row.id)
+                vectors.append(vector)
+    finally:
+        db.close()
+
+    index = ProductVectorIndex(embedder)
+    index.load(ids, vectors)
+    return index
+
+
+class VectorIndexHolder:
+    """
+    Holder of the process-wide index, rebuilt in a background thread.
+
+    Readers never wait for a build: until the first build finishes they get
+    ``None`` and callers fall back to non-semantic search. The index is rebuilt
+    once it is older than ``ttl_seconds``; edits made while a build is running
+    are replayed on top of the new index before it is swapped in.
+    """
+
+    def __init__(self, session_factory=SessionLocal, ttl_seconds: float = VECTOR_INDEX_TTL_SECONDS):
+        self.session_factory = session_factory
+        self.ttl_seconds = ttl_seconds
+        self._lock = Lock()
+        self._index: Optional[ProductVectorIndex] = None
+        self._built_at = 0.0
+        self._building = False
+        # product_id -> вектор (None – удалён), изменения во время сборки
+        self._pending: Dict[int, Optional[np.ndarray]] = {}
+
+    @property
+    def index(self) -> Optional[ProductVectorIndex]:
+        return self._index
+
+    def _is_stale(self) -> bool:
+        if self._index is None:
+            return True
+        return self.ttl_seconds > 0 and time.monotonic() - self._built_at >= self.ttl_seconds
+
+    def rebuild(self) -> Optional[ProductVectorIndex]:
+        """Синхронно пересобрать индекс (вызывается в фоновом потоке)."""
+        with self._lock:
+            if self._building:
+                return self._index
+            self._building = True
+            self._pending = {}
+        try:
+            index = build_product_vector_index(self.session_factory)
+        except Exception as e:
+            print(f"❌ Error building product vector index: {e}")
+            with self._lock:
+                self._building = False
+                self._pending = {}
+            return self._index
+
+        with self._lock:
+            for product_id, vector in self._pending.items():
+                if vector is None:
+                    index.remove(product_id)
+                else:
+                    index.upsert(product_id, vector)
+            self._index = index
+            self._built_at = time.monotonic()
+            self._building = False
+            self._pending = {}
+        print(f"🧭 Векторный индекс товаров: {len(index)} товаров")
+        return index
+
+    def refresh_in_background(self) -> None:
+        """Запустить пересборку в фоновом потоке, если она ещё не идёт."""
+        if self._building:
+            return
+        Thread(target=self.rebuild, name="vector-index-build", daemon=True).start()
+
+    def get(self) -> Optional[ProductVectorIndex]:
+        """Текущий индекс без ожидания; устаревший индекс пересобирается в фоне."""
+        if self._is_stale():
+            self.refresh_in_background()
+        return self._index
+
+    def upsert(self, product_id: int, vector: np.ndarray) -> None:
+        with self._lock:
+            if self._building:
+                self._pending[product_id] = vector
+            if self._index is not None:
+                self._index.upsert(product_id, vector)
+
+    def remove(self, product_id: int) -> None:
+        with self._lock:
+            if self._building:
+                self._pending[product_id] = None
+            if self._index is not None:
+                self._index.remove(product_id)
+
+
+_vector_index_holder = VectorIndexHolder()
+
+
+def start_product_vector_index() -> None:
+    """Start building the index in the background (called from the app lifespan)."""
+    _vector_index_holder.refresh_in_background()
+
+
+def get_product_vector_index() -> Optional[ProductVectorIndex]:
+    """Return the process-wide product index, or None while it is still being built."""
+    return _vector_index_holder.get()
+
+
+def is_vector_index_ready() -> bool:
+    """Whether semantic search can be served right now."""
+    return get_product_vector_index() is not None
+
+
+def index_product(db: Session, product: Product) -> None:
+    """
+    Recompute the embedding of a created/updated product and update the in-memory
+    index. Inactive products are removed from the index.
+
+    The embedding is written to ``product.vector_embedding`` and flushed; committing
+    is left to the caller, whose transaction it belongs to.
+    """
+    if not product.is_active:
+        remove_product_from_index(product.id)
+        return
+
+    try:
+        embedder = get_embedder()
+        vector = compute_product_embedding(product, embedder)
+    except Exception as e:
+        # Индексация не должна ломать сохранение товара – эмбеддинг будет
+        # досчитан при следующей сборке индекса
+        print(f"Error indexing product {product.id}: {e}")
+        return
+
+    product.vector_embedding = encode_embedding(vector, embedder.name)
+    db.flush()
+    _vector_index_holder.upsert(product.id, vector)
+
+
+def remove_product_from_index(product_id: int) -> None:
+    """Drop a deleted/deactivated product from the in-memory index."""
+    _vector_index_holder.remove(product_id)
+
+
+def semantic_search(
+    query: str,
+    top_k: int = 20,
+    candidate_ids: Optional[Iterable[int]] = None,
+) -> List[Tuple[int, float]]:
+    """Convenience wrapper: cosine top-K product ids for a text query ([] while the index is building)."""
+    index = get_product_vector_index()
+    if index is None:
+        return []
+    return index.search(query, top_k=top_k, candidate_ids=candidate_ids)
+
+
+async def semantic_search_async(
+    query: str,
+    top_k: int = 20,
+    candidate_ids: Optional[Iterable[int]] = None,
+) -> List[Tuple[int, float]]:
+    """:func:`semantic_search` in a worker thread – the query embedding may be a network call."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, partial(semantic_search, query, top_k=top_k, candidate_ids=candidate_ids)
+    )
+
+
+__all__ = [
+    "Embedder",
+    "HashingEmbedder",
+    "AzureOpenAIEmbedder",
+    "ProductVectorIndex",
+    "get_embedder",
+    "VectorIndexHolder",
+    "get_product_vector_index",
+    "start_product_vector_index",
+    "is_vector_index_ready",
+    "index_product",
+    "remove_product_from_index",
+    "semantic_search",
+    "semantic_search_async",
+]
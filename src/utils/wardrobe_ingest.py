@@ -0,0 +1,172 @@
+"""
+Concurrent ingestion of wardrobe photos.
+
+Each photo goes through decode -> prepare (validate, downscale, re-encode, thumbnail;
+see :mod:`src.utils.image_prep`) -> upload to storage -> vision analysis. Photos used
+to be processed one after another, so a batch of N photos cost N x (upload +
+analysis). Here every photo runs its own pipeline and at most
+``WARDROBE_INGEST_CONCURRENCY`` pipelines run at once, so a batch takes roughly as
+long as its slowest photo.
+
+Results are reported per photo: a failure of one photo does not cancel the others.
+Rows are only built here; the caller adds them to the session and commits once.
+
+With ``analyze=False`` photos are only uploaded and the rows are placeholders with
+``analysis_status="pending"``; the caller enqueues analysis jobs for them
+(see :mod:`src.utils.analysis_jobs`).
+
+Environment variables:
+
+* ``WARDROBE_INGEST_CONCURRENCY`` – photos processed in parallel (default 4).
+"""
+import asyncio
+import base64
+import binascii
+import os
+import uuid
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from src.models.analysis_job import ANALYSIS_PENDING
+from src.models.clothing import ClothingItem
+from src.schemas.clothing import PhotoUpload
+from src.utils.analysis_jobs import PENDING_CLOTHING_CATEGORY, PENDING_CLOTHING_NAME
+from src.utils.analyze_image import analyze_image
+from src.utils.firebase_storage import delete_images_from_firebase_async
+from src.utils.image_prep import prepare_image, upload_prepared_image
+
+
+INGEST_CONCURRENCY = int(os.getenv("WARDROBE_INGEST_CONCURRENCY", "4"))
+
+
+@dataclass
+class IngestResult:
+    """Результат обработки одной фотографии."""
+    index: int
+    item: Optional[ClothingItem] = None
+    image_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def success(self) -> bool:
+        return self.item is not None
+
+
+def decode_photo(photo: PhotoUpload) -> bytes:
+    """Декодировать base64 (с data-URL префиксом или без него)."""
+    try:
+        img_bytes = base64.b64decode(photo.image_base64.split(",")[-1])
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Invalid base64 image: {e}") from e
+    if not img_bytes:
+        raise ValueError("Empty image")
+    return img_bytes
+
+
+def build_clothing_item(analysis: dict, image_url: str, user_id: int, thumbnail_url: Optional[str] = None) -> ClothingItem:
+    """Создать строку гардероба по результату анализа (без добавления в сессию)."""
+    # Filter out None values from features to prevent validation errors
+    features = [f for f in analysis.get("features", []) if f is not None and isinstance(f, str)]
+    return ClothingItem(
+        name=analysis["name"],  # Use the name from analysis
+        image_url=image_url,
+        thumbnail_url=thumbnail_url,
+        category=analysis["category"],
+        features=features,
+        user_id=user_id
+    )
+
+
+def build_pending_clothing_item(image_url: str, user_id: int, thumbnail_url: Optional[str] = None) -> ClothingItem:
+    """Создать строку-заглушку, которую заполнит фоновый анализ."""
+    return ClothingItem(
+        name=PENDING_CLOTHING_NAME,
+        image_url=image_url,
+        thumbnail_url=thumbnail_url,
+        category=PENDING_CLOTHING_CATEGORY,
+        features=[],
+        user_id=user_id,
+        analysis_status=ANALYSIS_PENDING
+    )
+
+
+async def _ingest_one(
+    index: int,
+    photo: PhotoUpload,
+    user_id: int,
+    semaphore: asyncio.Semaphore,
+    analyze: bool = True,
+) -> IngestResult:
+    result = IngestResult(index=index)
+    async with semaphore:
+        try:
+            img_bytes = decode_photo(photo)
+            prepared = await prepare_image(img_bytes)
+
+            # Upload to Firebase Storage
+            result.image_url, result.thumbnail_url = await upload_prepared_image(prepared, str(uuid.uuid4()))
+
+            if not analyze:
+                result.item = build_pending_clothing_item(result.image_url, user_id, result.thumbnail_url)
+                return result
+
+            # Analyze image using Azure OpenAI
+            analysis = await analyze_image(result.image_url, image_bytes=prepared.data)
+            result.item = build_clothing_item(analysis, result.image_url, user_id, result.thumbnail_url)
+        except Exception as e:
+            print(f"❌ Failed to process wardrobe photo #{index}: {e}")
+            result.error = str(e) or type(e).__name__
+    return result
+
+
+async def ingest_photos(
+    photos: Sequence[PhotoUpload],
+    user_id: int,
+    concurrency: int = INGEST_CONCURRENCY,
+    analyze: bool = True,
+) -> List[IngestResult]:
+    """
+    Обработать фотографии параллельно (не более concurrency одновременно).
+
+    Args:
+        photos: Фотографии в base64
+        user_id: Владелец гардероба
+        concurrency: Максимум одновременно обрабатываемых фотографий
+        analyze: False – только загрузить, строки создаются в статусе pending
+
+    Returns:
+        List[IngestResult]: Результаты в порядке фотографий
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    return list(await asyncio.gather(
+        *(_ingest_one(index, photo, user_id, semaphore, analyze) for index, photo in enumerate(photos))
+    ))
+
+
+async def discard_uploads(results: Sequence[IngestResult], only_failed: bool = False) -> None:
+    """
+    Удалить загруженные изображения, для которых не будет строки в БД.
+
+    Args:
+        results: Результаты ingest_photos
+        only_failed: Удалять только изображения фотографий, анализ которых не удался
+    """
+    urls = [
+        url for r in results
+        if not only_failed or not r.success
+        for url in (r.image_url, r.thumbnail_url) if url
+    ]
+    if urls:
+        await delete_images_from_firebase_async(urls)
+
+
+__all__ = [
+    "INGEST_CONCURRENCY",
+    "IngestResult",
+    "decode_photo",
+    "build_clothing_item",
+    "build_pending_clothing_item",
+    "ingest_photos",
+    "discard_uploads",
+]
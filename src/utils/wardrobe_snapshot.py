@@ -0,0 +1,124 @@
+"""
+Per-user wardrobe snapshots for the outfit agent.
+
+The outfit agent's wardrobe tool used to query every ``ClothingItem`` of the user on
+each invocation (several times per run with retries). Snapshots are immutable copies
+of a user's wardrobe kept in a bounded LRU/TTL cache and dropped by the wardrobe
+endpoints whenever an item is created or deleted.
+
+Items are addressed by short stable references (``w<id>``) so the agent prompt does
+not carry full image URLs; :meth:`WardrobeSnapshot.resolve` maps a reference back to
+the image URL after the model answers.
+
+Environment variables:
+
+* ``WARDROBE_SNAPSHOT_CACHE_SIZE`` – number of users kept in memory (default 1024);
+* ``WARDROBE_SNAPSHOT_TTL`` – seconds before a snapshot is re-read from the database
+  (default 900), a safety net for changes made outside the API.
+"""
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from src.models.analysis_job import ANALYSIS_DONE
+from src.models.clothing import ClothingItem
+from src.utils.lru_cache import LRUCache
+
+
+SNAPSHOT_CACHE_SIZE = int(os.getenv("WARDROBE_SNAPSHOT_CACHE_SIZE", "1024"))
+SNAPSHOT_TTL_SECONDS = float(os.getenv("WARDROBE_SNAPSHOT_TTL", "900"))
+
+WARDROBE_REF_PREFIX = "w"
+
+
+@dataclass(frozen=True)
+class WardrobeItem:
+    """Неизменяемая копия вещи из гардероба."""
+    id: int
+    name: str
+    image_url: str
+    category: str
+    features: Tuple[str, ...] = ()
+
+    @property
+    def ref(self) -> str:
+        """Короткая ссылка на вещь для промпта."""
+        return f"{WARDROBE_REF_PREFIX}{self.id}"
+
+
+@dataclass(frozen=True)
+class WardrobeSnapshot:
+    """Снимок гардероба пользователя. Никогда не изменяется после создания."""
+    user_id: int
+    items: Tuple[WardrobeItem, ...] = ()
+    by_ref: Dict[str, WardrobeItem] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def categories(self) -> Dict[str, int]:
+        """Количество вещей по категориям."""
+        counts: Dict[str, int] = {}
+        for item in self.items:
+            counts[item.category] = counts.get(item.category, 0) + 1
+        return counts
+
+    def resolve(self, ref: str) -> Optional[str]:
+        """URL изображения по короткой ссылке или None."""
+        item = self.by_ref.get((ref or "").strip().lower())
+        return item.image_url if item is not None else None
+
+
+def _build_snapshot(db: Session, user_id: int) -> WardrobeSnapshot:
+    rows = (
+        db.query(ClothingItem)
+        # Вещи, ожидающие фонового анализа, ещё без названия и категории
+        .filter(ClothingItem.user_id == user_id, ClothingItem.analysis_status == ANALYSIS_DONE)
+        .order_by(ClothingItem.id.asc())
+        .all()
+    )
+    items = tuple(
+        WardrobeItem(
+            id=row.id,
+            name=row.name,
+            image_url=row.image_url,
+            category=row.category,
+            features=tuple(f for f in (row.features or []) if f and isinstance(f, str)),
+        )
+        for row in rows
+    )
+    return WardrobeSnapshot(user_id=user_id, items=items, by_ref={item.ref: item for item in items})
+
+
+_wardrobe_snapshots: LRUCache[WardrobeSnapshot] = LRUCache(SNAPSHOT_CACHE_SIZE, SNAPSHOT_TTL_SECONDS)
+
+
+def get_wardrobe_snapshot(db: Session, user_id: int) -> WardrobeSnapshot:
+    """Return the user's wardrobe snapshot, reading it from the database on a miss."""
+    snapshot = _wardrobe_snapshots.get(user_id)
+    if snapshot is None:
+        snapshot = _build_snapshot(db, user_id)
+        _wardrobe_snapshots.set(user_id, snapshot)
+    return snapshot
+
+
+def invalidate_wardrobe_snapshot(user_id: int) -> None:
+    """Drop the user's snapshot after their wardrobe changed."""
+    _wardrobe_snapshots.pop(user_id)
+
+
+def get_wardrobe_snapshot_cache() -> LRUCache[WardrobeSnapshot]:
+    """LRU cache of wardrobe snapshots (for metrics and cleanup)."""
+    return _wardrobe_snapshots
+
+
+__all__ = [
+    "WARDROBE_REF_PREFIX",
+    "WardrobeItem",
+    "WardrobeSnapshot",
+    "get_wardrobe_snapshot",
+    "invalidate_wardrobe_snapshot",
+    "get_wardrobe_snapshot_cache",
+]
@@ -13,7 +13,7 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent / "src"))
 
 from src.database import SessionLocal
-from src.agent.sub_agents.outfit_agent import recommend_outfit, WardrobeManager
+from src.agent.sub_agents.outfit_agent import recommend_outfit, user_wardrobe_json
 
 async def test_wardrobe_access():
     """Test wardrobe access for a specific user."""
@@ -25,8 +25,11 @@ async def test_wardrobe_access():
     try:
         # Test direct wardrobe access
         print(f"Testing wardrobe access for user_id: {user_id}")
-        wardrobe_manager = WardrobeManager(user_id)
-        wardrobe_result = wardrobe_manager.get_user_wardrobe()
+        db = SessionLocal()
+        try:
+            wardrobe_result = user_wardrobe_json(db, user_id)
+        finally:
+            db.close()
         print(f"Wardrobe result: {wardrobe_result}")
         
         # Test the full outfit recommendation
@@ -0,0 +1,175 @@
+"""
+Переходы состояний задач AnalysisWorker: done, повтор с задержкой, окончательная ошибка.
+
+Воркер запускается через run_once со stub-анализатором и временной SQLite базой,
+без Azure и без фонового цикла.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test_analysis_jobs.db")
+os.environ.setdefault("AZURE_4o_OPENAI_KEY", "test")
+os.environ.setdefault("AZURE_4o_OPENAI_ENDPOINT", "https://example.openai.azure.com")
+os.environ.setdefault("EMBEDDING_BACKEND", "hashing")
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.database import Base
+# Все модели нужны для настройки связей SQLAlchemy
+from src.models import analysis_job, chat, clothing, image_analysis, product, review, store, tryon, usage, user, waitlist  # noqa: F401
+from src.models.analysis_job import (
+    ANALYSIS_DONE, ANALYSIS_FAILED, ANALYSIS_PENDING, JOB_DONE, JOB_FAILED, JOB_KIND_PRODUCT, JOB_PENDING,
+    AnalysisJob
+)
+from src.models.product import Product
+from src.models.store import Store
+from src.utils import analysis_jobs
+from src.utils.analysis_jobs import FALLBACK_PRODUCT_CATEGORY, AnalysisWorker, enqueue_analysis
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    # clothing_items использует ARRAY (только PostgreSQL); для задач товаров она не нужна
+    tables = [table for table in Base.metadata.sorted_tables if table.name != "clothing_items"]
+    Base.metadata.create_all(engine, tables=tables)
+    yield sessionmaker(bind=engine, autoflush=False)
+    engine.dispose()
+
+
+def _enqueue_product(session_factory, image_urls, name=None):
+    db = session_factory()
+    try:
+        shop = Store(name="Test store", city="Almaty")
+        db.add(shop)
+        db.flush()
+        item = Product(
+            name=name or "Новый товар",
+            price=1000,
+            category="pending",
+            store_id=shop.id,
+            image_urls=list(image_urls),
+            is_active=False,
+            analysis_status=ANALYSIS_PENDING,
+        )
+        db.add(item)
+        db.flush()
+        job = enqueue_analysis(db, JOB_KIND_PRODUCT, item.id, image_urls, name=name)
+        db.commit()
+        return item.id, job.id
+    finally:
+        db.close()
+
+
+def _load(session_factory, product_id, job_id):
+    db = session_factory()
+    try:
+        return db.get(Product, product_id), db.get(AnalysisJob, job_id)
+    finally:
+        db.close()
+
+
+def _make_due(session_factory, job_id):
+    db = session_factory()
+    try:
+        db.get(AnalysisJob, job_id).run_after = datetime.now(timezone.utc) - timedelta(seconds=1)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _as_utc(value):
+    # SQLite не хранит часовой пояс
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class StubAnalyzer:
+    """Анализатор, который падает на URL из failing и считает вызовы."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+
+    async def __call__(self, url):
+        self.calls.append(url)
+        if url in self.failing:
+            raise RuntimeError(f"analysis failed for {url}")
+        return {"name": "Рубашка оверсайз", "category": "Tops", "features": ["cotton", None, "oversize"]}
+
+
+def test_run_once_completes_job(session_factory):
+    product_id, job_id = _enqueue_product(session_factory, ["https://img/1.webp", "https://img/2.webp"])
+    analyzer = StubAnalyzer(failing={"https://img/2.webp"})
+    worker = AnalysisWorker(analyzer=analyzer, session_factory=session_factory, concurrency=2)
+
+    assert asyncio.run(worker.run_once()) == 1
+
+    item, job = _load(session_factory, product_id, job_id)
+    assert job.status == JOB_DONE
+    assert job.attempts == 1
+    assert job.last_error is None
+    assert item.name == "Рубашка оверсайз"
+    assert item.category == "Tops"
+    assert item.features == ["cotton", "oversize"]
+    assert item.description == "Товар добавлен через анализ 1 фото."
+    assert item.analysis_status == ANALYSIS_DONE
+    assert item.is_active
+    assert sorted(analyzer.calls) == ["https://img/1.webp", "https://img/2.webp"]
+    assert worker.processed == 1
+    # Выполненная задача больше не берётся
+    assert asyncio.run(worker.run_once()) == 0
+
+
+def test_run_once_retries_with_backoff(session_factory, monkeypatch):
+    monkeypatch.setattr(analysis_jobs, "JOB_RETRY_SECONDS", 10.0)
+    product_id, job_id = _enqueue_product(session_factory, ["https://img/bad.webp"])
+    worker = AnalysisWorker(analyzer=StubAnalyzer(failing={"https://img/bad.webp"}), session_factory=session_factory)
+
+    before = datetime.now(timezone.utc)
+    assert asyncio.run(worker.run_once()) == 1
+    item, job = _load(session_factory, product_id, job_id)
+    assert job.status == JOB_PENDING
+    assert job.attempts == 1
+    assert "analysis failed" in job.last_error
+    assert _as_utc(job.run_after) >= before + timedelta(seconds=10)
+    assert item.analysis_status == ANALYSIS_PENDING
+    assert not item.is_active
+
+    # До наступления run_after задача не берётся
+    assert asyncio.run(worker.run_once()) == 0
+
+    _make_due(session_factory, job_id)
+    before = datetime.now(timezone.utc)
+    assert asyncio.run(worker.run_once()) == 1
+    _, job = _load(session_factory, product_id, job_id)
+    assert job.status == JOB_PENDING
+    assert job.attempts == 2
+    # Задержка удваивается с каждой попыткой
+    assert _as_utc(job.run_after) >= before + timedelta(seconds=20)
+    assert worker.failed == 0
+
+
+def test_run_once_fails_permanently_after_max_attempts(session_factory):
+    product_id, job_id = _enqueue_product(session_factory, ["https://img/bad.webp"], name="Платье миди")
+    worker = AnalysisWorker(analyzer=StubAnalyzer(failing={"https://img/bad.webp"}), session_factory=session_factory)
+
+    for attempt in range(analysis_jobs.JOB_MAX_ATTEMPTS):
+        _make_due(session_factory, job_id)
+        assert asyncio.run(worker.run_once()) == 1
+
+    item, job = _load(session_factory, product_id, job_id)
+    assert job.status == JOB_FAILED
+    assert job.attempts == job.max_attempts
+    assert job.completed_at is not None
+    # Товар публикуется с запасными полями и не считается проанализированным
+    assert item.name == "Платье миди"
+    assert item.category == FALLBACK_PRODUCT_CATEGORY
+    assert item.features == []
+    assert "анализ" in item.description and "1 фото" not in item.description
+    assert item.analysis_status == ANALYSIS_FAILED
+    assert item.is_active
+    assert worker.failed == 1
+    assert asyncio.run(worker.run_once()) == 0
@@ -0,0 +1,91 @@
+"""
+Создание и изменение товара админом магазина при уже собранном снимке каталога.
+
+refresh_product_in_snapshot загружает product.store в product.__dict__; ответ
+ProductResponse не должен из-за этого падать после коммита товара.
+"""
+import asyncio
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test_store_admin_products.db")
+os.environ.setdefault("AZURE_4o_OPENAI_KEY", "test")
+os.environ.setdefault("AZURE_4o_OPENAI_ENDPOINT", "https://example.openai.azure.com")
+os.environ.setdefault("EMBEDDING_BACKEND", "hashing")
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.database import Base
+# Все модели нужны для настройки связей SQLAlchemy
+from src.models import analysis_job, chat, clothing, image_analysis, product, review, store, tryon, usage, user, waitlist  # noqa: F401
+from src.models.product import Product
+from src.models.store import Store
+from src.models.user import User, UserRole
+from src.routers import store_admin
+from src.schemas.store_admin import StoreAdminProductCreate, StoreAdminProductUpdate
+from src.utils.catalog_snapshot import get_catalog_snapshot, invalidate_catalog_snapshot
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'store_admin.db'}")
+    # clothing_items использует ARRAY (только PostgreSQL) и здесь не нужна
+    tables = [table for table in Base.metadata.sorted_tables if table.name != "clothing_items"]
+    Base.metadata.create_all(engine, tables=tables)
+    session = sessionmaker(bind=engine, autoflush=False)()
+    yield session
+    session.close()
+    invalidate_catalog_snapshot()
+    engine.dispose()
+
+
+@pytest.fixture
+def store_admin_user(db):
+    shop = Store(name="H&M Mega", city="Almaty", rating=4.5)
+    db.add(shop)
+    db.flush()
+    db.add(Product(name="Базовая футболка", price=5000, category="tshirts", store_id=shop.id, stock_quantity=3))
+    admin = User(
+        email="admin@example.com",
+        username="store_admin",
+        hashed_password="x",
+        role=UserRole.STORE_ADMIN,
+        store_id=shop.id,
+    )
+    db.add(admin)
+    db.commit()
+    # Снимок уже собран, как после любого поиска по каталогу в чате
+    assert len(get_catalog_snapshot(db)) == 1
+    return admin
+
+
+def test_create_product_with_built_snapshot(db, store_admin_user):
+    response = asyncio.run(store_admin.create_product(
+        StoreAdminProductCreate(name="Джинсы слим", price=15000, category="jeans", stock_quantity=2),
+        current_user=store_admin_user,
+        db=db,
+    ))
+
+    assert response.name == "Джинсы слим"
+    assert response.store.name == "H&M Mega"
+    assert response.is_in_stock
+    snapshot = get_catalog_snapshot(db)
+    assert snapshot.get(response.id) is not None
+    assert len(snapshot) == 2
+
+
+def test_update_product_with_built_snapshot(db, store_admin_user):
+    product_id = db.query(Product.id).scalar()
+
+    response = asyncio.run(store_admin.update_product(
+        product_id,
+        StoreAdminProductUpdate(price=4500, stock_quantity=0),
+        current_user=store_admin_user,
+        db=db,
+    ))
+
+    assert response.price == 4500
+    assert not response.is_in_stock
+    assert response.store.city == "Almaty"
+    assert get_catalog_snapshot(db).get(product_id).price == 4500